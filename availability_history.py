@@ -0,0 +1,267 @@
+from pathlib import Path
+from array import array
+
+import asyncio
+import struct
+
+
+FILE_HEADER = struct.Struct("<4sHI")  # magic, version, capacity
+FILE_MAGIC = b"SGAH"
+FILE_VERSION = 1
+RECORD_HEADER = struct.Struct("<qII")  # star gift id, head, count
+
+
+class AvailabilityHistory:
+    """
+    Fixed-size ring buffer of `(timestamp, available amount)` points of a single gift.
+
+    Points are stored interleaved in one `array("q")`, so memory and the cost of every
+    operation only depend on `capacity`, not on how long the gift has been on sale.
+    """
+
+    __slots__ = ("capacity", "points", "head", "count")
+
+    def __init__(self, capacity: int, points: array | None = None, head: int=0, count: int=0) -> None:  # pyright: ignore[reportMissingTypeArgument]
+        self.capacity = capacity
+        self.points = points if points is not None else array("q", bytes(capacity * 2 * 8))
+        self.head = head  # Index of the slot to write the next point to
+        self.count = count
+
+    def append(self, timestamp: int, available_amount: int) -> bool:
+        """
+        Returns whether the history changed.
+        """
+
+        if self.count:
+            last_index = (self.head - 1) % self.capacity * 2
+
+            if self.points[last_index + 1] == available_amount:
+                return False
+
+            if self.points[last_index] == timestamp:  # Keep only the latest amount within a second
+                self.points[last_index + 1] = available_amount
+
+                return True
+
+        self.points[self.head * 2] = timestamp
+        self.points[self.head * 2 + 1] = available_amount
+
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+        return True
+
+    def get_points(self, since: int | None = None) -> tuple[array, array]:  # pyright: ignore[reportMissingTypeArgument]
+        """
+        Timestamps and available amounts from the oldest to the newest point.
+        """
+
+        if not self.count:
+            return array("q"), array("q")
+
+        start = (self.head - self.count) % self.capacity * 2
+        end = self.head * 2
+
+        if self.count == self.capacity or start >= end:
+            ordered_points = self.points[start:] + self.points[:end]
+        else:
+            ordered_points = self.points[start:end]
+
+        timestamps = ordered_points[0::2]
+        available_amounts = ordered_points[1::2]
+
+        if since is not None:
+            first_index = next(
+                (
+                    i
+                    for i, timestamp in enumerate(timestamps)
+                    if timestamp >= since
+                ),
+                len(timestamps)
+            )
+
+            timestamps = timestamps[first_index:]
+            available_amounts = available_amounts[first_index:]
+
+        return timestamps, available_amounts
+
+    def get_sell_rate(self, now: int, available_amount: int, window: int) -> float:
+        """
+        Gifts sold per second over the last `window` seconds: least squares slope of the points
+        in the window and the current `available_amount` at `now`.
+        """
+
+        timestamps, available_amounts = self.get_points(since=now - window)
+
+        timestamps.append(now)
+        available_amounts.append(available_amount)
+
+        points_count = len(timestamps)
+
+        if points_count < 2:
+            return 0.0
+
+        first_timestamp = timestamps[0]
+
+        mean_time = (sum(timestamps) - first_timestamp * points_count) / points_count
+        mean_amount = sum(available_amounts) / points_count
+
+        covariance = sum(
+            (timestamp - first_timestamp - mean_time) * (amount - mean_amount)
+            for timestamp, amount in zip(timestamps, available_amounts)
+        )
+        variance = sum(
+            (timestamp - first_timestamp - mean_time) ** 2
+            for timestamp in timestamps
+        )
+
+        if variance == 0:
+            return 0.0
+
+        return max(0.0, -covariance / variance)
+
+    def get_sell_out_eta(self, now: int, available_amount: int, window: int) -> float | None:
+        """
+        Seconds until the gift sells out at the current sell rate, `None` if it isn't selling.
+        """
+
+        if available_amount <= 0:
+            return None
+
+        sell_rate = self.get_sell_rate(now, available_amount, window)
+
+        if sell_rate <= 0:
+            return None
+
+        return available_amount / sell_rate
+
+
+def _write_file(filepath: Path, data: bytes) -> None:
+    temp_filepath = filepath.with_name(filepath.name + ".tmp")
+    temp_filepath.write_bytes(data)
+    temp_filepath.replace(filepath)
+
+
+class AvailabilityHistories:
+    """
+    Availability histories of the limited gifts still on sale, stored in a binary sidecar file next
+    to the gifts data. The file is only written if a history changed since the previous save.
+    """
+
+    def __init__(self, filepath: Path, capacity: int) -> None:
+        self.filepath = filepath
+        self.capacity = capacity
+
+        self.histories: dict[int, AvailabilityHistory] = {}
+
+        self._is_changed = False
+
+    @classmethod
+    def load(cls, filepath: Path, capacity: int) -> "AvailabilityHistories":
+        histories = cls(filepath, capacity)
+
+        try:
+            data = filepath.read_bytes()
+
+        except FileNotFoundError:
+            return histories
+
+        magic, version, file_capacity = FILE_HEADER.unpack_from(data, 0)
+
+        if magic != FILE_MAGIC or version != FILE_VERSION:
+            raise ValueError(f"{filepath} is not an availability history file")
+
+        offset = FILE_HEADER.size
+        points_size = file_capacity * 2 * 8
+
+        while offset < len(data):
+            star_gift_id, head, count = RECORD_HEADER.unpack_from(data, offset)
+            offset += RECORD_HEADER.size
+
+            file_history = AvailabilityHistory(
+                capacity = file_capacity,
+                points = array("q", data[offset : offset + points_size]),
+                head = head,
+                count = count
+            )
+            offset += points_size
+
+            if file_capacity == capacity:
+                histories.histories[star_gift_id] = file_history
+
+                continue
+
+            history = histories.histories[star_gift_id] = AvailabilityHistory(capacity)  # Capacity was changed in the config
+
+            for timestamp, available_amount in zip(*file_history.get_points()):
+                history.append(timestamp, available_amount)
+
+        return histories
+
+    def _encode(self) -> bytes | None:
+        """
+        None if nothing changed since the previous save.
+        """
+
+        if not self._is_changed:
+            return None
+
+        self._is_changed = False
+
+        return FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, self.capacity) + b"".join(
+            RECORD_HEADER.pack(star_gift_id, history.head, history.count) + history.points.tobytes()
+            for star_gift_id, history in self.histories.items()
+        )
+
+    def save(self) -> None:
+        data = self._encode()
+
+        if data is None:
+            return
+
+        try:
+            _write_file(self.filepath, data)
+
+        except BaseException:
+            self._is_changed = True
+
+            raise
+
+    async def save_async(self) -> None:
+        """
+        Same as `save`, but the file is written in a thread.
+        """
+
+        data = self._encode()
+
+        if data is None:
+            return
+
+        try:
+            await asyncio.to_thread(_write_file, self.filepath, data)
+
+        except BaseException:
+            self._is_changed = True
+
+            raise
+
+    def record(self, star_gift_id: int, timestamp: int, available_amount: int) -> None:
+        history = self.histories.get(star_gift_id)
+
+        if history is None:
+            history = self.histories[star_gift_id] = AvailabilityHistory(self.capacity)
+
+        if history.append(timestamp, available_amount):
+            self._is_changed = True
+
+    def forget(self, star_gift_id: int) -> None:
+        if self.histories.pop(star_gift_id, None) is not None:
+            self._is_changed = True
+
+    def get_sell_out_eta(self, star_gift_id: int, now: int, available_amount: int, window: int) -> float | None:
+        history = self.histories.get(star_gift_id)
+
+        if history is None:
+            return None
+
+        return history.get_sell_out_eta(now, available_amount, window)
@@ -0,0 +1,136 @@
+"""
+Compares the default asyncio event loop with uvloop: poll-loop jitter while Bot API requests
+are in flight, Bot API send throughput against a local stub server and CPU usage of an idle service.
+
+Usage: python -m benchmarks.event_loop [requests] [concurrency]
+"""
+
+from httpx import AsyncClient
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+
+from .logging_jitter import measure_jitter
+from .replay.bot_api_stub import BotAPIStub
+
+import utils
+
+
+JITTER_ITERATIONS = 1_000
+JITTER_INTERVAL = 0.002
+IDLE_DURATION = 3.0
+IDLE_TIMERS = 50  # Sleeping tasks like the detector's pollers
+IDLE_TIMER_INTERVAL = 0.1
+
+
+async def send_requests(bot_http_client: AsyncClient, requests_count: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send_request(i: int) -> None:
+        async with semaphore:
+            (await bot_http_client.post(
+                "/bot1000001:benchmark/sendMessage",
+                json = {
+                    "chat_id": -1003052155098,
+                    "text": f"Benchmark message #{i}"
+                }
+            )).raise_for_status()
+
+    await asyncio.gather(*(
+        send_request(i)
+        for i in range(requests_count)
+    ))
+
+
+async def measure_idle_cpu() -> float:
+    """
+    CPU milliseconds per second spent by the loop on timers alone.
+    """
+
+    async def timer() -> None:
+        while True:
+            await asyncio.sleep(IDLE_TIMER_INTERVAL)
+
+    tasks = [
+        asyncio.create_task(timer())
+        for _ in range(IDLE_TIMERS)
+    ]
+
+    await asyncio.sleep(IDLE_TIMER_INTERVAL)  # Let every timer start
+
+    cpu_started_at = time.process_time()
+
+    await asyncio.sleep(IDLE_DURATION)
+
+    cpu_elapsed = time.process_time() - cpu_started_at
+
+    for task in tasks:
+        task.cancel()
+
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return cpu_elapsed / IDLE_DURATION * 1000
+
+
+async def run_benchmark(requests_count: int, concurrency: int) -> dict[str, float]:
+    bot_api_stub = BotAPIStub(latency=0.0)
+
+    await bot_api_stub.start()
+
+    try:
+        async with AsyncClient(base_url=bot_api_stub.base_url) as bot_http_client:
+            await send_requests(bot_http_client, concurrency, concurrency)  # Warm up the connection pool
+
+            started_at = time.perf_counter()
+
+            await send_requests(bot_http_client, requests_count, concurrency)
+
+            throughput = requests_count / (time.perf_counter() - started_at)
+
+            background_requests = asyncio.create_task(send_requests(bot_http_client, requests_count, concurrency))
+
+            lateness = await measure_jitter(logging.getLogger(__name__), JITTER_ITERATIONS, JITTER_INTERVAL)
+
+            await background_requests
+
+    finally:
+        await bot_api_stub.stop()
+
+    lateness_ms = sorted(value * 1000 for value in lateness)
+
+    return {
+        "requests_per_second": throughput,
+        "jitter_p50_ms": statistics.median(lateness_ms),
+        "jitter_p99_ms": lateness_ms[int(len(lateness_ms) * 0.99) - 1],
+        "jitter_max_ms": lateness_ms[-1],
+        "idle_cpu_ms_per_second": await measure_idle_cpu()
+    }
+
+
+def main(requests_count: int=2_000, concurrency: int=16) -> None:
+    results: dict[str, dict[str, float]] = {}
+
+    for use_uvloop in (False, True):
+        if utils.set_event_loop_policy(use_uvloop) != use_uvloop:
+            print("uvloop is not installed, skipping it.")
+
+            continue
+
+        results["uvloop" if use_uvloop else "asyncio"] = asyncio.run(run_benchmark(requests_count, concurrency))
+
+    utils.set_event_loop_policy(False)
+
+    print(f"{requests_count:,} sendMessage requests to a local Bot API stub with {concurrency} in flight:")
+
+    for name, result in results.items():
+        print(f"    {name:<8}", "  ".join(
+            f"{key}={value:,.3f}"
+            for key, value in result.items()
+        ))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
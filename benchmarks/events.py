@@ -0,0 +1,135 @@
+"""
+Publishes bursts of events to `/events` subscribers over local HTTP: fast subscribers must receive
+every event, a stalled subscriber which never reads its socket must be dropped to a `resync` event,
+and neither may slow down publishing.
+
+Usage: python -m benchmarks.events [events] [subscribers]
+"""
+
+from httpx import AsyncClient
+
+import asyncio
+import logging
+import socket
+import statistics
+import sys
+import time
+import typing
+
+from event_bus import EventBus, create_sse_handler
+from http_server import HTTPServer
+
+
+BUFFER_SIZE = 256
+BURST_SIZE = 40
+BURST_INTERVAL = 0.05
+PAYLOAD = {"id": 1, "available_amount": 1000, "total_amount": 100_000, "padding": "x" * 2048}  # Fills the stalled socket sooner
+RECEIVE_TIMEOUT = 30.0
+
+
+async def subscribe(client: AsyncClient, received: list[str], ready: asyncio.Event) -> None:
+    async with client.stream("GET", "/events") as response:
+        ready.set()
+
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                received.append(line.removeprefix("event: "))
+
+
+async def run_benchmark(events_count: int, subscribers_count: int) -> dict[str, float]:
+    event_bus = EventBus(buffer_size=BUFFER_SIZE)
+
+    server = HTTPServer(
+        host = "127.0.0.1",
+        port = 0,
+        logger = logging.getLogger(__name__)
+    )
+    server.add_route("GET", "/events", create_sse_handler(event_bus))
+
+    await server.start()
+
+    port = typing.cast(asyncio.Server, server._server).sockets[0].getsockname()[1]  # pyright: ignore[reportPrivateUsage]
+
+    # Connects but never reads, so its socket buffers fill up
+    stalled_socket = socket.socket()
+    stalled_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    stalled_socket.connect(("127.0.0.1", port))
+    stalled_socket.setblocking(False)
+
+    _, stalled_writer = await asyncio.open_connection(sock=stalled_socket)
+    stalled_writer.write(b"GET /events HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+
+    received: list[list[str]] = [[] for _ in range(subscribers_count)]
+    ready_events = [asyncio.Event() for _ in range(subscribers_count)]
+
+    try:
+        async with AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            tasks = [
+                asyncio.create_task(subscribe(client, received[i], ready_events[i]))
+                for i in range(subscribers_count)
+            ]
+
+            await asyncio.gather(*(ready.wait() for ready in ready_events))
+
+            while len(event_bus.subscriptions) < subscribers_count + 1:
+                await asyncio.sleep(0.01)
+
+            publish_durations: list[float] = []
+            started_at = time.perf_counter()
+
+            for i in range(events_count):
+                publish_started_at = time.perf_counter()
+
+                event_bus.publish("availability_drop", PAYLOAD)
+
+                publish_durations.append(time.perf_counter() - publish_started_at)
+
+                if i % BURST_SIZE == BURST_SIZE - 1:
+                    await asyncio.sleep(BURST_INTERVAL)  # Like the poll loop between polls
+
+            while any(len(events) < events_count for events in received) and time.perf_counter() - started_at < RECEIVE_TIMEOUT:
+                await asyncio.sleep(0.01)
+
+            delivered_in = time.perf_counter() - started_at
+
+            # The stalled subscriber's stream is stuck writing, so its resync is still pending
+            is_stalled_resynced = any(subscription.needs_resync for subscription in event_bus.subscriptions)
+
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    finally:
+        stalled_writer.close()
+
+        await server.stop()
+
+    publish_durations_us = sorted(duration * 1_000_000 for duration in publish_durations)
+
+    return {
+        "deliveries_per_second": events_count * subscribers_count / delivered_in,
+        "publish_p50_us": statistics.median(publish_durations_us),
+        "publish_max_us": publish_durations_us[-1],
+        "fast_subscribers_complete": sum(len(events) >= events_count for events in received),
+        "fast_subscribers_resynced": sum("resync" in events for events in received),
+        "stalled_subscriber_resynced": int(is_stalled_resynced)
+    }
+
+
+def main(events_count: int=4_000, subscribers_count: int=10) -> None:
+    results = asyncio.run(run_benchmark(events_count, subscribers_count))
+
+    print(f"{events_count:,} events published to {subscribers_count} subscribers and a stalled one:")
+
+    for key, value in results.items():
+        print(f"    {key:<28}", f"{value:,.3f}" if isinstance(value, float) else f"{value:,}")
+
+    if results["fast_subscribers_complete"] != subscribers_count or not results["stalled_subscriber_resynced"]:
+        print("Fast subscribers did not receive every event or the stalled subscriber was not resynced.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
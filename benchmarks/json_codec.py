@@ -0,0 +1,185 @@
+"""
+Times saving and loading a large gifts data store and the JSON overhead of a Bot API request:
+simplejson with `indent=4` and httpx `json=` as before, against `json_codec` with orjson and with
+the standard library fallback. simplejson is only needed for its comparison.
+
+Usage: python -m benchmarks.json_codec [gifts] [requests]
+"""
+
+from httpx import Request, Response
+from pathlib import Path
+
+import contextlib
+import sys
+import tempfile
+import time
+import typing
+
+from star_gifts_data import StarGiftData, StarGiftsData
+
+import json_codec
+
+
+try:
+    import simplejson
+
+except ImportError:
+    simplejson = None
+
+
+BOT_API_URL = "https://api.telegram.org/bot123456:TOKEN/sendMessage"
+SEND_MESSAGE_DATA = {
+    "chat_id": -1003052155098,
+    "text": "🎁 <b>Новый подарок</b>\n\nЦена: 5 000 ⭐️\nДоступно: 100 000 / 100 000\nЛимит на пользователя: 3",
+    "parse_mode": "HTML",
+    "link_preview_options": {"is_disabled": True},
+    "disable_notification": False,
+    "reply_markup": {"inline_keyboard": [[{"text": "Купить", "url": "https://t.me/gifts_detector"}]]}
+}
+SEND_MESSAGE_RESPONSE = json_codec.dumps({
+    "ok": True,
+    "result": {
+        "message_id": 123_456,
+        "date": 1_700_000_000,
+        "chat": {"id": -1003052155098, "title": "Gifts Detector", "username": "gifts_detector", "type": "channel"},
+        "text": SEND_MESSAGE_DATA["text"]
+    }
+})
+
+
+def get_star_gifts_data(data_filepath: Path, star_gifts_count: int) -> StarGiftsData:
+    return StarGiftsData(
+        DATA_FILEPATH = data_filepath,
+        star_gifts = [
+            StarGiftData(
+                id = 5_170_145_012_310_081_615 + i,
+                number = i + 1,
+                sticker_file_id = "CAACAgIAAxUAAWjQ" + "x" * 64,
+                sticker_file_name = f"{5_170_145_012_310_081_615 + i}.tgs",
+                price = 5_000,
+                convert_price = 4_250,
+                available_amount = 100_000 - i,
+                total_amount = 100_000,
+                require_premium = i % 2 == 0,
+                user_limited = 3,
+                is_limited = True,
+                first_appearance_timestamp = 1_700_000_000 + i,
+                message_id = 1_000 + i,
+                message_text_hash = "0123456789abcdef0123456789abcdef",
+                message_available_amount = 100_000 - i,
+                last_sale_timestamp = 1_700_000_600 + i,
+                upgrade_price = 25_000 if i % 3 == 0 else None
+            )
+            for i in range(star_gifts_count)
+        ]
+    )
+
+
+@contextlib.contextmanager
+def stdlib_backend() -> typing.Iterator[None]:
+    orjson = json_codec.orjson
+    json_codec.orjson = None
+
+    try:
+        yield
+
+    finally:
+        json_codec.orjson = orjson
+
+
+def simplejson_save(star_gifts_data: StarGiftsData) -> None:
+    with star_gifts_data.DATA_FILEPATH.open("w", encoding="utf-8") as file:
+        simplejson.dump(
+            obj = star_gifts_data.model_dump(),
+            fp = file,
+            indent = 4,
+            ensure_ascii = True,
+            sort_keys = False
+        )
+
+
+def simplejson_load(data_filepath: Path) -> StarGiftsData:
+    with data_filepath.open("r", encoding="utf-8") as file:
+        return StarGiftsData.model_validate({
+            **simplejson.load(file),
+            "DATA_FILEPATH": data_filepath
+        })
+
+
+def time_store(star_gifts_data: StarGiftsData, save: typing.Callable[[StarGiftsData], None], repeats: int=5) -> tuple[float, float, int]:
+    """
+    Best save and load times and the file size.
+    """
+
+    save_durations: list[float] = []
+    load_durations: list[float] = []
+    loaded = None
+
+    for _ in range(repeats):
+        star_gifts_data = StarGiftsData(  # Without the dumps and the saved version of the previous save
+            DATA_FILEPATH = star_gifts_data.DATA_FILEPATH,
+            star_gifts = star_gifts_data.star_gifts
+        )
+
+        started_at = time.perf_counter()
+        save(star_gifts_data)
+        save_durations.append(time.perf_counter() - started_at)
+
+        started_at = time.perf_counter()
+        loaded = StarGiftsData.load(star_gifts_data.DATA_FILEPATH) if save is not simplejson_save else simplejson_load(star_gifts_data.DATA_FILEPATH)
+        load_durations.append(time.perf_counter() - started_at)
+
+    assert loaded is not None and loaded.star_gifts == star_gifts_data.star_gifts
+
+    return min(save_durations), min(load_durations), star_gifts_data.DATA_FILEPATH.stat().st_size
+
+
+def time_requests(requests_count: int, pre_encoded: bool) -> float:
+    started_at = time.perf_counter()
+
+    for _ in range(requests_count):
+        if pre_encoded:
+            Request("POST", BOT_API_URL, content=json_codec.dumps(SEND_MESSAGE_DATA), headers=json_codec.JSON_HEADERS)
+            json_codec.loads(Response(200, content=SEND_MESSAGE_RESPONSE).content)
+
+        else:
+            Request("POST", BOT_API_URL, json=SEND_MESSAGE_DATA)
+            Response(200, content=SEND_MESSAGE_RESPONSE).json()
+
+    return (time.perf_counter() - started_at) / requests_count
+
+
+def main(star_gifts_count: int=5_000, requests_count: int=20_000) -> None:
+    print(f"Gifts data store with {star_gifts_count:,} gifts (best of 5), json_codec backend: {json_codec.get_backend()}")
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        star_gifts_data = get_star_gifts_data(Path(dirpath) / "star_gifts.json", star_gifts_count)
+
+        with stdlib_backend():
+            stdlib_results = time_store(star_gifts_data, StarGiftsData.save)
+
+        if simplejson is None:
+            print("    simplejson is not installed, skipping the comparison.")
+
+        for name, (save_duration, load_duration, size) in (
+            *([("simplejson indent=4", time_store(star_gifts_data, simplejson_save))] if simplejson is not None else []),
+            ("json_codec stdlib", stdlib_results),
+            (f"json_codec {json_codec.get_backend()}", time_store(star_gifts_data, StarGiftsData.save))
+        ):
+            print(f"    {name:<22} save {save_duration * 1000:7.1f} ms, load {load_duration * 1000:7.1f} ms, {size / 1024:8.1f} KB")
+
+    print(f"Bot API request JSON overhead ({requests_count:,} sendMessage requests and responses):")
+
+    with stdlib_backend():
+        stdlib_duration = time_requests(requests_count, True)
+
+    for name, duration in (
+        ("httpx json=", time_requests(requests_count, False)),
+        ("json_codec stdlib", stdlib_duration),
+        (f"json_codec {json_codec.get_backend()}", time_requests(requests_count, True))
+    ):
+        print(f"    {name:<22} {duration * 1_000_000:7.2f} us/request")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
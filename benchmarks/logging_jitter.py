@@ -0,0 +1,81 @@
+"""
+Measures poll-loop jitter while logging a Bot API payload on every iteration,
+with DEBUG logging on and off, through direct and queued handlers.
+
+Usage: python -m benchmarks.logging_jitter [iterations] [interval]
+"""
+
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asyncio
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import time
+
+import utils
+
+
+PAYLOAD = {
+    "chat_id": -1003052155098,
+    "message_id": 12345,
+    "text": "🔥 Появился новый лимитированный подарок\n\n" * 8,
+    "parse_mode": "HTML",
+    "disable_web_page_preview": True
+}
+
+
+async def measure_jitter(logger: logging.Logger, iterations: int, interval: float) -> list[float]:
+    lateness: list[float] = []
+    deadline = time.perf_counter()
+
+    for _ in range(iterations):
+        deadline += interval
+
+        await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+
+        woke_up_at = time.perf_counter()
+        lateness.append(woke_up_at - deadline)
+        deadline = max(deadline, woke_up_at)
+
+        logger.debug("Sending request %s with data: %s", "editMessageText", PAYLOAD)
+        logger.debug("Available amount of star gift %d updated from %d to %d (message #%d).", 1, 100, 99, 12345)
+
+    return lateness
+
+
+def main(iterations: int=2_000, interval: float=0.002) -> None:
+    results: dict[str, list[float]] = {}
+
+    with TemporaryDirectory() as temp_dirpath, open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stderr(devnull):
+        for queued in (False, True):
+            for log_level in (logging.DEBUG, logging.INFO):
+                name = f"""{"queued" if queued else "direct"} {logging.getLevelName(log_level)}"""
+
+                logger = utils.get_logger(
+                    name = f"benchmark_{name.replace(' ', '_')}",
+                    log_filepath = Path(temp_dirpath) / f"{name.replace(' ', '_')}.log",
+                    console_log_level = log_level,
+                    file_log_level = log_level,
+                    queued = queued
+                )
+
+                results[name] = asyncio.run(measure_jitter(logger, iterations, interval))
+
+    print(f"{iterations:,} iterations of {interval * 1000:.1f} ms sleeps, lateness in ms:")
+
+    for name, lateness in results.items():
+        lateness_ms = sorted(value * 1000 for value in lateness)
+
+        print(
+            f"{name:>13}: p50 {statistics.median(lateness_ms):.3f}"
+            f"  p99 {lateness_ms[int(len(lateness_ms) * 0.99) - 1]:.3f}"
+            f"  max {lateness_ms[-1]:.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), *map(float, sys.argv[2:3]))
@@ -0,0 +1,66 @@
+"""
+Renders availability edit texts for a limited gift with and without compiled templates.
+
+Usage: python -m benchmarks.notify_text [renders]
+"""
+
+from pytz import timezone as _timezone
+
+import sys
+import time
+
+from star_gifts_data import StarGiftData
+from notify_text import NotifyTextRenderer, render_notify_text
+
+import config
+
+
+def get_star_gift() -> StarGiftData:
+    return StarGiftData(
+        id = 5_170_145_012_310_081_615,
+        number = 42,
+        sticker_file_id = "",
+        sticker_file_name = "5170145012310081615.tgs",
+        price = 5_000,
+        convert_price = 4_250,
+        available_amount = 100_000,
+        total_amount = 100_000,
+        require_premium = True,
+        user_limited = 3,
+        is_limited = True,
+        first_appearance_timestamp = 1_700_000_000
+    )
+
+
+def main(renders: int=10_000) -> None:
+    timezone = _timezone(config.TIMEZONE)
+    renderer = NotifyTextRenderer(timezone)
+    star_gift = get_star_gift()
+
+    # Both renderers must agree before timing them
+    assert renderer.render(star_gift) == render_notify_text(star_gift, timezone)
+
+    results: dict[str, float] = {}
+
+    for name, render in (
+        ("uncached", lambda sg: render_notify_text(sg, timezone)),
+        ("compiled", renderer.render)
+    ):
+        star_gift.available_amount = star_gift.total_amount
+
+        started_at = time.perf_counter()
+
+        for _ in range(renders):
+            star_gift.available_amount -= 7
+            render(star_gift)
+
+        results[name] = time.perf_counter() - started_at
+
+    for name, elapsed in results.items():
+        print(f"{name:>10}: {renders:,} renders in {elapsed * 1000:.1f} ms ({elapsed / renders * 1_000_000:.2f} us/render)")
+
+    print(f"   speedup: {results['uncached'] / results['compiled']:.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
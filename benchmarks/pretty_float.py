@@ -0,0 +1,85 @@
+"""
+Compares `utils.format_float_positional` with numpy's `format_float_positional` on random
+inputs and times `utils.pretty_float`. numpy is only needed for the comparison.
+
+Usage: python -m benchmarks.pretty_float [samples]
+"""
+
+import math
+import random
+import struct
+import sys
+import time
+
+import utils
+
+
+def get_samples(samples: int, seed: int=0) -> list[float]:
+    rng = random.Random(seed)
+
+    values = [0.0, -0.0, math.inf, -math.inf, math.nan, 1e-300, 5e-324, 1e16, 1e22, 1.7976931348623157e308]
+
+    while len(values) < samples:
+        kind = rng.randrange(4)
+
+        if kind == 0:  # what pretty_float receives: ceil(percentage * 100) / 100
+            values.append(math.ceil(rng.uniform(0, 100) * 100) / 100)
+
+        elif kind == 1:  # already rounded to one significant digit
+            values.append(float("{:.1g}".format(rng.uniform(0, 100) * 10 ** rng.randint(-12, 12))))
+
+        elif kind == 2:
+            values.append(rng.uniform(-1e6, 1e6))
+
+        else:  # arbitrary finite bit patterns
+            value = struct.unpack("<d", rng.getrandbits(64).to_bytes(8, "little"))[0]
+
+            if math.isfinite(value):
+                values.append(value)
+
+    return values
+
+
+def check(samples: list[float]) -> None:
+    try:
+        import numpy as np
+
+    except ImportError:
+        print("numpy is not installed, skipping the comparison.")
+
+        return
+
+    mismatches = [
+        (value, expected, actual)
+        for value in samples
+        if (expected := np.format_float_positional(value, trim="-")) != (actual := utils.format_float_positional(value))
+    ]
+
+    for value, expected, actual in mismatches[:10]:
+        print(f"MISMATCH {value!r}: numpy={expected!r} utils={actual!r}")
+
+    if mismatches:
+        raise SystemExit(f"{len(mismatches):,} of {len(samples):,} samples differ from numpy.")
+
+    print(f"{len(samples):,} samples match numpy.")
+
+
+def main(samples_count: int=100_000) -> None:
+    samples = get_samples(samples_count)
+
+    check(samples)
+
+    percentages = [value for value in samples if 0 <= value <= 100]
+
+    started_at = time.perf_counter()
+
+    for value in percentages:
+        utils.pretty_float(value, get_is_same=True)
+
+    elapsed = time.perf_counter() - started_at
+
+    print(f"pretty_float: {elapsed / len(percentages) * 1_000_000:.2f} us/call over {len(percentages):,} calls")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
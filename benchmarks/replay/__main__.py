@@ -0,0 +1,261 @@
+"""
+Offline end-to-end replay of the detector against a fake userbot and a local Bot API stub.
+
+Reports detection-to-post latency, edits per second and CPU time per poll for every scenario,
+and exits with a non-zero code if any of them regresses past `THRESHOLDS`.
+
+With `--trace`, the spans of every scenario are aggregated into per-stage latency percentiles.
+
+Usage: python -m benchmarks.replay [--trace] [scenario ...]
+       python -m benchmarks.replay [--trace] capture:<capture file or directory>[:speed]
+"""
+
+from tempfile import TemporaryDirectory
+from pathlib import Path
+from itertools import cycle
+from functools import partial
+from httpx import AsyncClient
+
+import asyncio
+import logging
+import operator
+import statistics
+import sys
+import time
+import typing
+
+from parse_data import get_all_star_gifts
+from star_gifts_data import StarGiftData, StarGiftsData
+from availability_history import AvailabilityHistories
+from poll_scheduler import AdaptivePollScheduler
+from upgrade_previews import UpgradePreviewsData, UpgradePreviewsCache
+from sticker_cache import StickerCache
+
+import detector
+import tracing
+import metrics
+import config
+
+from .bot_api_stub import BotAPIStub
+from .fake_client import FakeClient, patch_media_sessions
+from .scenarios import SCENARIOS, Scenario, CaptureScenario
+
+
+REPLAY_BOT_TOKENS = [
+    "1000001:replay",
+    "1000002:replay"
+]
+REPLAY_UPGRADES_CHAT_ID = -1000000000001  # Apart from `NOTIFY_CHAT_ID`, so upgrade notifications aren't counted as posts
+
+THRESHOLDS: dict[str, dict[str, tuple[typing.Callable[[float, float], bool], float]]] = {
+    "drop10": {
+        "detection_to_post_max": (operator.le, 20.0),
+        "cpu_per_poll_ms": (operator.le, 150.0)
+    },
+    "sell100k": {
+        "edits_per_second": (operator.ge, 2.0),
+        "cpu_per_poll_ms": (operator.le, 25.0)
+    },
+    "sell1kof100k": {
+        "edits": (operator.le, 12)  # Every ~100 sold with the default `NOTIFY_EDIT_MIN_CHANGE_PERCENTAGE`
+    },
+    "upgrade10": {
+        "upgrade_to_notify_first": (operator.le, 5.0),
+        "upgrade_previews": (operator.le, 10)  # One per gift, cached afterwards
+    }
+}
+
+
+def prepare_detector(bot_http_client: AsyncClient, data_filepath: Path, check_interval: float) -> None:
+    config.BOT_TOKENS = REPLAY_BOT_TOKENS
+    config.NOTIFY_UPGRADES_CHAT_ID = REPLAY_UPGRADES_CHAT_ID
+
+    detector.BOTS_AMOUNT = len(REPLAY_BOT_TOKENS)
+    detector.BOT_TOKENS_CYCLE = cycle(REPLAY_BOT_TOKENS)
+    detector.PRIMARY_BOT_TOKEN = REPLAY_BOT_TOKENS[0]
+    detector.BOT_HTTP_CLIENT = bot_http_client
+    detector.STAR_GIFTS_DATA = StarGiftsData.load(data_filepath, new=True)
+    detector.AVAILABILITY_HISTORIES = AvailabilityHistories(data_filepath.with_suffix(".bin"), config.AVAILABILITY_HISTORY_SIZE)
+    detector.UPGRADE_PREVIEWS = UpgradePreviewsCache(UpgradePreviewsData.load(data_filepath.with_name("star_gifts_upgrades.json")), config.UPGRADE_PREVIEWS_TTL)
+    detector.STICKER_CACHE = StickerCache(data_filepath.with_name("stickers"))
+    detector.STAR_GIFTS_DETECTED_AT.clear()
+    detector.POLL_SCHEDULER = AdaptivePollScheduler(  # Fixed interval, so results are comparable between runs
+        fast_interval = check_interval,
+        idle_interval = check_interval,
+        floor = check_interval,
+        ceiling = check_interval
+    )
+
+    detector.logger.setLevel(logging.WARNING)
+
+
+async def seed_star_gifts(client: FakeClient, scenario: Scenario) -> None:
+    _, all_star_gifts_dict = await get_all_star_gifts(typing.cast(typing.Any, client))
+
+    star_gifts: list[StarGiftData] = []
+
+    for message_id, star_gift in enumerate(all_star_gifts_dict.values(), 1):
+        if star_gift.id in scenario.posted_star_gifts_ids:
+            star_gift.message_id = message_id
+
+        star_gifts.append(star_gift)
+
+    detector.STAR_GIFTS_DATA.replace_star_gifts(star_gifts)
+
+
+async def run_scenario(scenario: Scenario, trace: bool=False) -> dict[str, float]:
+    bot_api_stub = BotAPIStub()
+
+    await bot_api_stub.start()
+
+    try:
+        with TemporaryDirectory() as temp_dirpath, patch_media_sessions():
+            async with AsyncClient(base_url=bot_api_stub.base_url, timeout=config.HTTP_REQUEST_TIMEOUT) as bot_http_client:
+                prepare_detector(bot_http_client, Path(temp_dirpath) / "star_gifts.json", scenario.check_interval)
+
+                tracer = tracing.configure(Path(temp_dirpath) / "traces.jsonl") if trace else None
+
+                client = FakeClient(scenario)
+
+                await seed_star_gifts(client, scenario)
+
+                client.polls_count = 0
+
+                update_gifts_queue = detector.UPDATE_GIFTS_QUEUE_T()
+                upgradable_gifts_queue = detector.UPGRADABLE_GIFTS_QUEUE_T()
+                app = typing.cast(typing.Any, client)
+
+                tasks = [
+                    asyncio.create_task(detector.detector(
+                        app = app,
+                        new_gifts_callback = partial(detector.process_new_gifts, app),
+                        update_gifts_queue = update_gifts_queue,
+                        upgradable_gifts_queue = upgradable_gifts_queue
+                    )),
+                    asyncio.create_task(detector.process_update_gifts(
+                        update_gifts_queue = update_gifts_queue
+                    )),
+                    asyncio.create_task(detector.star_gifts_upgrades_checker(
+                        app = app,
+                        upgradable_gifts_queue = upgradable_gifts_queue
+                    ))
+                ]
+
+                started_at = time.perf_counter()
+                cpu_started_at = time.process_time()
+                edits_deferred_before = metrics.EDITS.labels("deferred").value
+
+                while not scenario.is_done(client, bot_api_stub, client.get_elapsed()):
+                    if time.perf_counter() - started_at > scenario.timeout:
+                        print(f"[{scenario.name}] timed out after {scenario.timeout:g}s")
+
+                        break
+
+                    await asyncio.sleep(0.05)
+
+                elapsed = time.perf_counter() - started_at
+                cpu_elapsed = time.process_time() - cpu_started_at
+                edits_deferred = metrics.EDITS.labels("deferred").value - edits_deferred_before
+
+                for task in tasks:
+                    task.cancel()
+
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+                if tracer:
+                    tracer.flush()
+                    tracing.TRACER = None
+
+                    for line in tracing.format_stages(tracing.aggregate(tracing.iter_spans([tracer.filepath]))):
+                        print(f"    {line}")
+
+    finally:
+        await bot_api_stub.stop()
+
+    detection_to_post = [
+        received_at - client.star_gifts_served_at[star_gift_id]
+        for received_at, _, _, data in bot_api_stub.get_requests("sendMessage")
+        if data.get("chat_id") != REPLAY_UPGRADES_CHAT_ID
+        for star_gift_id in client.star_gifts_served_at
+        if f"<code>{star_gift_id}</code>" in data.get("text", "")
+    ]
+    upgrade_to_notify = [
+        received_at - client.upgrades_served_at[star_gift_id]
+        for received_at, _, _, data in bot_api_stub.get_requests("sendMessage")
+        if data.get("chat_id") == REPLAY_UPGRADES_CHAT_ID
+        for star_gift_id in client.upgrades_served_at
+        if f"<code>{star_gift_id}</code>" in data.get("text", "")
+    ]
+
+    results = {
+        "elapsed": elapsed,
+        "polls": client.polls_count,
+        "cpu_per_poll_ms": cpu_elapsed / max(client.polls_count, 1) * 1000,
+        "posts": len(detection_to_post),
+        "edits": len(bot_api_stub.get_requests("editMessageText")),
+        "edits_per_second": len(bot_api_stub.get_requests("editMessageText")) / elapsed,
+        "edits_deferred": int(edits_deferred),
+        "upgrade_previews": client.upgrade_previews_count
+    }
+
+    if detection_to_post:
+        results |= {
+            "detection_to_post_p50": statistics.median(detection_to_post),
+            "detection_to_post_max": max(detection_to_post)
+        }
+
+    if upgrade_to_notify:
+        results |= {
+            "upgrade_to_notify_first": min(upgrade_to_notify),
+            "upgrade_to_notify_max": max(upgrade_to_notify)
+        }
+
+    return results
+
+
+def check_thresholds(scenario_name: str, results: dict[str, float]) -> list[str]:
+    failures: list[str] = []
+
+    for metric, (compare, threshold) in THRESHOLDS.get(scenario_name, {}).items():
+        value = results.get(metric)
+
+        if value is None or not compare(value, threshold):
+            failures.append(f"{metric} = {value} (expected {compare.__name__} {threshold})")
+
+    return failures
+
+
+async def main(scenario_names: list[str]) -> int:
+    failed = False
+    trace = "--trace" in scenario_names
+
+    scenario_names = [scenario_name for scenario_name in scenario_names if scenario_name != "--trace"]
+
+    for scenario_name in scenario_names or SCENARIOS:
+        if scenario_name.startswith("capture:"):
+            capture_path, _, speed = scenario_name.removeprefix("capture:").partition(":")
+
+            scenario = CaptureScenario(Path(capture_path), *map(float, filter(None, [speed])))
+
+        else:
+            scenario = SCENARIOS[scenario_name]()
+
+        print(f"[{scenario.name}] {scenario.description}")
+
+        results = await run_scenario(scenario, trace)
+
+        for metric, value in results.items():
+            print(f"    {metric:<24} {value:,.3f}" if isinstance(value, float) else f"    {metric:<24} {value:,}")
+
+        failures = check_thresholds(scenario.name, results)
+
+        for failure in failures:
+            print(f"    REGRESSION: {failure}")
+
+        failed = failed or bool(failures)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
@@ -0,0 +1,83 @@
+from http import HTTPStatus
+
+import asyncio
+import logging
+import time
+import typing
+
+from http_server import HTTPServer, HTTPRequest, HTTPResponse
+
+import json_codec
+
+
+class BotAPIStub:
+    """
+    Local stand-in for `https://api.telegram.org/` which answers every method successfully
+    after `latency` seconds and records the received requests.
+    """
+
+    def __init__(self, host: str="127.0.0.1", port: int=0, latency: float=0.05) -> None:
+        self.latency = latency
+        self.requests: list[tuple[float, str, str, dict[str, typing.Any]]] = []  # [(perf_counter(), bot token, method, data), ...]
+
+        self._messages_count = 0
+        self._server = HTTPServer(
+            host = host,
+            port = port,
+            logger = logging.getLogger(__name__)
+        )
+
+        self._server.add_route("POST", "/{bot}/{method}", self._handle)
+
+    @property
+    def base_url(self) -> str:
+        server = typing.cast(asyncio.Server, self._server._server)  # pyright: ignore[reportPrivateUsage]
+        host, port = server.sockets[0].getsockname()[:2]
+
+        return f"http://{host}:{port}/"
+
+    async def start(self) -> None:
+        await self._server.start()
+
+    async def stop(self) -> None:
+        await self._server.stop()
+
+    def get_requests(self, method: str) -> list[tuple[float, str, str, dict[str, typing.Any]]]:
+        return [
+            request
+            for request in self.requests
+            if request[2] == method
+        ]
+
+    async def _handle(self, request: HTTPRequest) -> HTTPResponse:
+        received_at = time.perf_counter()
+
+        await asyncio.sleep(self.latency)
+
+        method = request.path_params["method"]
+        data = json_codec.loads(request.body) if request.body else {}
+
+        self.requests.append((received_at, request.path_params["bot"].removeprefix("bot"), method, data))
+
+        result: typing.Any = True
+
+        if method in ("sendMessage", "sendSticker"):
+            self._messages_count += 1
+
+            result = {
+                "message_id": self._messages_count,
+                "chat": {"id": data.get("chat_id")},
+                "date": int(time.time())
+            }
+
+        elif method == "getUpdates":
+            result = []
+
+        elif method == "getChat":
+            result = {"id": data.get("chat_id"), "title": "Bot API stub"}
+
+        return HTTPResponse(
+            status = HTTPStatus.OK,
+            body = json_codec.dumps({"ok": True, "result": result}),
+            content_type = json_codec.JSON_CONTENT_TYPE
+        )
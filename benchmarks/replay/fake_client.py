@@ -0,0 +1,404 @@
+from pyrogram.raw.types.star_gift import StarGift
+from pyrogram.raw.types.document import Document
+from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
+from pyrogram.raw.types.payments.star_gifts import StarGifts
+from pyrogram.raw.types.payments.star_gifts_not_modified import StarGiftsNotModified
+from pyrogram.raw.types.payments.star_gift_upgrade_preview import StarGiftUpgradePreview
+from pyrogram.raw.types.star_gift_attribute_model import StarGiftAttributeModel
+from pyrogram.raw.types.star_gift_attribute_pattern import StarGiftAttributePattern
+from pyrogram.raw.types.star_gift_attribute_backdrop import StarGiftAttributeBackdrop
+from pyrogram.raw.functions.payments.get_star_gifts import GetStarGifts
+from pyrogram.raw.functions.payments.get_star_gift_upgrade_preview import GetStarGiftUpgradePreview
+from pyrogram.raw.functions.payments.get_resale_star_gifts import GetResaleStarGifts
+from pyrogram.raw.types.payments.resale_star_gifts import ResaleStarGifts
+from pyrogram.raw.types.star_gift_unique import StarGiftUnique
+from pyrogram.raw.types.stars_amount import StarsAmount
+from pyrogram.raw.types.auth.exported_authorization import ExportedAuthorization
+from pyrogram.raw.functions.auth.export_authorization import ExportAuthorization
+from pyrogram.raw.functions.auth.import_authorization import ImportAuthorization
+from pyrogram.raw.types.upload.file import File
+from pyrogram.raw.types.storage.file_partial import FilePartial
+from pyrogram.raw.functions.upload.get_file import GetFile
+from pyrogram.raw.types.input_file import InputFile
+from pyrogram.raw.types.input_peer_empty import InputPeerEmpty
+from pyrogram.raw.types.message_media_document import MessageMediaDocument
+from pyrogram.raw.functions.messages.upload_media import UploadMedia
+from pyrogram.errors import BadRequest
+from types import SimpleNamespace
+from io import BytesIO
+
+import asyncio
+import contextlib
+import time
+import typing
+
+import userbot_helpers
+
+
+DCS_AMOUNT = 5
+STICKER_SIZE = 48 * 1024  # 48 KB, a typical gift .tgs
+PREVIEW_ATTRIBUTES_AMOUNT = 8  # Of each kind
+MODEL_DOCUMENTS_FIRST_ID = 8_000_000_000_000_000_000
+SHARED_PATTERN_DOCUMENTS_FIRST_ID = 9_000_000_000_000_000_000  # Patterns are offered for many gifts
+
+
+def get_sticker_bytes(document_id: int) -> bytes:
+    return document_id.to_bytes(8, "little") * (STICKER_SIZE // 8)
+
+
+def make_document(document_id: int) -> Document:
+    return Document(
+        id = document_id,
+        access_hash = document_id ^ 0x5EED,
+        file_reference = b"\x00",
+        date = 0,
+        mime_type = "application/x-tgsticker",
+        size = STICKER_SIZE,
+        dc_id = document_id % DCS_AMOUNT + 1,
+        attributes = [
+            DocumentAttributeFilename(
+                file_name = f"{document_id}.tgs"
+            )
+        ]
+    )
+
+
+def make_upgrade_preview(star_gift_id: int) -> StarGiftUpgradePreview:
+    return StarGiftUpgradePreview(
+        sample_attributes = [
+            *(
+                StarGiftAttributeModel(
+                    name = f"Model {i}",
+                    document = make_document(MODEL_DOCUMENTS_FIRST_ID + star_gift_id % 1_000_000 * PREVIEW_ATTRIBUTES_AMOUNT + i),
+                    rarity_permille = 5 + i * 20
+                )
+                for i in range(PREVIEW_ATTRIBUTES_AMOUNT)
+            ),
+            *(
+                StarGiftAttributePattern(
+                    name = f"Pattern {i}",
+                    document = make_document(SHARED_PATTERN_DOCUMENTS_FIRST_ID + i),
+                    rarity_permille = 5 + i * 20
+                )
+                for i in range(PREVIEW_ATTRIBUTES_AMOUNT)
+            ),
+            *(
+                StarGiftAttributeBackdrop(
+                    name = f"Backdrop {i}",
+                    backdrop_id = i,
+                    center_color = 0x808080,
+                    edge_color = 0x404040,
+                    pattern_color = 0x202020,
+                    text_color = 0xFFFFFF,
+                    rarity_permille = 5 + i * 20
+                )
+                for i in range(PREVIEW_ATTRIBUTES_AMOUNT)
+            )
+        ],
+        prices = [],
+        next_prices = []
+    )
+
+
+def make_star_gift(
+    star_gift_id: int,
+    price: int,
+    total_amount: int | None = None,
+    available_amount: int | None = None,
+    first_sale_date: int | None = None,
+    last_sale_date: int | None = None,
+    upgrade_price: int | None = None
+) -> StarGift:
+    # Sale dates share a TL flag with `sold_out`, so they are only serialized for sold out gifts
+    is_sold_out = total_amount is not None and available_amount == 0
+
+    return StarGift(
+        id = star_gift_id,
+        sticker = make_document(star_gift_id),
+        stars = price,
+        convert_stars = price * 85 // 100,
+        limited = total_amount is not None,
+        sold_out = is_sold_out or None,
+        availability_remains = available_amount,
+        availability_total = total_amount,
+        first_sale_date = first_sale_date if is_sold_out else None,
+        last_sale_date = last_sale_date if is_sold_out else None,
+        upgrade_stars = upgrade_price
+    )
+
+
+class FakeResaleMarket:
+    """
+    Resale listings served for `GetResaleStarGifts`, sorted by price and paginated by a numeric offset.
+    """
+
+    def __init__(self) -> None:
+        self.listings: dict[int, dict[int, tuple[int, int]]] = {}  # {star_gift_id: {listing_id: (num, price)}}
+
+    def get_floor_price(self, star_gift_id: int) -> int | None:
+        return min((price for _, price in self.listings.get(star_gift_id, {}).values()), default=None)
+
+    def get_page(self, query: GetResaleStarGifts) -> ResaleStarGifts:
+        listings = sorted(
+            self.listings.get(query.gift_id, {}).items(),
+            key = lambda item: (item[1][1], item[0]) if query.sort_by_price else item[0]
+        )
+        offset = int(query.offset or 0)
+        page = listings[offset : offset + query.limit]
+
+        return ResaleStarGifts(
+            count = len(listings),
+            gifts = [
+                StarGiftUnique(
+                    id = listing_id,
+                    gift_id = query.gift_id,
+                    title = "Replay",
+                    slug = f"Replay-{num}",
+                    num = num,
+                    attributes = [],
+                    availability_issued = len(listings),
+                    availability_total = len(listings),
+                    resell_amount = [
+                        StarsAmount(
+                            amount = price,
+                            nanos = 0
+                        )
+                    ]
+                )
+                for listing_id, (num, price) in page
+            ],
+            chats = [],
+            users = [],
+            next_offset = str(offset + query.limit) if offset + query.limit < len(listings) else None
+        )
+
+
+class CatalogScript(typing.Protocol):
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]: ...
+
+
+class FakeStorage:
+    def __init__(self, dc_id: int) -> None:
+        self._dc_id = dc_id
+
+    async def dc_id(self) -> int:
+        return self._dc_id
+
+    async def auth_key(self) -> bytes:
+        return bytes(256)
+
+    async def test_mode(self) -> bool:
+        return False
+
+
+class FakeClient:
+    """
+    Stands in for `pyrogram.Client`: serves a scripted star gifts catalog and canned stickers
+    with simulated latencies, and counts the calls the detector makes.
+    """
+
+    def __init__(
+        self,
+        catalog_script: CatalogScript,
+        rpc_latency: float = 0.05,
+        upload_latency: float = 0.25,
+        dc_id: int = 2,
+        resale_market: FakeResaleMarket | None = None
+    ) -> None:
+        self.catalog_script = catalog_script
+        self.resale_market = resale_market or FakeResaleMarket()
+        self.rpc_latency = rpc_latency
+        self.upload_latency = upload_latency
+        self.dc_id = dc_id
+
+        self.storage = FakeStorage(dc_id)
+        self.sleep_threshold = 60
+        self.is_connected = True
+
+        self.started_at = time.perf_counter()
+        self.polls_count = 0
+        self.upgrade_previews_count = 0
+        self.resale_pages_count = 0
+        self.star_gifts_served_at: dict[int, float] = {}  # {star_gift_id: perf_counter() of the first response with it}
+        self.upgrades_served_at: dict[int, float] = {}  # {star_gift_id: perf_counter() of the first response with its upgrade price}
+        self.sent_stickers: list[tuple[float, int | str, str]] = []  # [(perf_counter(), chat_id, file name or file ID), ...]
+        self.uploaded_files_count = 0
+
+        self._messages_count = 0
+
+    def get_elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    async def start(self) -> None:
+        self.is_connected = True
+
+    async def stop(self) -> None:
+        self.is_connected = False
+
+    async def invoke(self, query: typing.Any, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        await asyncio.sleep(self.rpc_latency)
+
+        if isinstance(query, GetStarGifts):
+            self.polls_count += 1
+
+            star_gifts = self.catalog_script.get_star_gifts(self.get_elapsed())
+            catalog_hash = hash(tuple(
+                (star_gift.id, star_gift.availability_remains, star_gift.upgrade_stars)
+                for star_gift in star_gifts
+            )) & 0x7FFFFFFF
+
+            if query.hash == catalog_hash:
+                return StarGiftsNotModified()
+
+            served_at = time.perf_counter()
+
+            for star_gift in star_gifts:
+                self.star_gifts_served_at.setdefault(star_gift.id, served_at)
+
+                if star_gift.upgrade_stars is not None:
+                    self.upgrades_served_at.setdefault(star_gift.id, served_at)
+
+            return StarGifts(
+                hash = catalog_hash,
+                gifts = star_gifts,
+                chats = [],
+                users = []
+            )
+
+        if isinstance(query, GetStarGiftUpgradePreview):
+            self.upgrade_previews_count += 1
+
+            if query.gift_id not in self.upgrades_served_at:
+                raise BadRequest("STARGIFT_UPGRADE_UNAVAILABLE")
+
+            return make_upgrade_preview(query.gift_id)
+
+        if isinstance(query, GetResaleStarGifts):
+            self.resale_pages_count += 1
+
+            return self.resale_market.get_page(query)
+
+        if isinstance(query, UploadMedia):
+            return MessageMediaDocument(
+                document = Document(
+                    id = query.media.file.id,
+                    access_hash = 0,
+                    file_reference = b"\x00",
+                    date = 0,
+                    mime_type = query.media.mime_type,
+                    size = STICKER_SIZE,
+                    dc_id = self.dc_id,
+                    attributes = query.media.attributes
+                )
+            )
+
+        if isinstance(query, ExportAuthorization):
+            return ExportedAuthorization(
+                id = query.dc_id,
+                bytes = b"\x00"
+            )
+
+        raise NotImplementedError(f"FakeClient does not serve {type(query).__name__}")
+
+    async def resolve_peer(self, peer_id: int | str) -> InputPeerEmpty:
+        return InputPeerEmpty()
+
+    def guess_mime_type(self, filename: str) -> str | None:
+        return "application/x-tgsticker"
+
+    async def save_file(self, path: BytesIO, **kwargs: typing.Any) -> InputFile:
+        await asyncio.sleep(self.upload_latency)
+
+        self.uploaded_files_count += 1
+
+        return InputFile(
+            id = self.uploaded_files_count,
+            parts = 1,
+            name = getattr(path, "name", ""),
+            md5_checksum = ""
+        )
+
+    async def send_sticker(self, chat_id: int | str, sticker: BytesIO | str, **kwargs: typing.Any) -> SimpleNamespace:
+        if isinstance(sticker, str):  # File ID of an already uploaded sticker
+            await asyncio.sleep(self.rpc_latency)
+
+        else:
+            await asyncio.sleep(self.rpc_latency + self.upload_latency)
+
+        self._messages_count += 1
+        self.sent_stickers.append((time.perf_counter(), chat_id, getattr(sticker, "name", str(sticker))))
+
+        return SimpleNamespace(
+            id = self._messages_count
+        )
+
+    async def download_media(self, message: str, in_memory: bool=True, **kwargs: typing.Any) -> BytesIO:
+        await asyncio.sleep(self.rpc_latency)
+
+        return BytesIO(get_sticker_bytes(0))
+
+
+class FakeAuth:
+    CREATE_LATENCY = 0.2
+
+    def __init__(self, client: FakeClient, dc_id: int, test_mode: bool) -> None:
+        self.dc_id = dc_id
+
+    async def create(self) -> bytes:
+        await asyncio.sleep(self.CREATE_LATENCY)
+
+        return bytes(256)
+
+
+class FakeSession:
+    """
+    Media session serving canned sticker documents for `userbot_helpers.download_documents`.
+    """
+
+    CONNECT_LATENCY = 0.1
+
+    def __init__(self, client: FakeClient, dc_id: int, auth_key: bytes, test_mode: bool, is_media: bool=False, is_cdn: bool=False) -> None:
+        self.client = client
+        self.dc_id = dc_id
+
+    async def start(self) -> None:
+        await asyncio.sleep(self.CONNECT_LATENCY)
+
+    async def stop(self) -> None:
+        pass
+
+    async def invoke(self, query: typing.Any, *args: typing.Any, **kwargs: typing.Any) -> typing.Any:
+        await asyncio.sleep(self.client.rpc_latency)
+
+        if isinstance(query, ImportAuthorization):
+            return True
+
+        if isinstance(query, GetFile):
+            sticker_bytes = get_sticker_bytes(query.location.id)
+
+            return File(
+                type = FilePartial(),
+                mtime = 0,
+                bytes = sticker_bytes[query.offset : query.offset + query.limit]
+            )
+
+        raise NotImplementedError(f"FakeSession does not serve {type(query).__name__}")
+
+
+@contextlib.contextmanager
+def patch_media_sessions() -> typing.Iterator[None]:
+    """
+    Makes `userbot_helpers.download_documents` talk to `FakeSession` instead of Telegram DCs.
+    """
+
+    original_session, original_auth = userbot_helpers.Session, userbot_helpers.Auth
+
+    userbot_helpers.Session = FakeSession  # pyright: ignore[reportAttributeAccessIssue]
+    userbot_helpers.Auth = FakeAuth  # pyright: ignore[reportAttributeAccessIssue]
+
+    try:
+        yield
+
+    finally:
+        userbot_helpers.Session = original_session
+        userbot_helpers.Auth = original_auth
@@ -0,0 +1,203 @@
+from pyrogram.raw.types.star_gift import StarGift
+from pathlib import Path
+
+import typing
+
+from traffic_recorder import CapturedResponse, iter_captures
+
+from .bot_api_stub import BotAPIStub
+from .fake_client import FakeClient, make_star_gift
+
+
+FIRST_SALE_DATE = 1_700_000_000
+
+
+class Scenario(typing.Protocol):
+    name: str
+    description: str
+    check_interval: float
+    timeout: float
+
+    posted_star_gifts_ids: set[int]  # Seeded gifts which already have a notification message
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]: ...
+
+    def is_done(self, client: FakeClient, bot_api_stub: BotAPIStub, elapsed: float) -> bool: ...
+
+
+def get_old_star_gifts(amount: int) -> list[StarGift]:
+    return [
+        make_star_gift(
+            star_gift_id = 5_000_000_000_000_000_000 + i,
+            price = 15 + i * 10,
+            total_amount = 10_000 if i % 3 == 0 else None,
+            available_amount = 0 if i % 3 == 0 else None,
+            first_sale_date = FIRST_SALE_DATE + i * 86_400,
+            last_sale_date = FIRST_SALE_DATE + i * 86_400 + 3_600 if i % 3 == 0 else None
+        )
+        for i in range(amount)
+    ]
+
+
+class DropScenario:
+    """
+    `new_amount` gifts appear in the catalog at once, `drop_at` seconds after the start.
+    """
+
+    def __init__(self, old_amount: int=100, new_amount: int=10, drop_at: float=1.0, check_interval: float=0.5, timeout: float=120.0) -> None:
+        self.name = f"drop{new_amount}"
+        self.description = f"{new_amount} gifts drop at once into a catalog of {old_amount}"
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.drop_at = drop_at
+
+        self.old_star_gifts = get_old_star_gifts(old_amount)
+        self.new_star_gifts = [
+            make_star_gift(
+                star_gift_id = 6_000_000_000_000_000_000 + i,
+                price = 100 * (i + 1),
+                total_amount = 5_000 * (i + 1),
+                available_amount = 5_000 * (i + 1),
+                first_sale_date = FIRST_SALE_DATE + 365 * 86_400
+            )
+            for i in range(new_amount)
+        ]
+
+        self.posted_star_gifts_ids: set[int] = set()
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]:
+        if elapsed < self.drop_at:
+            return self.old_star_gifts
+
+        return self.old_star_gifts + self.new_star_gifts
+
+    def is_done(self, client: FakeClient, bot_api_stub: BotAPIStub, elapsed: float) -> bool:
+        return len(bot_api_stub.get_requests("sendMessage")) >= len(self.new_star_gifts)
+
+
+class SellOutScenario:
+    """
+    A posted limited gift sells `sold_amount` of its `total_amount`, all of it by default, linearly
+    over `sell_duration` seconds of catalog time, replayed `speed` times faster than real time.
+    """
+
+    def __init__(self, total_amount: int=100_000, sold_amount: int | None = None, sell_duration: float=60.0, speed: float=6.0, check_interval: float=0.25) -> None:
+        sold_amount = total_amount if sold_amount is None else sold_amount
+
+        self.name = f"sell{sold_amount // 1000}k" + (f"of{total_amount // 1000}k" if sold_amount < total_amount else "")
+        self.description = f"one gift sells {sold_amount:,} of {total_amount:,} in {sell_duration:g}s (replayed {speed:g}x faster)"
+        self.check_interval = check_interval
+        self.total_amount = total_amount
+        self.sold_amount = sold_amount
+        self.sell_duration = sell_duration
+        self.speed = speed
+        self.timeout = sell_duration / speed + 5.0
+
+        self.star_gift_id = 7_000_000_000_000_000_000
+        self.old_star_gifts = get_old_star_gifts(100)
+
+        self.posted_star_gifts_ids = {self.star_gift_id}
+
+    def get_available_amount(self, elapsed: float) -> int:
+        return self.total_amount - min(self.sold_amount, int(self.sold_amount * elapsed * self.speed / self.sell_duration))
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]:
+        return self.old_star_gifts + [
+            make_star_gift(
+                star_gift_id = self.star_gift_id,
+                price = 2_500,
+                total_amount = self.total_amount,
+                available_amount = self.get_available_amount(elapsed),
+                first_sale_date = FIRST_SALE_DATE + 365 * 86_400
+            )
+        ]
+
+    def is_done(self, client: FakeClient, bot_api_stub: BotAPIStub, elapsed: float) -> bool:
+        return elapsed * self.speed >= self.sell_duration + self.check_interval * self.speed * 4
+
+
+class UpgradeScenario:
+    """
+    `upgradable_amount` posted gifts get an upgrade price in the catalog at once, `upgrade_at` seconds after the start.
+    """
+
+    def __init__(self, old_amount: int=100, upgradable_amount: int=10, upgrade_at: float=1.0, check_interval: float=0.5, timeout: float=60.0) -> None:
+        self.name = f"upgrade{upgradable_amount}"
+        self.description = f"{upgradable_amount} of {old_amount} posted gifts become upgradable at once"
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.upgrade_at = upgrade_at
+        self.upgradable_amount = upgradable_amount
+
+        self.old_star_gifts = get_old_star_gifts(old_amount)
+        self.upgradable_star_gifts = [
+            make_star_gift(
+                star_gift_id = star_gift.id,
+                price = star_gift.stars,
+                total_amount = star_gift.availability_total,
+                available_amount = star_gift.availability_remains,
+                first_sale_date = star_gift.first_sale_date,
+                last_sale_date = star_gift.last_sale_date,
+                upgrade_price = star_gift.stars * 2
+            )
+            for star_gift in self.old_star_gifts[:upgradable_amount]
+        ]
+
+        self.posted_star_gifts_ids = {star_gift.id for star_gift in self.old_star_gifts}
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]:
+        if elapsed < self.upgrade_at:
+            return self.old_star_gifts
+
+        return self.upgradable_star_gifts + self.old_star_gifts[self.upgradable_amount:]
+
+    def is_done(self, client: FakeClient, bot_api_stub: BotAPIStub, elapsed: float) -> bool:
+        return len(bot_api_stub.get_requests("sendMessage")) >= self.upgradable_amount
+
+
+class CaptureScenario:
+    """
+    Replays `getStarGifts` responses recorded by `traffic_recorder.TrafficRecorder`, `speed` times faster
+    than they were received. Captures are streamed, so only the current and the next response are in memory.
+    """
+
+    def __init__(self, path: Path, speed: float=60.0, check_interval: float=0.25) -> None:
+        self.name = "capture"
+        self.description = f"replay of {path} ({speed:g}x faster)"
+        self.check_interval = check_interval
+        self.speed = speed
+        self.timeout = float("inf")
+
+        self.posted_star_gifts_ids: set[int] = set()
+
+        self._captured_responses = iter_captures(path)
+
+        first_captured_response = next(self._captured_responses, None)
+
+        if first_captured_response is None:
+            raise ValueError(f"No captured responses in {path}")
+
+        self._started_at = first_captured_response.received_at
+        self._star_gifts = typing.cast(list[StarGift], first_captured_response.decode().gifts)
+        self._next_captured_response: CapturedResponse | None = next(self._captured_responses, None)
+
+        # Gifts of the first response are treated as already posted
+        self.posted_star_gifts_ids = {star_gift.id for star_gift in self._star_gifts}
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]:
+        while self._next_captured_response and self._next_captured_response.received_at - self._started_at <= elapsed * self.speed:
+            self._star_gifts = typing.cast(list[StarGift], self._next_captured_response.decode().gifts)
+            self._next_captured_response = next(self._captured_responses, None)
+
+        return self._star_gifts
+
+    def is_done(self, client: FakeClient, bot_api_stub: BotAPIStub, elapsed: float) -> bool:
+        return self._next_captured_response is None and client.polls_count > 0
+
+
+SCENARIOS: dict[str, typing.Callable[[], Scenario]] = {
+    "drop10": DropScenario,
+    "sell100k": SellOutScenario,
+    "sell1kof100k": lambda: SellOutScenario(sold_amount=1_000),
+    "upgrade10": UpgradeScenario
+}
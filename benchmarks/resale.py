@@ -0,0 +1,141 @@
+"""
+Scans a fake resale market with `resale.ResaleTracker`: a full scan first, then rounds of incremental
+scans while listings are sold, added below the floor and repriced. The tracked floor of every gift
+must match the market after each round.
+
+Usage: python -m benchmarks.resale [gifts] [listings per gift] [rounds]
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import sys
+import time
+import typing
+
+from resale import ResaleTracker
+
+from .replay.fake_client import FakeClient, FakeResaleMarket
+
+
+PAGE_SIZE = 100
+CONCURRENCY = 4
+RPC_LATENCY = 0.02
+FIRST_STAR_GIFT_ID = 5_000_000_000_000_000_000
+MIN_PRICE = 1_000
+MAX_PRICE = 100_000
+CHANGES_PER_ROUND = 10  # Per gift
+
+
+class EmptyCatalog:
+    def get_star_gifts(self, elapsed: float) -> list[typing.Any]:
+        return []
+
+
+def mutate_listings(listings: dict[int, tuple[int, int]], rng: random.Random, next_listing_id: int) -> int:
+    """
+    Sells the floor, lists below it and applies random sales, listings and price changes deeper in the book.
+    """
+
+    floor_listing_id = min(listings, key=lambda listing_id: listings[listing_id][1])
+    floor_price = listings.pop(floor_listing_id)[1]
+
+    if rng.random() < 0.5:
+        listings[next_listing_id] = (next_listing_id % 100_000, max(1, floor_price - rng.randint(1, 100)))
+        next_listing_id += 1
+
+    for _ in range(CHANGES_PER_ROUND):
+        action = rng.random()
+
+        if action < 0.4 and listings:
+            del listings[rng.choice(list(listings))]
+
+        elif action < 0.8:
+            listings[next_listing_id] = (next_listing_id % 100_000, rng.randint(MIN_PRICE, MAX_PRICE))
+            next_listing_id += 1
+
+        elif listings:
+            listing_id = rng.choice(list(listings))
+            listings[listing_id] = (listings[listing_id][0], rng.randint(MIN_PRICE, MAX_PRICE))
+
+    return next_listing_id
+
+
+async def run_benchmark(star_gifts_count: int, listings_count: int, rounds: int) -> dict[str, float]:
+    rng = random.Random(42)
+    logger = logging.getLogger(__name__)
+
+    market = FakeResaleMarket()
+    star_gift_ids = [FIRST_STAR_GIFT_ID + i for i in range(star_gifts_count)]
+    next_listing_id = 1
+
+    for star_gift_id in star_gift_ids:
+        market.listings[star_gift_id] = {}
+
+        for _ in range(listings_count):
+            market.listings[star_gift_id][next_listing_id] = (next_listing_id % 100_000, rng.randint(MIN_PRICE, MAX_PRICE))
+            next_listing_id += 1
+
+    client = typing.cast(typing.Any, FakeClient(EmptyCatalog(), rpc_latency=RPC_LATENCY, resale_market=market))
+    tracker = ResaleTracker(
+        page_size = PAGE_SIZE,
+        concurrency = CONCURRENCY,
+        floor_pages = 1,
+        full_scan_interval = float("inf")  # Only the first scan is full
+    )
+
+    started_at = time.perf_counter()
+
+    await tracker.scan_many(client, star_gift_ids, 0.0, logger)
+
+    full_scan_duration = time.perf_counter() - started_at
+    full_scan_pages = tracker.pages_count
+
+    round_durations: list[float] = []
+    floor_changes_count = 0
+    floor_mismatches = 0
+
+    for round_number in range(1, rounds + 1):
+        for star_gift_id in star_gift_ids:
+            next_listing_id = mutate_listings(market.listings[star_gift_id], rng, next_listing_id)
+
+        started_at = time.perf_counter()
+
+        floor_changes, _ = await tracker.scan_many(client, star_gift_ids, float(round_number), logger)
+
+        round_durations.append(time.perf_counter() - started_at)
+        floor_changes_count += len(floor_changes)
+
+        for star_gift_id in star_gift_ids:
+            floor = tracker.indexes[star_gift_id].get_floor()
+
+            if (floor.price if floor else None) != market.get_floor_price(star_gift_id):
+                floor_mismatches += 1
+
+    return {
+        "full_scan_pages": full_scan_pages,
+        "full_scan_seconds": full_scan_duration,
+        "pages_per_round": (tracker.pages_count - full_scan_pages) / rounds,
+        "round_p50_seconds": statistics.median(round_durations),
+        "floor_changes": floor_changes_count,
+        "floor_mismatches": floor_mismatches
+    }
+
+
+def main(star_gifts_count: int=20, listings_count: int=2_000, rounds: int=20) -> None:
+    results = asyncio.run(run_benchmark(star_gifts_count, listings_count, rounds))
+
+    print(f"{star_gifts_count} gifts with {listings_count:,} resale listings each, {rounds} rounds of changes:")
+
+    for key, value in results.items():
+        print(f"    {key:<20}", f"{value:,.3f}" if isinstance(value, float) else f"{value:,}")
+
+    if results["floor_mismatches"]:
+        print("Tracked floor prices don't match the market.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:4]))
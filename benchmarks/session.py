@@ -0,0 +1,138 @@
+"""
+Compares pyrogram's `FileStorage` with `session_storage.SessionStorage` on a session file with
+many peers: the `dc_id`/`test_mode`/`auth_key` lookups done for every document download and
+batches of peer updates on the event loop, then the flush. The flushed file must read back the
+same through `FileStorage`.
+
+Usage: python -m benchmarks.session [peers] [lookups]
+"""
+
+from pyrogram.storage import Storage, FileStorage
+from pathlib import Path
+
+import asyncio
+import sys
+import tempfile
+import time
+
+from session_storage import SessionStorage
+
+
+SESSION_NAME = "account"
+PEERS_BATCH_SIZE = 100
+
+
+def get_peers(peers_count: int, offset: int=0) -> list[tuple[int, int, str, str, str]]:
+    return [
+        (1_000_000 + i, (i + offset) * 7_919, "user", f"user{i}", f"{79_000_000_000 + i}")
+        for i in range(peers_count)
+    ]
+
+
+async def create_session(workdir: Path, peers_count: int) -> None:
+    storage = FileStorage(SESSION_NAME, workdir)
+
+    await storage.open()
+
+    await storage.dc_id(2)
+    await storage.api_id(12345)
+    await storage.test_mode(False)
+    await storage.auth_key(bytes(range(256)))
+    await storage.user_id(777)
+    await storage.is_bot(False)
+    await storage.update_peers(get_peers(peers_count))
+    await storage.update_usernames([(777, "me")])
+    await storage.update_state((777, 1, 2, 3, 4))
+
+    await storage.save()
+    await storage.close()
+
+
+async def read_session(workdir: Path) -> tuple[object, ...]:
+    storage = FileStorage(SESSION_NAME, workdir)
+
+    await storage.open()
+
+    try:
+        return (
+            await storage.dc_id(),
+            await storage.auth_key(),
+            await storage.user_id(),
+            sorted(await storage.update_state()),
+            storage.conn.execute("SELECT id, access_hash, username FROM peers ORDER BY id").fetchall(),
+            storage.conn.execute("SELECT id, peer_id FROM usernames ORDER BY id").fetchall()
+        )
+
+    finally:
+        await storage.close()
+
+
+async def time_storage(storage: Storage, peers_count: int, lookups: int) -> tuple[float, float, float]:
+    """
+    Per-lookup and per-batch seconds spent on the event loop and the seconds to save.
+    """
+
+    await storage.open()
+
+    started_at = time.perf_counter()
+
+    for _ in range(lookups):
+        await storage.dc_id()
+        await storage.test_mode()
+        await storage.auth_key()
+
+    lookup_duration = (time.perf_counter() - started_at) / lookups
+
+    batches = [get_peers(peers_count, offset=1)[i:i + PEERS_BATCH_SIZE] for i in range(0, peers_count, PEERS_BATCH_SIZE)]
+
+    started_at = time.perf_counter()
+
+    for batch in batches:
+        await storage.update_peers(batch)
+        await storage.update_state((777, 5, 6, 7, 8))
+
+    update_duration = (time.perf_counter() - started_at) / len(batches)
+
+    await storage.update_usernames([(777, "me"), (1_000_000, "me2")])
+
+    started_at = time.perf_counter()
+
+    await storage.save()
+
+    save_duration = time.perf_counter() - started_at
+
+    await storage.close()
+
+    return lookup_duration, update_duration, save_duration
+
+
+async def run_benchmark(peers_count: int, lookups: int) -> bool:
+    results: dict[str, tuple[float, float, float]] = {}
+    sessions: dict[str, tuple[object, ...]] = {}
+
+    for name, storage_class in (("FileStorage", FileStorage), ("SessionStorage", SessionStorage)):
+        with tempfile.TemporaryDirectory() as dirpath:
+            workdir = Path(dirpath)
+
+            await create_session(workdir, peers_count)
+
+            results[name] = await time_storage(storage_class(SESSION_NAME, workdir), peers_count, lookups)
+            sessions[name] = await read_session(workdir)
+
+    print(f"Session with {peers_count:,} peers, {lookups:,} download lookups, peer updates in batches of {PEERS_BATCH_SIZE}:")
+
+    for name, (lookup_duration, update_duration, save_duration) in results.items():
+        print(f"    {name:<15} lookup {lookup_duration * 1_000_000:8.2f} us, update batch {update_duration * 1000:7.3f} ms, save {save_duration * 1000:7.2f} ms")
+
+    return sessions["FileStorage"] == sessions["SessionStorage"]
+
+
+def main(peers_count: int=10_000, lookups: int=1_000) -> None:
+    if not asyncio.run(run_benchmark(peers_count, lookups)):
+        print("The session flushed by SessionStorage doesn't match FileStorage.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
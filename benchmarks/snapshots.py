@@ -0,0 +1,133 @@
+"""
+Times saving a large gifts data store while a writer keeps updating it: the whole store dumped on
+the event loop, as before snapshots, against a snapshot encoded from the cached encodings of the
+unchanged gifts and written in a thread. The longest event loop stall is measured by a ticker, and
+every saved file must match the snapshot it was written from.
+
+Usage: python -m benchmarks.snapshots [gifts] [saves] [updated gifts per save]
+"""
+
+from pathlib import Path
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+from star_gifts_data import StarGiftsData
+
+import json_codec
+
+from .json_codec import get_star_gifts_data
+
+
+TICK_INTERVAL = 0.001
+
+
+async def ticker(stalls: list[float]) -> None:
+    while True:
+        started_at = time.perf_counter()
+
+        await asyncio.sleep(TICK_INTERVAL)
+
+        stalls.append(time.perf_counter() - started_at - TICK_INTERVAL)
+
+
+async def writer(star_gifts_data: StarGiftsData, updates: list[int]) -> None:
+    """
+    Keeps selling gifts, replacing them as `process_update_gifts` does.
+    """
+
+    while True:
+        star_gift = star_gifts_data.star_gifts[len(updates) % len(star_gifts_data.star_gifts)]
+
+        star_gifts_data.update(star_gift.id, available_amount=star_gift.available_amount - 1)
+        updates.append(star_gift.id)
+
+        await asyncio.sleep(0)
+
+
+def save_in_place(star_gifts_data: StarGiftsData) -> None:
+    temp_filepath = star_gifts_data.DATA_FILEPATH.with_name(star_gifts_data.DATA_FILEPATH.name + ".tmp")
+    temp_filepath.write_bytes(json_codec.dumps(star_gifts_data.model_dump()))
+    temp_filepath.replace(star_gifts_data.DATA_FILEPATH)
+
+
+async def run_saves(star_gifts_data: StarGiftsData, saves_count: int, updated_count: int, snapshots: bool) -> tuple[float, float, bool]:
+    """
+    Median save seconds, median of the longest event loop stall during each save and whether every
+    saved file matched its snapshot.
+    """
+
+    stalls: list[float] = []
+    save_durations: list[float] = []
+    max_stalls: list[float] = []
+    is_consistent = True
+
+    ticker_task = asyncio.create_task(ticker(stalls))
+
+    await asyncio.to_thread(lambda: None)  # Starts the worker thread
+
+    for _ in range(saves_count):
+        for star_gift in star_gifts_data.star_gifts[:updated_count]:
+            star_gifts_data.update(star_gift.id, available_amount=star_gift.available_amount - 1)
+
+        await asyncio.sleep(TICK_INTERVAL * 5)
+
+        updates: list[int] = []
+        writer_task = asyncio.create_task(writer(star_gifts_data, updates))
+
+        stalls.clear()
+
+        started_at = time.perf_counter()
+
+        snapshot = star_gifts_data.snapshot()
+
+        if snapshots:
+            await star_gifts_data.save_async(snapshot)
+
+        else:
+            save_in_place(star_gifts_data)
+
+        save_durations.append(time.perf_counter() - started_at)
+
+        await asyncio.sleep(TICK_INTERVAL * 2)  # The stall of the tick spanning the end of the save
+
+        writer_task.cancel()
+        max_stalls.append(max(stalls))
+
+        if snapshots:
+            is_consistent &= StarGiftsData.load(star_gifts_data.DATA_FILEPATH).star_gifts == list(snapshot.star_gifts)
+            is_consistent &= not updates or star_gifts_data.version > snapshot.version
+
+    ticker_task.cancel()
+
+    return statistics.median(save_durations), statistics.median(max_stalls), is_consistent
+
+
+def main(star_gifts_count: int=5_000, saves_count: int=20, updated_count: int=20) -> None:
+    print(f"{star_gifts_count:,} gifts, {updated_count} updated before each of {saves_count} saves:")
+
+    is_consistent = True
+
+    with tempfile.TemporaryDirectory() as dirpath:
+        for snapshots in (False, True):
+            star_gifts_data = get_star_gifts_data(Path(dirpath) / "star_gifts.json", star_gifts_count)
+
+            star_gifts_data.save()
+
+            save_duration, max_stall, is_saved_consistent = asyncio.run(run_saves(star_gifts_data, saves_count, updated_count, snapshots))
+
+            is_consistent &= is_saved_consistent
+
+            print(f"    {'snapshot' if snapshots else 'in place':<9} save {save_duration * 1000:7.2f} ms, longest event loop stall {max_stall * 1000:7.2f} ms")
+
+    if not is_consistent:
+        print("A saved file didn't match the snapshot it was written from.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:4]))
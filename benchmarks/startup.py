@@ -0,0 +1,71 @@
+"""
+Measures cold-start import time of the detector with `python -X importtime`.
+
+Usage: python -m benchmarks.startup [runs] [module]
+"""
+
+from pathlib import Path
+
+import statistics
+import subprocess
+import sys
+
+
+WORK_DIRPATH = Path(__file__).parent.parent
+
+TOP_IMPORTS_AMOUNT = 15
+
+
+def measure_import_time(module: str) -> dict[str, int]:  # {imported package: cumulative microseconds}
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd = WORK_DIRPATH,
+        capture_output = True,
+        text = True,
+        check = True
+    )
+
+    cumulative_times: dict[str, int] = {}
+
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+
+        _, cumulative, package = line.removeprefix("import time:").split("|", 2)
+
+        # Keep the indentation: `-X importtime` nests imports by two spaces per level
+        cumulative_times[package.rstrip()[1:]] = int(cumulative)
+
+    return cumulative_times
+
+
+def main(runs: int=5, module: str="detector") -> None:
+    measurements = [
+        measure_import_time(module)
+        for _ in range(runs)
+    ]
+
+    total_times = [
+        measurement[module]
+        for measurement in measurements
+    ]
+
+    print(f"import {module}: median {statistics.median(total_times) / 1000:.1f} ms, min {min(total_times) / 1000:.1f} ms over {runs} runs")
+
+    direct_imports_times = {
+        package.strip(): statistics.median(
+            measurement.get(package, 0)
+            for measurement in measurements
+        )
+        for package in measurements[0]
+        if package.startswith("  ") and not package.startswith("    ")
+    }
+
+    print(f"\nTop {TOP_IMPORTS_AMOUNT} direct imports of {module} by cumulative time:")
+
+    for package, cumulative in sorted(direct_imports_times.items(), key=lambda item: item[1], reverse=True)[:TOP_IMPORTS_AMOUNT]:
+        print(f"{cumulative / 1000:>10.1f} ms  {package}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), *sys.argv[2:3])
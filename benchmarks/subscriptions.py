@@ -0,0 +1,142 @@
+"""
+Times matching new gifts against many subscription filters with `SubscriptionIndex` and with every
+filter evaluated in turn. Both must find the same chats, also after subscriptions are replaced and
+removed one by one.
+
+Usage: python -m benchmarks.subscriptions [subscriptions] [gifts]
+"""
+
+import random
+import sys
+import time
+
+from star_gifts_data import StarGiftData
+from subscriptions import SubscriptionFilter, SubscriptionIndex
+
+
+ROUND_PRICES = (15, 25, 50, 100, 250, 500, 1_000, 2_500, 5_000, 10_000, 25_000, 50_000)
+ROUND_TOTAL_AMOUNTS = (500, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000)
+
+
+def get_bound(rng: random.Random, values: tuple[int, ...]) -> int:
+    """
+    Mostly round values, as users type them.
+    """
+
+    value = rng.choice(values)
+
+    return value if rng.random() < 0.8 else rng.randint(value // 2, value)
+
+
+def get_random_filter(rng: random.Random) -> SubscriptionFilter:
+    subscription_filter = SubscriptionFilter(
+        limited_only = rng.random() < 0.5,
+        exclude_premium = rng.random() < 0.3
+    )
+
+    if rng.random() < 0.7:
+        subscription_filter.max_price = get_bound(rng, ROUND_PRICES)
+
+    if rng.random() < 0.2:
+        subscription_filter.min_price = get_bound(rng, ROUND_PRICES[:6])
+
+    if rng.random() < 0.4:
+        subscription_filter.max_total_amount = get_bound(rng, ROUND_TOTAL_AMOUNTS)
+
+    if rng.random() < 0.1:
+        subscription_filter.min_total_amount = get_bound(rng, ROUND_TOTAL_AMOUNTS[:4])
+
+    return subscription_filter
+
+
+def get_random_star_gift(rng: random.Random, i: int) -> StarGiftData:
+    is_limited = rng.random() < 0.7
+    total_amount = rng.choice((rng.randint(100, 1_000_000), *ROUND_TOTAL_AMOUNTS)) if is_limited else 0
+
+    return StarGiftData(
+        id = 5_000_000_000_000_000_000 + i,
+        number = i + 1,
+        sticker_file_id = "",
+        sticker_file_name = "",
+        price = rng.choice((rng.randint(15, 100_000), *ROUND_PRICES)),
+        convert_price = 0,
+        available_amount = total_amount,
+        total_amount = total_amount,
+        require_premium = rng.random() < 0.3,
+        is_limited = is_limited
+    )
+
+
+def match_naive(subscriptions: dict[int, SubscriptionFilter], star_gift: StarGiftData) -> list[int]:
+    return [
+        chat_id
+        for chat_id, subscription_filter in subscriptions.items()
+        if subscription_filter.matches(star_gift)
+    ]
+
+
+def check(index: SubscriptionIndex, subscriptions: dict[int, SubscriptionFilter], star_gifts: list[StarGiftData]) -> bool:
+    return all(
+        sorted(index.match(star_gift)) == sorted(match_naive(subscriptions, star_gift))
+        for star_gift in star_gifts
+    )
+
+
+def main(subscriptions_count: int=100_000, star_gifts_count: int=100) -> None:
+    rng = random.Random(0)
+
+    subscriptions = {
+        1_000_000 + i: get_random_filter(rng)
+        for i in range(subscriptions_count)
+    }
+    star_gifts = [get_random_star_gift(rng, i) for i in range(star_gifts_count)]
+
+    started_at = time.perf_counter()
+    index = SubscriptionIndex.build(subscriptions)
+    build_duration = time.perf_counter() - started_at
+
+    print(f"{subscriptions_count:,} subscriptions, {star_gifts_count} gifts, index built in {build_duration * 1000:.1f} ms:")
+
+    matched = 0
+
+    for name, match in (
+        ("naive", lambda star_gift: match_naive(subscriptions, star_gift)),
+        ("index", index.match)
+    ):
+        started_at = time.perf_counter()
+
+        matched = sum(len(match(star_gift)) for star_gift in star_gifts)
+
+        duration = (time.perf_counter() - started_at) / star_gifts_count
+
+        print(f"    {name:<6} {duration * 1000:8.2f} ms/gift, {1 / duration:8.1f} gifts/s, {matched / star_gifts_count:9,.0f} chats/gift")
+
+    is_correct = check(index, subscriptions, star_gifts)
+
+    started_at = time.perf_counter()
+
+    for chat_id in rng.sample(list(subscriptions), subscriptions_count // 10):
+        if rng.random() < 0.5:
+            del subscriptions[chat_id]
+            index.remove(chat_id)
+
+        else:
+            subscriptions[chat_id] = get_random_filter(rng)
+            index.add(chat_id, subscriptions[chat_id])
+
+    for i in range(subscriptions_count // 20):
+        subscriptions[2_000_000 + i] = get_random_filter(rng)
+        index.add(2_000_000 + i, subscriptions[2_000_000 + i])
+
+    updates_duration = (time.perf_counter() - started_at) / (subscriptions_count // 10 + subscriptions_count // 20)
+
+    print(f"    incremental updates {updates_duration * 1_000_000:.1f} us each")
+
+    if not (is_correct and len(index) == len(subscriptions) and check(index, subscriptions, star_gifts)):
+        print("The index matched different chats than evaluating every filter.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
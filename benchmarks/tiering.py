@@ -0,0 +1,160 @@
+"""
+Times poll cycles over a large catalog where only a few gifts are still selling: parsing the
+`getStarGifts` response and saving the data, with every gift in the hot tier and with inactive
+gifts archived. An archived gift changed in the catalog must be promoted once, not on every poll.
+
+Usage: python -m benchmarks.tiering [gifts] [active gifts] [cycles]
+"""
+
+from pyrogram.raw.types.star_gift import StarGift
+from pathlib import Path
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+import typing
+
+from parse_data import get_all_star_gifts
+from star_gifts_data import StarGiftsData
+
+from .replay.fake_client import FakeClient, make_star_gift
+
+
+FIRST_STAR_GIFT_ID = 5_000_000_000_000_000_000
+TOTAL_AMOUNT = 100_000
+UPGRADE_PRICE = 25_000
+
+
+class SellingCatalog:
+    """
+    `active_amount` limited gifts still selling, the rest sold out or unlimited and upgradable.
+    """
+
+    def __init__(self, star_gifts_count: int, active_amount: int) -> None:
+        self.star_gifts_count = star_gifts_count
+        self.active_amount = active_amount
+        self.sold = 0
+        self.restocked_star_gift_id: int | None = None
+
+    def get_star_gifts(self, elapsed: float) -> list[StarGift]:
+        star_gifts: list[StarGift] = []
+
+        for i in range(self.star_gifts_count):
+            star_gift_id = FIRST_STAR_GIFT_ID + i
+            is_active = i >= self.star_gifts_count - self.active_amount
+            is_limited = is_active or i % 3 == 0
+
+            star_gifts.append(make_star_gift(
+                star_gift_id = star_gift_id,
+                price = 15 + i % 100 * 10,
+                total_amount = TOTAL_AMOUNT if is_limited else None,
+                available_amount = (
+                    TOTAL_AMOUNT - self.sold if is_active else
+                    1 if star_gift_id == self.restocked_star_gift_id else
+                    0 if is_limited else
+                    None
+                ),
+                upgrade_price = None if is_active else UPGRADE_PRICE
+            ))
+
+        return star_gifts
+
+
+async def run_cycles(client: FakeClient, catalog: SellingCatalog, star_gifts_data: StarGiftsData, cycles: int, tiered: bool) -> tuple[float, float]:
+    """
+    Median parse and save seconds per cycle.
+    """
+
+    parse_durations: list[float] = []
+    save_durations: list[float] = []
+
+    for _ in range(cycles):
+        catalog.sold += 7
+
+        started_at = time.perf_counter()
+
+        _, all_star_gifts_dict = await get_all_star_gifts(
+            typing.cast(typing.Any, client),
+            archived_star_gifts = star_gifts_data.archived_star_gifts if tiered else None
+        )
+
+        parse_durations.append(time.perf_counter() - started_at)
+
+        for star_gift in star_gifts_data.snapshot().star_gifts:
+            new_star_gift = all_star_gifts_dict.get(star_gift.id)
+
+            if new_star_gift is not None and new_star_gift.available_amount != star_gift.available_amount:
+                star_gifts_data.update(star_gift.id, available_amount=new_star_gift.available_amount)
+
+        started_at = time.perf_counter()
+
+        star_gifts_data.save()
+
+        save_durations.append(time.perf_counter() - started_at)
+
+    return statistics.median(parse_durations), statistics.median(save_durations)
+
+
+async def run_benchmark(star_gifts_count: int, active_amount: int, cycles: int) -> bool:
+    print(f"{star_gifts_count:,} gifts, {active_amount} still selling, median of {cycles} poll cycles:")
+
+    is_promoted = False
+
+    for tiered in (False, True):
+        catalog = SellingCatalog(star_gifts_count, active_amount)
+        client = FakeClient(catalog, rpc_latency=0.0)
+
+        with tempfile.TemporaryDirectory() as dirpath:
+            star_gifts_data = StarGiftsData.load(Path(dirpath) / "star_gifts.json", new=True)
+
+            _, all_star_gifts_dict = await get_all_star_gifts(typing.cast(typing.Any, client))
+
+            for star_gift in all_star_gifts_dict.values():
+                star_gift.is_upgradable = star_gift.upgrade_price is not None  # Notified before
+
+            star_gifts_data.replace_star_gifts(all_star_gifts_dict.values())
+
+            if tiered:
+                star_gifts_data.demote_inactive()
+
+            star_gifts_data.save()
+
+            parse_duration, save_duration = await run_cycles(client, catalog, star_gifts_data, cycles, tiered)
+
+            print(f"    {'tiered' if tiered else 'flat':<7} hot {len(star_gifts_data.star_gifts):>7,}, parse {parse_duration * 1000:7.2f} ms, save {save_duration * 1000:7.2f} ms")
+
+            if tiered:
+                catalog.restocked_star_gift_id = FIRST_STAR_GIFT_ID
+
+                _, all_star_gifts_dict = await get_all_star_gifts(
+                    typing.cast(typing.Any, client),
+                    archived_star_gifts = star_gifts_data.archived_star_gifts
+                )
+
+                promoted_star_gifts = star_gifts_data.promote(all_star_gifts_dict.keys() & star_gifts_data.archived_star_gifts.keys())
+                star_gifts_data.demote_inactive(all_star_gifts_dict)  # Increases aren't stored, so it is archived again
+
+                _, all_star_gifts_dict = await get_all_star_gifts(
+                    typing.cast(typing.Any, client),
+                    archived_star_gifts = star_gifts_data.archived_star_gifts
+                )
+
+                is_promoted = (
+                    [star_gift.id for star_gift in promoted_star_gifts] == [FIRST_STAR_GIFT_ID]
+                    and not all_star_gifts_dict.keys() & star_gifts_data.archived_star_gifts.keys()
+                )
+
+    return is_promoted
+
+
+def main(star_gifts_count: int=5_000, active_amount: int=20, cycles: int=20) -> None:
+    if not asyncio.run(run_benchmark(star_gifts_count, active_amount, cycles)):
+        print("The archived gift changed in the catalog wasn't promoted exactly once.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:4]))
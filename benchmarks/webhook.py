@@ -0,0 +1,159 @@
+"""
+Simulates Telegram delivering `/start` updates to the bot webhook server and measures how fast
+they are accepted and answered through a local Bot API stub. An update with a wrong secret token
+must be rejected.
+
+Usage: python -m benchmarks.webhook [updates] [concurrency]
+"""
+
+from httpx import AsyncClient
+
+import asyncio
+import logging
+import statistics
+import sys
+import time
+import typing
+
+from bot_updates import SECRET_TOKEN_HEADER, create_webhook_server
+
+from .replay.bot_api_stub import BotAPIStub
+
+import detector
+import config
+
+
+WEBHOOK_BOT_TOKEN = "1000001:webhook"
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET_TOKEN = "benchmark-secret"
+FIRST_USER_ID = 100_000
+REPLIES_TIMEOUT = 60.0
+
+
+def make_update(i: int) -> dict[str, typing.Any]:
+    user_id = FIRST_USER_ID + i
+
+    return {
+        "update_id": i,
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Benchmark"},
+            "text": "/start"
+        }
+    }
+
+
+async def run_benchmark(updates_count: int, concurrency: int) -> dict[str, float]:
+    bot_api_stub = BotAPIStub()
+
+    await bot_api_stub.start()
+
+    config.START_SEND_TEST_TO_CHANNELS = False
+    config.NOTIFY_UPGRADES_CHAT_ID = None
+
+    detector.PRIMARY_BOT_TOKEN = WEBHOOK_BOT_TOKEN
+    detector.logger.setLevel(logging.WARNING)
+
+    server = create_webhook_server(
+        dispatcher = detector.BOT_UPDATES_DISPATCHER,
+        host = "127.0.0.1",
+        port = 0,
+        path = WEBHOOK_PATH,
+        secret_token = WEBHOOK_SECRET_TOKEN,
+        logger = detector.logger
+    )
+
+    await server.start()
+
+    try:
+        async with AsyncClient(base_url=bot_api_stub.base_url) as bot_http_client:
+            detector.BOT_HTTP_CLIENT = bot_http_client
+
+            port = typing.cast(asyncio.Server, server._server).sockets[0].getsockname()[1]  # pyright: ignore[reportPrivateUsage]
+
+            async with AsyncClient(base_url=f"http://127.0.0.1:{port}") as sender:
+                rejected_status = (await sender.post(
+                    WEBHOOK_PATH,
+                    json = make_update(-1),
+                    headers = {SECRET_TOKEN_HEADER: "wrong"}
+                )).status_code
+
+                semaphore = asyncio.Semaphore(concurrency)
+                sent_at: dict[int, float] = {}
+                accept_latencies: list[float] = []
+
+                async def send_update(i: int) -> None:
+                    async with semaphore:
+                        sent_at[FIRST_USER_ID + i] = started_at = time.perf_counter()
+
+                        (await sender.post(
+                            WEBHOOK_PATH,
+                            json = make_update(i),
+                            headers = {SECRET_TOKEN_HEADER: WEBHOOK_SECRET_TOKEN}
+                        )).raise_for_status()
+
+                        accept_latencies.append(time.perf_counter() - started_at)
+
+                started_at = time.perf_counter()
+
+                await asyncio.gather(*(
+                    send_update(i)
+                    for i in range(updates_count)
+                ))
+
+                accepted_in = time.perf_counter() - started_at
+
+                while True:
+                    replies = {
+                        data["chat_id"]: received_at
+                        for received_at, _, _, data in bot_api_stub.get_requests("sendMessage")
+                        if data.get("chat_id") in sent_at
+                    }
+
+                    if len(replies) >= updates_count or time.perf_counter() - started_at > REPLIES_TIMEOUT:
+                        break
+
+                    await asyncio.sleep(0.01)
+
+                answered_in = time.perf_counter() - started_at
+
+    finally:
+        await server.stop()
+        await bot_api_stub.stop()
+
+    reply_latencies = sorted(
+        (received_at - sent_at[chat_id]) * 1000
+        for chat_id, received_at in replies.items()
+    )
+    accept_latencies_ms = sorted(latency * 1000 for latency in accept_latencies)
+
+    return {
+        "rejected_status": rejected_status,
+        "replies": len(replies),
+        "accepted_per_second": updates_count / accepted_in,
+        "answered_per_second": len(replies) / answered_in,
+        "accept_p50_ms": statistics.median(accept_latencies_ms),
+        "accept_p99_ms": accept_latencies_ms[int(len(accept_latencies_ms) * 0.99) - 1],
+        "reply_p50_ms": statistics.median(reply_latencies) if reply_latencies else 0.0,
+        "reply_p99_ms": reply_latencies[int(len(reply_latencies) * 0.99) - 1] if reply_latencies else 0.0
+    }
+
+
+def main(updates_count: int=1_000, concurrency: int=40) -> None:
+    results = asyncio.run(run_benchmark(updates_count, concurrency))
+
+    print(f"{updates_count:,} /start updates sent to the webhook with {concurrency} in flight:")
+
+    for key, value in results.items():
+        print(f"    {key:<20}", f"{value:,.3f}" if isinstance(value, float) else f"{value:,}")
+
+    if results["rejected_status"] != 401 or results["replies"] != updates_count:
+        print("Webhook did not reject the wrong secret token or did not answer every update.")
+
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,126 @@
+"""
+Dispatching of Bot API updates to command handlers, received either by `getUpdates`
+long polling or by a webhook served with `http_server.HTTPServer`.
+"""
+
+from http import HTTPStatus
+from logging import Logger
+
+import asyncio
+import hmac
+import typing
+
+from http_server import HTTPServer, HTTPRequest, HTTPResponse
+
+import json_codec
+
+
+SECRET_TOKEN_HEADER = "x-telegram-bot-api-secret-token"
+ALLOWED_UPDATES = ["message", "channel_post"]
+
+UPDATE_T = dict[str, typing.Any]
+MESSAGE_T = dict[str, typing.Any]
+COMMAND_HANDLER_T = typing.Callable[[MESSAGE_T, str], typing.Awaitable[None]]  # (message, arguments)
+
+
+class BotUpdatesDispatcher:
+    """
+    Routes `/command arguments` messages to handlers registered with `command`,
+    `/command@bot_username` is accepted as well. Other updates are ignored.
+    """
+
+    def __init__(self, logger: Logger) -> None:
+        self.logger = logger
+
+        self._commands: dict[str, COMMAND_HANDLER_T] = {}
+        self._tasks: set[asyncio.Task[typing.Any]] = set()
+
+    def add_command(self, name: str, handler: COMMAND_HANDLER_T) -> None:
+        self._commands[name.lower()] = handler
+
+    def command(self, name: str) -> typing.Callable[[COMMAND_HANDLER_T], COMMAND_HANDLER_T]:
+        def decorator(handler: COMMAND_HANDLER_T) -> COMMAND_HANDLER_T:
+            self.add_command(name, handler)
+
+            return handler
+
+        return decorator
+
+    async def dispatch(self, update: UPDATE_T) -> None:
+        message: MESSAGE_T = update.get("message") or update.get("channel_post") or {}
+        text = (message.get("text") or "").strip()
+
+        if not text.startswith("/") or not (message.get("chat") or {}).get("id"):
+            return
+
+        command, _, arguments = text[1:].partition(" ")
+        handler = self._commands.get(command.split("@", 1)[0].lower())
+
+        if handler is None:
+            return
+
+        try:
+            await handler(message, arguments.strip())
+
+        except Exception as ex:
+            self.logger.exception(f"Error while handling /{command} from update {update.get('update_id')}", exc_info=ex)
+
+    def create_task(self, coro: typing.Coroutine[typing.Any, typing.Any, typing.Any]) -> None:
+        """
+        Runs the coroutine in a background task kept until it is done, for handlers
+        which shouldn't hold up the next updates.
+        """
+
+        task = asyncio.create_task(coro)
+
+        self._tasks.add(task)
+
+        task.add_done_callback(self._tasks.discard)
+
+    def dispatch_nowait(self, update: UPDATE_T) -> None:
+        """
+        Handles the update in a background task, so the sender doesn't wait for the handler.
+        """
+
+        self.create_task(self.dispatch(update))
+
+
+def create_webhook_server(
+    dispatcher: BotUpdatesDispatcher,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str | None,
+    logger: Logger
+) -> HTTPServer:
+    """
+    Accepts updates POSTed by Telegram to `path`. Requests without the `secret_token`
+    passed to `setWebhook` are rejected, and every update is answered before it is handled,
+    so slow handlers don't make Telegram retry.
+    """
+
+    server = HTTPServer(
+        host = host,
+        port = port,
+        logger = logger
+    )
+
+    @server.route("POST", path)
+    async def webhook_handler(request: HTTPRequest) -> HTTPResponse:  # pyright: ignore[reportUnusedFunction]
+        if secret_token and not hmac.compare_digest(request.headers.get(SECRET_TOKEN_HEADER, "").encode(), secret_token.encode()):
+            return HTTPResponse(HTTPStatus.UNAUTHORIZED, b"Unauthorized")
+
+        try:
+            update = json_codec.loads(request.body)
+
+        except ValueError:
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"Invalid JSON")
+
+        if not isinstance(update, dict):
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"Update must be an object")
+
+        dispatcher.dispatch_nowait(typing.cast(UPDATE_T, update))
+
+        return HTTPResponse(HTTPStatus.OK, content_type=None)
+
+    return server
@@ -0,0 +1,242 @@
+"""
+Local read-only HTTP/JSON API over the in-memory star gifts catalog.
+
+Every change of the catalog bumps `CatalogVersions.version`. Response bodies are serialized
+once per version and served with an ETag, so polls of an unchanged catalog are answered with
+`304 Not Modified` without touching the gifts at all.
+
+Endpoints:
+    GET /gifts                  all gifts
+    GET /gifts/limited          limited gifts only
+    GET /gifts/changes?since=N  gifts changed after version N (all of them if N is from a previous run)
+    GET /gifts/{id}             a single gift
+    GET /gifts/{id}/upgrade     cached upgrade preview of a gift
+    GET /stickers/{document_id} sticker of an upgrade preview model or pattern
+    GET /events                 Server-Sent Events of gift changes, see `event_bus`
+"""
+
+from http import HTTPStatus
+from logging import Logger
+
+import time
+import typing
+
+from http_server import HTTPServer, HTTPRequest, HTTPResponse
+from event_bus import EventBus, create_sse_handler
+from star_gifts_data import StarGiftData
+from upgrade_previews import UpgradePreviewsCache
+
+import json_codec
+
+
+STICKER_CONTENT_TYPE = "application/x-tgsticker"
+MAX_CACHED_BODIES = 1024  # Per version, bounds the distinct `since` values cached
+
+
+class CatalogVersions:
+    """
+    Version of the catalog and the version each gift last changed at.
+
+    Versions start from the start time in microseconds, so versions of a previous run are
+    always older than `base_version` and clients holding one get a full resync.
+    """
+
+    def __init__(self) -> None:
+        self.base_version = time.time_ns() // 1000
+        self.version = self.base_version
+
+        self.changed_at: dict[int, int] = {}  # {star_gift_id: version}
+
+    def touch(self, *star_gift_ids: int) -> None:
+        self.version += 1
+
+        for star_gift_id in star_gift_ids:
+            self.changed_at[star_gift_id] = self.version
+
+    def get_changed_at(self, star_gift_id: int) -> int:
+        return self.changed_at.get(star_gift_id, self.base_version)
+
+
+class CatalogAPI:
+    def __init__(
+        self,
+        get_star_gifts: typing.Callable[[], list[StarGiftData]],
+        versions: CatalogVersions,
+        upgrade_previews: UpgradePreviewsCache | None = None,
+        get_sticker: typing.Callable[[int, str], typing.Awaitable[bytes | None]] | None = None  # (document_id, file_id)
+    ) -> None:
+        self.get_star_gifts = get_star_gifts
+        self.versions = versions
+        self.upgrade_previews = upgrade_previews
+        self.get_sticker = get_sticker
+
+        self._cache_version = versions.version
+        self._cache: dict[str, bytes] = {}
+
+    def _get_body(self, key: str, build: typing.Callable[[], typing.Any]) -> bytes:
+        if self._cache_version != self.versions.version or len(self._cache) >= MAX_CACHED_BODIES:
+            self._cache.clear()
+            self._cache_version = self.versions.version
+
+        body = self._cache.get(key)
+
+        if body is None:
+            body = self._cache[key] = json_codec.dumps(build())
+
+        return body
+
+    def _respond(self, request: HTTPRequest, etag_version: int, key: str, build: typing.Callable[[], typing.Any]) -> HTTPResponse:
+        etag = f'"{etag_version}"'
+
+        if_none_match = request.headers.get("if-none-match")
+
+        if if_none_match and (if_none_match.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            return HTTPResponse(
+                status = HTTPStatus.NOT_MODIFIED,
+                content_type = None,
+                headers = {"ETag": etag}
+            )
+
+        return HTTPResponse(
+            status = HTTPStatus.OK,
+            body = self._get_body(key, build),
+            content_type = json_codec.JSON_CONTENT_TYPE,
+            headers = {"ETag": etag}
+        )
+
+    def _dump_star_gifts(self, star_gifts: typing.Iterable[StarGiftData]) -> dict[str, typing.Any]:
+        return {
+            "version": self.versions.version,
+            "star_gifts": [
+                star_gift.model_dump(mode="json")
+                for star_gift in star_gifts
+            ]
+        }
+
+    async def list_handler(self, request: HTTPRequest) -> HTTPResponse:
+        return self._respond(request, self.versions.version, "all", lambda: self._dump_star_gifts(
+            self.get_star_gifts()
+        ))
+
+    async def limited_handler(self, request: HTTPRequest) -> HTTPResponse:
+        return self._respond(request, self.versions.version, "limited", lambda: self._dump_star_gifts(
+            star_gift
+            for star_gift in self.get_star_gifts()
+            if star_gift.is_limited
+        ))
+
+    async def changes_handler(self, request: HTTPRequest) -> HTTPResponse:
+        try:
+            since = int(request.query.get("since", 0))
+
+        except ValueError:
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"`since` must be an integer version")
+
+        is_full = not self.versions.base_version <= since <= self.versions.version
+
+        def build() -> dict[str, typing.Any]:
+            return self._dump_star_gifts(
+                star_gift
+                for star_gift in self.get_star_gifts()
+                if is_full or self.versions.get_changed_at(star_gift.id) > since
+            ) | {"full": is_full}
+
+        return self._respond(request, self.versions.version, f"changes:{0 if is_full else since}", build)
+
+    async def star_gift_handler(self, request: HTTPRequest) -> HTTPResponse:
+        try:
+            star_gift_id = int(request.path_params["id"])
+
+        except ValueError:
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"Gift ID must be an integer")
+
+        star_gift = next((
+            star_gift
+            for star_gift in self.get_star_gifts()
+            if star_gift.id == star_gift_id
+        ), None)
+
+        if star_gift is None:
+            return HTTPResponse(HTTPStatus.NOT_FOUND, b"Gift not found")
+
+        return self._respond(request, self.versions.get_changed_at(star_gift_id), f"gift:{star_gift_id}", lambda: star_gift.model_dump(mode="json"))
+
+    async def upgrade_preview_handler(self, request: HTTPRequest) -> HTTPResponse:
+        """
+        Only serves previews already cached by the upgrades checker, it never requests them.
+        """
+
+        try:
+            star_gift_id = int(request.path_params["id"])
+
+        except ValueError:
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"Gift ID must be an integer")
+
+        upgrade_previews = self.upgrade_previews
+        preview = upgrade_previews.data.previews.get(star_gift_id) if upgrade_previews else None
+
+        if upgrade_previews is None or preview is None:
+            return HTTPResponse(HTTPStatus.NOT_FOUND, b"Upgrade preview not found")
+
+        return self._respond(request, preview.fetched_at, f"upgrade:{star_gift_id}:{preview.fetched_at}", lambda: upgrade_previews.dump_preview(preview))
+
+    async def sticker_handler(self, request: HTTPRequest) -> HTTPResponse:
+        try:
+            document_id = int(request.path_params["document_id"])
+
+        except ValueError:
+            return HTTPResponse(HTTPStatus.BAD_REQUEST, b"Document ID must be an integer")
+
+        # Only documents of cached previews, so the API can't be used to download arbitrary files
+        document = self.upgrade_previews.data.documents.get(document_id) if self.upgrade_previews else None
+
+        if document is None or self.get_sticker is None:
+            return HTTPResponse(HTTPStatus.NOT_FOUND, b"Sticker not found")
+
+        etag = f'"{document_id}"'
+
+        if request.headers.get("if-none-match") == etag:
+            return HTTPResponse(
+                status = HTTPStatus.NOT_MODIFIED,
+                content_type = None,
+                headers = {"ETag": etag}
+            )
+
+        sticker = await self.get_sticker(document_id, document.file_id)
+
+        if sticker is None:
+            return HTTPResponse(HTTPStatus.BAD_GATEWAY, b"Sticker download failed")
+
+        return HTTPResponse(
+            status = HTTPStatus.OK,
+            body = sticker,
+            content_type = STICKER_CONTENT_TYPE,
+            headers = {
+                "ETag": etag,
+                "Cache-Control": "public, max-age=31536000, immutable"  # Documents never change
+            }
+        )
+
+
+def create_catalog_api_server(host: str, port: int, catalog_api: CatalogAPI, logger: Logger, event_bus: EventBus | None = None) -> HTTPServer:
+    server = HTTPServer(
+        host = host,
+        port = port,
+        logger = logger
+    )
+
+    # Literal paths first, so they aren't matched as gift IDs
+    server.add_route("GET", "/gifts", catalog_api.list_handler)
+    server.add_route("GET", "/gifts/limited", catalog_api.limited_handler)
+    server.add_route("GET", "/gifts/changes", catalog_api.changes_handler)
+    server.add_route("GET", "/gifts/{id}", catalog_api.star_gift_handler)
+    server.add_route("GET", "/gifts/{id}/upgrade", catalog_api.upgrade_preview_handler)
+    server.add_route("GET", "/stickers/{document_id}", catalog_api.sticker_handler)
+
+    if event_bus:
+        # A resync event carries the version to continue from with `/gifts/changes`
+        server.add_route("GET", "/events", create_sse_handler(event_bus, lambda: {
+            "version": catalog_api.versions.version
+        }))
+
+    return server
@@ -4,6 +4,7 @@ import constants
 
 
 SESSION_NAME = "account"
+SESSION_FLUSH_INTERVAL = 30.0  # Seconds between writes of the in-memory userbot session to its file
 
 API_ID = 22712842
 API_HASH = "dd58254a4363da5381267eeeb944138f"
@@ -15,28 +16,94 @@ BOT_TOKENS = [
 
 
 CHECK_INTERVAL = 3.0
+POLL_FAST_INTERVAL = 1.0
+POLL_IDLE_INTERVAL = 5.0
+POLL_INTERVAL_FLOOR = 0.5
+POLL_INTERVAL_CEILING = 60.0
+POLL_INTERVAL_DECAY = 1.5
+POLL_DROP_WINDOWS_ENABLED = True
+POLL_DROP_WINDOWS_SMOOTHING = 0.5
 CHECK_UPGRADES_PER_CYCLE = 3
+CHECK_UPGRADES_PREVIEW = None  # None, "confirm" or "fallback", see README
+RESALE_ENABLED = False
+RESALE_CHECK_INTERVAL = 30.0
+RESALE_PAGE_SIZE = 100
+RESALE_SCAN_CONCURRENCY = 4
+RESALE_FLOOR_PAGES = 1
+RESALE_FULL_SCAN_INTERVAL = 600.0
 
 DATA_FILEPATH = constants.WORK_DIRPATH / "star_gifts.json"
 DATA_SAVER_DELAY = 3.0
+DATA_PRETTY_JSON = False  # Indented gifts data, compact is faster to save and load
+AVAILABILITY_HISTORY_FILEPATH = constants.WORK_DIRPATH / "star_gifts_history.bin"
+AVAILABILITY_HISTORY_SIZE = 128
+AVAILABILITY_HISTORY_WINDOW = 300
+UPGRADE_PREVIEWS_FILEPATH = constants.WORK_DIRPATH / "star_gifts_upgrades.json"
+UPGRADE_PREVIEWS_TTL = 24 * 60 * 60
+STICKERS_CACHE_DIRPATH = constants.WORK_DIRPATH / "stickers"
+TRAFFIC_CAPTURE_DIRPATH = None  # constants.WORK_DIRPATH / "captures"
+TRAFFIC_CAPTURE_MAX_FILE_SIZE = 64 * 1024 * 1024  # 64 MB
+TRAFFIC_CAPTURE_MAX_FILES = 100
+TRACE_FILEPATH = None  # constants.LOGS_DIRPATH / "traces.jsonl"
+TRACE_BUFFER_SIZE = 256  # Spans buffered before they are written
+TRACE_FLUSH_INTERVAL = 5.0
+TRACE_MAX_FILE_SIZE = 64 * 1024 * 1024  # 64 MB, then renamed to `.1`
 NOTIFY_CHAT_ID = -1003052155098  # https://t.me/gifts_detector
+NOTIFY_RESALE_CHAT_ID = None
 NOTIFY_UPGRADES_CHAT_ID = -1003052155098  # https://t.me/gifts_upgrades_detector
                                           # Если не нужны апгрейды, установите в `None` или `9`.
                                           # Дополнительно: боты не могут проверять апгрейды подарков,
                                           # Telegram выдаст [400 BOT_METHOD_INVALID]
+NOTIFY_RATE_LIMIT = 1.0
+NOTIFY_RATE_LIMIT_BURST = 4
 NOTIFY_AFTER_STICKER_DELAY = 1.0
 NOTIFY_AFTER_TEXT_DELAY = 2.0
+NOTIFY_EDIT_MIN_CHANGE_PERCENTAGE = 0.1
+NOTIFY_EDIT_MAX_DEFER = 60.0
 TIMEZONE = "Europe/Moscow"
 CONSOLE_LOG_LEVEL = logging.DEBUG
 FILE_LOG_LEVEL = logging.INFO
+LOG_QUEUED = True
+USE_UVLOOP = False
 HTTP_REQUEST_TIMEOUT = 20.0
 
+BOT_WEBHOOK_URL = None  # "https://example.com/gifts_detector/webhook", None to use getUpdates
+BOT_WEBHOOK_HOST = "127.0.0.1"
+BOT_WEBHOOK_PORT = 8443
+BOT_WEBHOOK_SECRET_TOKEN = None  # Random on every start if None
+BOT_WEBHOOK_MAX_CONNECTIONS = 40
+
+METRICS_ENABLED = False
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+
+CATALOG_API_ENABLED = False
+CATALOG_API_HOST = "127.0.0.1"
+CATALOG_API_PORT = 9465
+
+EVENTS_BUFFER_SIZE = 256  # Per subscriber, a slower subscriber gets a `resync` event instead
+EVENTS_HISTORY_SIZE = 1024  # Replayed to subscribers reconnecting with `Last-Event-ID`
+
+SUBSCRIPTIONS_ENABLED = False
+SUBSCRIPTIONS_FILEPATH = constants.WORK_DIRPATH / "subscriptions.json"
+SUBSCRIPTIONS_RATE_LIMIT = 25.0  # Messages per second to subscribers through the first bot, Telegram allows about 30
+SUBSCRIPTIONS_RATE_LIMIT_BURST = 25
+SUBSCRIPTIONS_DELIVERY_WORKERS = 8
+SUBSCRIPTIONS_QUEUE_SIZE = 200_000  # Deliveries beyond it are dropped
+
+ADMIN_USER_IDS: list[int] = []  # Allowed to /profile and to send test messages with /start, everyone may /start if empty
+PROFILE_DURATION = 30.0  # Seconds profiled by /profile without an argument
+PROFILE_MAX_DURATION = 300.0
+PROFILE_TASKS_INTERVAL = 0.5  # Seconds between samples of what the asyncio tasks are awaiting
+PROFILE_SLOW_CALLBACK_DURATION = 0.05  # Seconds, None to profile without the event loop's debug mode
+PROFILE_TOP_FUNCTIONS = 15  # Listed in the /profile reply, the full report is saved to the logs directory
+
 
 NOTIFY_TEXT = """\
 {title}
 
 № {number} (<code>{id}</code>)
-{total_amount}{available_amount}{sold_out}
+{total_amount}{available_amount}{sell_out_eta}{sold_out}
 💎 Цена: {price} ⭐️
 ♻️ Конвертированная цена: {convert_price} ⭐️
 {require_premium_or_user_limited}
@@ -49,6 +116,7 @@ NOTIFY_TEXT_TITLES = {
 
 NOTIFY_TEXT_TOTAL_AMOUNT = "\n🎯 Всего: {total_amount}"
 NOTIFY_TEXT_AVAILABLE_AMOUNT = "\n❓ Доступно: {available_amount} ({same_str}{available_percentage}%, обновлено {updated_datetime} UTC)\n"
+NOTIFY_TEXT_SELL_OUT_ETA = "⏳ Распродадут примерно через {sell_out_eta}\n"
 NOTIFY_TEXT_SOLD_OUT = "\n⏰ Полностью распродано за {sold_out}\n"
 NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED = "\n{emoji} {require_premium}{separator}{user_limited}\n"
 NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED_EMOJI = "✨"
@@ -56,4 +124,47 @@ NOTIFY_TEXT_REQUIRE_PREMIUM = "<b>Только для Premium</b>"
 NOTIFY_TEXT_USER_LIMITED = "<b>{user_limited} на пользователя</b>"
 NOTIFY_TEXT_REQUIRE_PREMIUM_AND_USER_LIMITED_SEPARATOR = " | "
 
-NOTIFY_UPGRADES_TEXT = "Подарок можно улучшить! (<code>{id}</code>)"
+NOTIFY_UPGRADES_TEXT = """\
+Подарок можно улучшить! (<code>{id}</code>)
+{upgrade_price}{models}{backdrops}{patterns}"""
+
+NOTIFY_UPGRADES_TEXT_PRICE = "\n💎 Цена улучшения: {upgrade_price} ⭐️"
+NOTIFY_UPGRADES_TEXT_MODELS = "\n🎁 Модели ({amount}): {names}"
+NOTIFY_UPGRADES_TEXT_BACKDROPS = "\n🎨 Фоны ({amount}): {names}"
+NOTIFY_UPGRADES_TEXT_PATTERNS = "\n🌀 Узоры ({amount}): {names}"
+NOTIFY_UPGRADES_TEXT_ATTRIBUTE = "{name} ({rarity}%)"
+NOTIFY_UPGRADES_TEXT_ATTRIBUTES_LIMIT = 5  # Only the rarest ones are listed
+NOTIFY_UPGRADES_TEXT_ATTRIBUTES_MORE = " и ещё {amount}"
+
+NOTIFY_RESALE_TEXT = """\
+{emoji} Минимальная цена перепродажи (<code>{id}</code>): {price} ⭐️, было {previous_price} ⭐️
+https://t.me/nft/{slug}"""
+NOTIFY_RESALE_TEXT_EMOJIS = {
+    True: "📉",
+    False: "📈"
+}
+
+SUBSCRIBE_HELP_TEXT = """\
+🔔 Подписка на новые подарки по фильтру:
+<code>/subscribe limited price&lt;=5000 total&lt;=10k nopremium</code>
+
+<code>limited</code> — только лимитированные
+<code>price&lt;=N</code>, <code>price&gt;=N</code> — цена в звёздах
+<code>total&lt;=N</code>, <code>total&gt;=N</code> — тираж (только лимитированные)
+<code>nopremium</code> — без подарков только для Premium
+<code>/subscribe all</code> — все подарки, <code>/unsubscribe</code> — отписаться"""
+SUBSCRIBE_CURRENT_TEXT = "🔔 Текущий фильтр: <code>{filter}</code>"
+SUBSCRIBE_SAVED_TEXT = "✅ Подписка сохранена: <code>{filter}</code>"
+SUBSCRIBE_INVALID_TEXT = "❌ {error}"
+UNSUBSCRIBE_TEXT = "🔕 Подписка отменена."
+UNSUBSCRIBE_NOT_FOUND_TEXT = "Подписки нет."
+
+PROFILE_STARTED_TEXT = "⏱ Профилирование запущено на {duration:g} с."
+PROFILE_BUSY_TEXT = "⏱ Профилирование уже идёт."
+PROFILE_INVALID_TEXT = "❌ Укажите длительность в секундах, не больше {max_duration:g}: <code>/profile 30</code>"
+PROFILE_DONE_TEXT = """\
+⏱ Профиль за {duration:.1f} с, из них простой {idle_time:.1f} с, задач до {max_tasks}
+🐢 Медленных колбэков: {slow_callbacks}, самый долгий {longest_slow_callback:.0f} мс
+
+<pre>{top_functions}</pre>
+Отчёт: <code>{report_filename}</code>"""
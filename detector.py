@@ -1,33 +1,64 @@
 from pyrogram import Client, types
 from pyrogram.file_id import FileId
+from pyrogram.errors import FloodWait
 from httpx import AsyncClient, TimeoutException
 from pytz import timezone as _timezone
 from io import BytesIO
 from itertools import cycle
+from urllib.parse import urlsplit
 from functools import partial
 
-import math
 import asyncio
+import html
+import secrets
+import time
 import typing
 
-from parse_data import get_all_star_gifts, check_is_star_gift_upgradable
+from parse_data import get_all_star_gifts
 from star_gifts_data import StarGiftData, StarGiftsData
+from notify_text import NotifyTextRenderer, render_upgrades_text
+from traffic_recorder import TrafficRecorder
+from availability_history import AvailabilityHistories
+from poll_scheduler import AdaptivePollScheduler
+from drop_windows import DropWindows
+from rate_limiter import TokenBucket
+from bot_updates import BotUpdatesDispatcher, ALLOWED_UPDATES, create_webhook_server
+from catalog_api import CatalogVersions, CatalogAPI, create_catalog_api_server
+from event_bus import EventBus
+from upgrade_previews import UpgradePreview, UpgradePreviewsData, UpgradePreviewsCache
+from sticker_cache import StickerCache
+from resale import ResaleListing, ResaleTracker
+from session_storage import SessionStorage
+from subscriptions import SubscriptionFilter, SubscriptionsData, SubscriptionIndex, DeliveryQueue, split_texts
+from profiler import RuntimeProfiler, ProfileReport
 
 import utils
 import userbot_helpers
+import tracing
+import json_codec
+import metrics
 import constants
 import config
 
 
 timezone = _timezone(config.TIMEZONE)
+NOTIFY_TEXT_RENDERER = NotifyTextRenderer(timezone)
 
 USERBOT_SLEEP_THRESHOLD = 60
 BATCH_STICKERS_DOWNLOAD = True
+STICKER_UPLOADS_CONCURRENCY = 3
+BOT_WEBHOOK_SET_ATTEMPTS = 5  # setWebhook retried after 2, 4, 8 and 16 seconds, then getUpdates is used instead
+SUBSCRIBER_GONE_ERRORS = (  # sendMessage errors after which a subscription is removed
+    "bot was blocked by the user",
+    "user is deactivated"
+)
 
 
 T = typing.TypeVar("T")
 STAR_GIFT_RAW_T = dict[str, typing.Any]
 UPDATE_GIFTS_QUEUE_T = asyncio.Queue[tuple[StarGiftData, StarGiftData]]
+UPGRADABLE_GIFTS_QUEUE_T = asyncio.Queue[StarGiftData]
+NEW_GIFTS_CALLBACK_T = typing.Callable[[list[StarGiftData], dict[int, BytesIO]], typing.Coroutine[None, None, typing.Any]]
 
 BASIC_REQUEST_DATA = {
     "parse_mode": "HTML",
@@ -49,15 +80,83 @@ else:
     PRIMARY_BOT_TOKEN = None
 
 
-STAR_GIFTS_DATA = StarGiftsData.load(config.DATA_FILEPATH)
+STAR_GIFTS_DATA = StarGiftsData.load(config.DATA_FILEPATH, pretty=config.DATA_PRETTY_JSON)
+CATALOG_VERSIONS = CatalogVersions()  # Touched on every change of STAR_GIFTS_DATA
+EVENT_BUS = EventBus(
+    buffer_size = config.EVENTS_BUFFER_SIZE,
+    history_size = config.EVENTS_HISTORY_SIZE
+)
+AVAILABILITY_HISTORIES = AvailabilityHistories.load(config.AVAILABILITY_HISTORY_FILEPATH, config.AVAILABILITY_HISTORY_SIZE)
+UPGRADE_PREVIEWS = UpgradePreviewsCache(UpgradePreviewsData.load(config.UPGRADE_PREVIEWS_FILEPATH), config.UPGRADE_PREVIEWS_TTL)
+STICKER_CACHE = StickerCache(config.STICKERS_CACHE_DIRPATH)  # Gift and upgrade attribute stickers
+RESALE_TRACKER = ResaleTracker(
+    page_size = config.RESALE_PAGE_SIZE,
+    concurrency = config.RESALE_SCAN_CONCURRENCY,
+    floor_pages = config.RESALE_FLOOR_PAGES,
+    full_scan_interval = config.RESALE_FULL_SCAN_INTERVAL
+)
+SESSION_STORAGE = SessionStorage(config.SESSION_NAME, Client.WORKDIR)  # Same file as the default storage
+SUBSCRIPTIONS_DATA = SubscriptionsData.load(config.SUBSCRIPTIONS_FILEPATH)
+SUBSCRIPTION_INDEX = SubscriptionIndex.build(SUBSCRIPTIONS_DATA.subscriptions)  # Updated with SUBSCRIPTIONS_DATA
+SUBSCRIPTION_DELIVERIES = DeliveryQueue(  # Sent by the first bot, the one subscribers started
+    rate_limiter = TokenBucket(
+        rate = config.SUBSCRIPTIONS_RATE_LIMIT,
+        capacity = config.SUBSCRIPTIONS_RATE_LIMIT_BURST
+    ),
+    workers = config.SUBSCRIPTIONS_DELIVERY_WORKERS,
+    max_size = config.SUBSCRIPTIONS_QUEUE_SIZE
+)
+RUNTIME_PROFILER = RuntimeProfiler(
+    tasks_interval = config.PROFILE_TASKS_INTERVAL,
+    slow_callback_duration = config.PROFILE_SLOW_CALLBACK_DURATION
+)
+STAR_GIFTS_DETECTED_AT: dict[int, float] = {}  # {star_gift_id: perf_counter() of the getStarGifts response}
+STAR_GIFTS_EDIT_TRACES: dict[int, tuple[int, float]] = {}  # {star_gift_id: (trace, perf_counter() when its latest edit was queued)}
+
+# Telegram limits posting per sender, so the userbot's stickers and the bots' texts are paced separately
+NOTIFY_STICKERS_RATE_LIMITER = TokenBucket(
+    rate = config.NOTIFY_RATE_LIMIT,
+    capacity = config.NOTIFY_RATE_LIMIT_BURST
+)
+NOTIFY_TEXTS_RATE_LIMITER = TokenBucket(  # Texts are spread over all bots by `BOT_TOKENS_CYCLE`
+    rate = config.NOTIFY_RATE_LIMIT * max(BOTS_AMOUNT, 1),
+    capacity = config.NOTIFY_RATE_LIMIT_BURST * max(BOTS_AMOUNT, 1)
+)
+
+POLL_SCHEDULER = AdaptivePollScheduler(
+    fast_interval = config.POLL_FAST_INTERVAL,
+    idle_interval = config.POLL_IDLE_INTERVAL,
+    floor = config.POLL_INTERVAL_FLOOR,
+    ceiling = config.POLL_INTERVAL_CEILING,
+    decay = config.POLL_INTERVAL_DECAY,
+    drop_windows = (
+        DropWindows.fit_star_gifts(STAR_GIFTS_DATA.get_all(), config.POLL_DROP_WINDOWS_SMOOTHING)
+        if config.POLL_DROP_WINDOWS_ENABLED else
+        None
+    )
+)
 
 logger = utils.get_logger(
     name = config.SESSION_NAME,
     log_filepath = constants.LOG_FILEPATH,
     console_log_level = config.CONSOLE_LOG_LEVEL,
-    file_log_level = config.FILE_LOG_LEVEL
+    file_log_level = config.FILE_LOG_LEVEL,
+    queued = config.LOG_QUEUED
 )
 
+TRAFFIC_RECORDER = (
+    TrafficRecorder(
+        dirpath = config.TRAFFIC_CAPTURE_DIRPATH,
+        logger = logger,
+        max_file_size = config.TRAFFIC_CAPTURE_MAX_FILE_SIZE,
+        max_files = config.TRAFFIC_CAPTURE_MAX_FILES
+    )
+    if config.TRAFFIC_CAPTURE_DIRPATH else
+    None
+)
+
+BOT_UPDATES_DISPATCHER = BotUpdatesDispatcher(logger)
+
 
 @typing.overload
 async def bot_send_request(
@@ -75,10 +174,11 @@ async def bot_send_request(
     method: str,
     data: dict[str, typing.Any] | None = None
 ) -> dict[str, typing.Any] | None:
-    logger.debug(f"Sending request {method} with data: {data}")
+    logger.debug("Sending request %s with data: %s", method, data)
 
     retries = BOTS_AMOUNT
     response = None
+    content = json_codec.dumps(data or {})  # Encoded once for all the retries
 
     for bot_token in BOT_TOKENS_CYCLE:
         retries -= 1
@@ -88,80 +188,108 @@ async def bot_send_request(
 
             break
 
+        bot_id = metrics.get_bot_id(bot_token)
+        started_at = time.perf_counter()
+
         try:
-            response = (await BOT_HTTP_CLIENT.post(
+            response = json_codec.loads((await BOT_HTTP_CLIENT.post(
                 f"/bot{bot_token}/{method}",
-                json = data
-            )).json()
+                content = content,
+                headers = json_codec.JSON_HEADERS
+            )).content)
 
         except TimeoutException:
-            logger.warning(f"Timeout exception while sending request {method} with data: {data}")
+            metrics.BOT_API_REQUESTS.labels(bot_id, method, "timeout").inc()
+
+            logger.warning("Timeout exception while sending request %s with data: %s", method, data)
 
             continue
 
         except Exception as ex:
+            metrics.BOT_API_REQUESTS.labels(bot_id, method, "exception").inc()
+
             logger.error(f"An error occurred while sending request {method}: {ex}")
 
             continue
 
+        finally:
+            metrics.BOT_API_LATENCY.labels(bot_id, method).observe(time.perf_counter() - started_at)
+
         if response.get("ok"):
+            metrics.BOT_API_REQUESTS.labels(bot_id, method, "ok").inc()
+
             return response.get("result")
 
         elif method == "editMessageText" and isinstance(response.get("description"), str) and "message is not modified" in response["description"]:
+            metrics.BOT_API_REQUESTS.labels(bot_id, method, "not_modified").inc()
+
             return
 
-        logger.warning(f"Telegram API error for method {method}: {response}")
+        metrics.BOT_API_REQUESTS.labels(bot_id, method, "error").inc()
+
+        logger.warning("Telegram API error for method %s: %s", method, response)
 
     raise RuntimeError(f"Failed to send request to Telegram API after multiple retries. Last response: {response}")
 
 
-async def bot_send_request_primary(
+async def bot_post_primary(
     method: str,
     data: dict[str, typing.Any] | None = None
 ) -> dict[str, typing.Any] | None:
     """
-    То же самое, что bot_send_request, но всегда через ПЕРВЫЙ токен (PRIMARY_BOT_TOKEN).
-    Нужен для long-poll getUpdates и /start-теста, чтобы всё шло через один и тот же бот.
+    Запрос через ПЕРВЫЙ токен (PRIMARY_BOT_TOKEN), возвращает ответ Bot API целиком (ok, result, description).
+    None, если ответа нет: таймаут или сетевая ошибка.
     """
     if not PRIMARY_BOT_TOKEN:
         raise RuntimeError("No PRIMARY_BOT_TOKEN available")
 
-    logger.debug(f"[primary] Sending request {method} with data: {data}")
-
-    response = None
+    logger.debug("[primary] Sending request %s with data: %s", method, data)
 
     try:
-        response = (await BOT_HTTP_CLIENT.post(
+        return json_codec.loads((await BOT_HTTP_CLIENT.post(
             f"/bot{PRIMARY_BOT_TOKEN}/{method}",
-            json = data
-        )).json()
+            content = json_codec.dumps(data or {}),
+            headers = json_codec.JSON_HEADERS
+        )).content)
 
     except TimeoutException:
-        logger.warning(f"[primary] Timeout exception while sending request {method} with data: {data}")
+        logger.warning("[primary] Timeout exception while sending request %s with data: %s", method, data)
         return None
 
     except Exception as ex:
         logger.error(f"[primary] An error occurred while sending request {method}: {ex}")
         return None
 
+
+async def bot_send_request_primary(
+    method: str,
+    data: dict[str, typing.Any] | None = None
+) -> dict[str, typing.Any] | None:
+    """
+    То же самое, что bot_send_request, но всегда через ПЕРВЫЙ токен (PRIMARY_BOT_TOKEN).
+    Нужен для long-poll getUpdates и /start-теста, чтобы всё шло через один и тот же бот.
+    """
+    response = await bot_post_primary(method, data)
+
     if response and response.get("ok"):
         return response.get("result")
 
     if method == "editMessageText" and response and isinstance(response.get("description"), str) and "message is not modified" in response["description"]:
         return None
 
-    logger.warning(f"[primary] Telegram API error for method {method}: {response}")
+    logger.warning("[primary] Telegram API error for method %s: %s", method, response)
     return None
 
 
 async def detector(
     app: Client,
-    new_gift_callback: typing.Callable[[StarGiftData, BytesIO | None], typing.Coroutine[None, None, typing.Any]] | None = None,
+    new_gifts_callback: NEW_GIFTS_CALLBACK_T | None = None,
     update_gifts_queue: UPDATE_GIFTS_QUEUE_T | None = None,
+    upgradable_gifts_queue: UPGRADABLE_GIFTS_QUEUE_T | None = None,
     save_only: bool = False
 ) -> None:
-    if new_gift_callback is None and update_gifts_queue is None:
-        raise ValueError("At least one of new_gift_callback or update_gifts_queue must be provided")
+    if new_gifts_callback is None and update_gifts_queue is None:
+        raise ValueError("At least one of new_gifts_callback or update_gifts_queue must be provided")
 
     current_hash = 0
 
@@ -179,7 +307,40 @@ async def detector(
 
                 continue
 
-        new_hash, all_star_gifts_dict = await get_all_star_gifts(app, current_hash)
+        poll_started_at = time.perf_counter()
+
+        try:
+            new_hash, all_star_gifts_dict = await get_all_star_gifts(
+                app,
+                current_hash,
+                TRAFFIC_RECORDER,
+                None if save_only else STAR_GIFTS_DATA.archived_star_gifts
+            )
+
+        except FloodWait as ex:
+            metrics.POLLS.labels("flood_wait").inc()
+
+            POLL_SCHEDULER.on_flood_wait()
+
+            flood_wait = typing.cast(int, ex.value)
+
+            logger.warning(f"Got FLOOD_WAIT of {flood_wait}s on getStarGifts, backing off to {POLL_SCHEDULER.get_delay():g}s.")
+
+            await asyncio.sleep(flood_wait)
+
+            continue
+
+        except Exception:
+            metrics.POLLS.labels("error").inc()
+
+            raise
+
+        finally:
+            poll_received_at = time.perf_counter()
+
+            metrics.POLL_DURATION.observe(poll_received_at - poll_started_at)
+
+        metrics.POLLS.labels("not_modified" if all_star_gifts_dict is None else "modified").inc()
 
         if save_only:
             if all_star_gifts_dict is None:
@@ -189,10 +350,10 @@ async def detector(
 
             logger.info(f"Gifts found, saving data to {STAR_GIFTS_DATA.DATA_FILEPATH}")
 
-            STAR_GIFTS_DATA.star_gifts = [
+            STAR_GIFTS_DATA.replace_star_gifts(
                 StarGiftData.model_validate(star_gift)
                 for star_gift in all_star_gifts_dict.values()
-            ]
+            )
 
             await star_gifts_data_saver()
 
@@ -201,25 +362,58 @@ async def detector(
         if all_star_gifts_dict is None:
             logger.debug("Star gifts data not modified.")
 
-            await asyncio.sleep(config.CHECK_INTERVAL)
+            POLL_SCHEDULER.on_poll(is_active=False)
+
+            await asyncio.sleep(POLL_SCHEDULER.get_delay())
 
             continue
 
         if not update_gifts_queue:
             current_hash = new_hash
 
+        trace = tracing.start_trace()  # Followed by the tasks posting and editing what this response changed
+
+        # Archived gifts are only returned when the catalog changes them, they are processed as active again
+        promoted_star_gifts = STAR_GIFTS_DATA.promote(all_star_gifts_dict.keys() & STAR_GIFTS_DATA.archived_star_gifts.keys())
+
+        if promoted_star_gifts:
+            logger.info("Unarchived %d gifts changed in the catalog: %s", len(promoted_star_gifts), [sg.id for sg in promoted_star_gifts])
+
         old_star_gifts_dict = {
             star_gift.id: star_gift
-            for star_gift in STAR_GIFTS_DATA.star_gifts
+            for star_gift in STAR_GIFTS_DATA.snapshot().star_gifts
         }
 
         new_star_gifts_found: list[StarGiftData] = []
+        is_selling = False
+
+        current_timestamp = utils.get_current_timestamp()
 
         for star_gift_id, star_gift in all_star_gifts_dict.items():
             if star_gift_id not in old_star_gifts_dict:
                 new_star_gifts_found.append(star_gift)
 
-        if new_star_gifts_found and new_gift_callback:
+                if star_gift.is_limited:
+                    AVAILABILITY_HISTORIES.record(star_gift_id, current_timestamp, star_gift.available_amount)
+
+        diffed_at = time.perf_counter()
+
+        if new_star_gifts_found:
+            metrics.NEW_GIFTS.inc(len(new_star_gifts_found))
+
+            for star_gift in new_star_gifts_found:
+                publish_event("new_gift", star_gift, **star_gift.model_dump(mode="json"))
+
+            if POLL_SCHEDULER.drop_windows:
+                POLL_SCHEDULER.drop_windows = DropWindows.fit_star_gifts(
+                    star_gifts = [*STAR_GIFTS_DATA.get_all(), *new_star_gifts_found],
+                    smoothing = config.POLL_DROP_WINDOWS_SMOOTHING
+                )
+
+        if new_star_gifts_found and new_gifts_callback:
+            for star_gift in new_star_gifts_found:
+                STAR_GIFTS_DETECTED_AT[star_gift.id] = poll_received_at
+
             logger.info(f"""Found {len(new_star_gifts_found)} new gifts: [{", ".join(map(str, [g.id for g in new_star_gifts_found]))}]""")
 
             if BATCH_STICKERS_DOWNLOAD:
@@ -261,20 +455,63 @@ async def detector(
                     if sticker_file_id_obj
                 }
 
-                logger.debug(f"Batch download of {len(downloaded_stickers_mapped)} completed.")
+                logger.debug("Batch download of %d completed.", len(downloaded_stickers_mapped))
 
-            for star_gift in sorted(new_star_gifts_found, key=lambda sg: sg.total_amount):
-                await new_gift_callback(
-                    star_gift,
-                    downloaded_stickers_mapped.get(star_gift.id) if BATCH_STICKERS_DOWNLOAD else None  # pyright: ignore[reportPossiblyUnboundVariable]
-                )
+            new_star_gifts_found.sort(key=lambda sg: sg.total_amount)
 
-                STAR_GIFTS_DATA.star_gifts.append(star_gift)
+            await new_gifts_callback(
+                new_star_gifts_found,
+                downloaded_stickers_mapped if BATCH_STICKERS_DOWNLOAD else {}  # pyright: ignore[reportPossiblyUnboundVariable]
+            )
 
-                await star_gifts_data_saver()
+            store_started_at = time.perf_counter()
+
+            STAR_GIFTS_DATA.add(new_star_gifts_found)  # Not changed in place from now on
+            CATALOG_VERSIONS.touch(*(star_gift.id for star_gift in new_star_gifts_found))
+
+            await star_gifts_data_saver(force=True)
+
+            tracing.record("store", store_started_at, gifts=len(new_star_gifts_found))
 
         elif new_star_gifts_found:
-            STAR_GIFTS_DATA.star_gifts.extend(new_star_gifts_found)
+            store_started_at = time.perf_counter()
+
+            STAR_GIFTS_DATA.add(new_star_gifts_found)
+            CATALOG_VERSIONS.touch(*(star_gift.id for star_gift in new_star_gifts_found))
+
+            await star_gifts_data_saver()
+
+            tracing.record("store", store_started_at, gifts=len(new_star_gifts_found))
+
+        if new_star_gifts_found and config.SUBSCRIPTIONS_ENABLED and BOTS_AMOUNT > 0 and not save_only:
+            enqueue_subscription_deliveries(new_star_gifts_found)
+
+        if upgradable_gifts_queue:
+            for star_gift in new_star_gifts_found:
+                if star_gift.upgrade_price is not None:
+                    upgradable_gifts_queue.put_nowait(star_gift)
+
+        # A gift becomes upgradable once the catalog gives it an upgrade price
+        upgrade_price_changed_ids: list[int] = []
+
+        for star_gift_id, old_star_gift in old_star_gifts_dict.items():
+            new_star_gift = all_star_gifts_dict.get(star_gift_id)
+
+            if new_star_gift is None or new_star_gift.upgrade_price == old_star_gift.upgrade_price:
+                continue
+
+            stored_star_gift = STAR_GIFTS_DATA.update(star_gift_id, upgrade_price=new_star_gift.upgrade_price)
+
+            if stored_star_gift is None:
+                continue
+
+            if old_star_gift.upgrade_price is None and not stored_star_gift.is_upgradable and upgradable_gifts_queue:
+                upgradable_gifts_queue.put_nowait(stored_star_gift)
+
+            upgrade_price_changed_ids.append(star_gift_id)
+
+        if upgrade_price_changed_ids:
+            CATALOG_VERSIONS.touch(*upgrade_price_changed_ids)
 
             await star_gifts_data_saver()
 
@@ -288,118 +525,179 @@ async def detector(
                     continue
 
                 if new_star_gift.available_amount < old_star_gift.available_amount:
+                    is_selling = True
+
+                    AVAILABILITY_HISTORIES.record(star_gift_id, current_timestamp, new_star_gift.available_amount)
+
+                    publish_event(
+                        "sold_out" if new_star_gift.available_amount == 0 else "availability_drop",
+                        new_star_gift,
+                        available_amount = new_star_gift.available_amount,
+                        previous_available_amount = old_star_gift.available_amount,
+                        total_amount = new_star_gift.total_amount
+                    )
+
                     new_star_gift.message_id = old_star_gift.message_id
+                    new_star_gift.message_text_hash = old_star_gift.message_text_hash
+                    new_star_gift.message_available_amount = old_star_gift.message_available_amount
                     new_star_gift.is_upgradable = old_star_gift.is_upgradable
 
                     update_gifts_queue.put_nowait((old_star_gift, new_star_gift))
 
+                    if trace is not None:
+                        STAR_GIFTS_EDIT_TRACES[star_gift_id] = (trace, time.perf_counter())
+
+        if new_star_gifts_found or is_selling:  # Recorded last, once it is known the response changed anything
+            tracing.record("get_star_gifts", poll_started_at, poll_received_at, gifts=len(all_star_gifts_dict), new=len(new_star_gifts_found))
+            tracing.record("diff", poll_received_at, diffed_at)
+
+        demoted_star_gifts = STAR_GIFTS_DATA.demote_inactive(all_star_gifts_dict)
+
+        if demoted_star_gifts:
+            for star_gift in demoted_star_gifts:
+                AVAILABILITY_HISTORIES.forget(star_gift.id)
+                NOTIFY_TEXT_RENDERER.forget(star_gift.id)
+
+            logger.debug("Archived %d inactive gifts.", len(demoted_star_gifts))
+
         await star_gifts_data_saver()
 
-        await asyncio.sleep(config.CHECK_INTERVAL)
+        POLL_SCHEDULER.on_poll(is_active=bool(new_star_gifts_found) or is_selling)
 
+        await asyncio.sleep(POLL_SCHEDULER.get_delay())
 
-def get_notify_text(star_gift: StarGiftData) -> str:
-    is_limited = star_gift.is_limited
 
-    available_percentage_str = constants.NULL_STR
-    available_percentage_is_same = False
+def publish_event(event_type: str, star_gift: StarGiftData, **data: typing.Any) -> None:
+    """
+    Never waits for subscribers. `version` is the catalog version to resync from with `/gifts/changes`.
+    """
 
-    if is_limited and star_gift.total_amount > 0:
-        available_percentage_str, available_percentage_is_same = utils.pretty_float(
-            math.ceil(star_gift.available_amount / star_gift.total_amount * 100 * 100) / 100,
-            get_is_same = True
-        )
+    EVENT_BUS.publish(event_type, data | {
+        "id": star_gift.id,
+        "version": CATALOG_VERSIONS.version
+    })
 
-    return config.NOTIFY_TEXT.format(
-        title = config.NOTIFY_TEXT_TITLES[is_limited],
-        number = star_gift.number,
-        id = star_gift.id,
-        total_amount = (
-            config.NOTIFY_TEXT_TOTAL_AMOUNT.format(
-                total_amount = utils.pretty_int(star_gift.total_amount)
-            )
-            if is_limited else
-            constants.NULL_STR
-        ),
-        available_amount = (
-            config.NOTIFY_TEXT_AVAILABLE_AMOUNT.format(
-                available_amount = utils.pretty_int(star_gift.available_amount),
-                same_str = (
-                    constants.NULL_STR
-                    if available_percentage_is_same else
-                    "~"
-                ),
-                available_percentage = available_percentage_str,
-                updated_datetime = utils.get_current_datetime(timezone)
-            )
-            if is_limited else
-            constants.NULL_STR
-        ),
-        sold_out = (
-            config.NOTIFY_TEXT_SOLD_OUT.format(
-                sold_out = utils.format_seconds_to_human_readable(star_gift.last_sale_timestamp - star_gift.first_appearance_timestamp)
-            )
-            if star_gift.last_sale_timestamp and star_gift.first_appearance_timestamp else
-            constants.NULL_STR
-        ),
-        price = utils.pretty_int(star_gift.price),
-        convert_price = utils.pretty_int(star_gift.convert_price),
-        require_premium_or_user_limited = (
-            config.NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED.format(
-                emoji = config.NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED_EMOJI,
-                require_premium = (
-                    config.NOTIFY_TEXT_REQUIRE_PREMIUM
-                    if star_gift.require_premium else
-                    constants.NULL_STR
-                ),
-                user_limited = (
-                    config.NOTIFY_TEXT_USER_LIMITED.format(
-                        user_limited = utils.pretty_int(star_gift.user_limited)
-                    )
-                    if star_gift.user_limited is not None else
-                    constants.NULL_STR
-                ),
-                separator = (
-                    config.NOTIFY_TEXT_REQUIRE_PREMIUM_AND_USER_LIMITED_SEPARATOR
-                    if star_gift.require_premium and star_gift.user_limited is not None else
-                    constants.NULL_STR
-                )
-            )
-            if star_gift.require_premium or star_gift.user_limited is not None else
-            constants.NULL_STR
-        )
+
+async def get_cached_sticker(app: Client, document_id: int, file_id: str) -> bytes | None:
+    stickers = await STICKER_CACHE.get_many(app, {document_id: file_id}, logger)
+
+    return stickers[document_id].getvalue() if document_id in stickers else None
+
+
+def get_sell_out_eta(star_gift: StarGiftData) -> float | None:
+    if not star_gift.is_limited:
+        return None
+
+    return AVAILABILITY_HISTORIES.get_sell_out_eta(
+        star_gift_id = star_gift.id,
+        now = utils.get_current_timestamp(),
+        available_amount = star_gift.available_amount,
+        window = config.AVAILABILITY_HISTORY_WINDOW
     )
 
 
-async def process_new_gift(app: Client, star_gift: StarGiftData, sticker_binary: BytesIO | None) -> None:
+def get_notify_text(star_gift: StarGiftData) -> str:
+    return NOTIFY_TEXT_RENDERER.render(star_gift, get_sell_out_eta(star_gift))
+
+
+def is_visible_available_amount_change(star_gift: StarGiftData) -> bool:
+    if star_gift.message_available_amount is None or star_gift.available_amount == 0 or star_gift.total_amount <= 0:
+        return True
+
+    return abs(star_gift.message_available_amount - star_gift.available_amount) / star_gift.total_amount * 100 >= config.NOTIFY_EDIT_MIN_CHANGE_PERCENTAGE
+
+
+async def upload_new_gift_sticker(app: Client, star_gift: StarGiftData, sticker_binary: BytesIO | None) -> str:
+    started_at = time.perf_counter()
+    is_downloaded = sticker_binary is not None
+
     if not sticker_binary:
         sticker_binary = typing.cast(BytesIO, await app.download_media(  # pyright: ignore[reportUnknownMemberType]
             message = star_gift.sticker_file_id,
             in_memory = True
         ))
 
-    sticker_binary.seek(0)
     sticker_binary.name = star_gift.sticker_file_name
 
+    sticker_file_id = await userbot_helpers.upload_sticker(app, config.NOTIFY_CHAT_ID, sticker_binary)
+
+    tracing.record("sticker_upload", started_at, gift=star_gift.id, downloaded=is_downloaded)
+
+    return sticker_file_id
+
+
+async def process_new_gifts(app: Client, star_gifts: list[StarGiftData], sticker_binaries: dict[int, BytesIO]) -> None:
+    """
+    Posts new gifts in the given order. Stickers are uploaded ahead in the background,
+    so the next gift's sticker is usually ready by the time the previous gift's text is sent.
+    """
+
+    uploads_semaphore = asyncio.Semaphore(STICKER_UPLOADS_CONCURRENCY)
+
+    async def upload_sticker(star_gift: StarGiftData) -> str:
+        async with uploads_semaphore:
+            return await upload_new_gift_sticker(app, star_gift, sticker_binaries.get(star_gift.id))
+
+    sticker_uploads = [
+        asyncio.create_task(upload_sticker(star_gift))
+        for star_gift in star_gifts
+    ]
+
+    try:
+        for star_gift, sticker_upload in zip(star_gifts, sticker_uploads):
+            await process_new_gift(app, star_gift, sticker_upload)
+
+    finally:
+        for sticker_upload in sticker_uploads:
+            sticker_upload.cancel()
+
+        for star_gift in star_gifts:  # Not posted ones included
+            STAR_GIFTS_DETECTED_AT.pop(star_gift.id, None)
+
+
+async def process_new_gift(app: Client, star_gift: StarGiftData, sticker_upload: typing.Awaitable[str]) -> None:
+    started_at = time.perf_counter()
+
     try:
+        sticker_file_id = await sticker_upload
+
+        await NOTIFY_STICKERS_RATE_LIMITER.acquire()
+
+        send_started_at = time.perf_counter()
+
         sticker_message = typing.cast(types.Message, await app.send_sticker(  # pyright: ignore[reportUnknownMemberType]
             chat_id = config.NOTIFY_CHAT_ID,
-            sticker = sticker_binary
+            sticker = sticker_file_id
         ))
 
-        await asyncio.sleep(config.NOTIFY_AFTER_STICKER_DELAY)
+        tracing.record("send_sticker", send_started_at, gift=star_gift.id)
+
+        await NOTIFY_TEXTS_RATE_LIMITER.acquire()
+
+        send_started_at = time.perf_counter()
+
+        text, text_hash = NOTIFY_TEXT_RENDERER.render_with_fingerprint(star_gift, get_sell_out_eta(star_gift))
 
         response = await bot_send_request(
             "sendMessage",
             {
                 "chat_id": config.NOTIFY_CHAT_ID,
-                "text": get_notify_text(star_gift),
+                "text": text,
                 "reply_to_message_id": sticker_message.id
             } | BASIC_REQUEST_DATA
         )
 
+        tracing.record("send_message", send_started_at, gift=star_gift.id, ok=bool(response and "message_id" in response))
+
         if response and "message_id" in response:
             star_gift.message_id = response["message_id"]
+            star_gift.message_text_hash = text_hash
+            star_gift.message_available_amount = star_gift.available_amount
+
+            detected_at = STAR_GIFTS_DETECTED_AT.get(star_gift.id)
+
+            if detected_at is not None:
+                metrics.DETECTION_TO_POST.observe(time.perf_counter() - detected_at)
 
             logger.info(f"Sent notification for new gift {star_gift.id}, message_id: {star_gift.message_id}")
 
@@ -409,8 +707,20 @@ async def process_new_gift(app: Client, star_gift: StarGiftData, sticker_binary:
     except Exception as ex:
         logger.exception(f"Error processing new gift {star_gift.id}", exc_info=ex)
 
+    finally:
+        metrics.PROCESS_NEW_GIFT_DURATION.observe(time.perf_counter() - started_at)
+
 
 async def process_update_gifts(update_gifts_queue: UPDATE_GIFTS_QUEUE_T) -> None:
+    """
+    Edits the messages of changed gifts. Two gates skip an edit: an unchanged fingerprint, and an
+    available amount changed by less than `NOTIFY_EDIT_MIN_CHANGE_PERCENTAGE` since the message.
+    The latter only defers the edit, it is sent with the stored gift after `NOTIFY_EDIT_MAX_DEFER`
+    seconds even if no further changes arrive.
+    """
+
+    deferred_until: dict[int, float] = {}  # {star_gift_id: monotonic() deadline of the deferred edit}
+
     while True:
         gifts_to_update: list[tuple[StarGiftData, StarGiftData]] = []
 
@@ -423,6 +733,22 @@ async def process_update_gifts(update_gifts_queue: UPDATE_GIFTS_QUEUE_T) -> None
             except asyncio.QueueEmpty:
                 break
 
+        now = time.monotonic()
+        queued_star_gift_ids = {new_star_gift.id for _, new_star_gift in gifts_to_update}
+
+        for star_gift_id, deadline in list(deferred_until.items()):
+            if deadline > now or star_gift_id in queued_star_gift_ids:
+                continue
+
+            stored_star_gift = STAR_GIFTS_DATA.get(star_gift_id)
+
+            if stored_star_gift is None:
+                del deferred_until[star_gift_id]
+
+                continue
+
+            gifts_to_update.append((stored_star_gift, stored_star_gift.model_copy()))  # Stored gifts are never changed in place
+
         if not gifts_to_update:
             await asyncio.sleep(0.1)
 
@@ -431,255 +757,726 @@ async def process_update_gifts(update_gifts_queue: UPDATE_GIFTS_QUEUE_T) -> None
         gifts_to_update = sorted(gifts_to_update, key=lambda gift_pair: gift_pair[0].first_appearance_timestamp or 0)
 
         for old_star_gift, new_star_gift in gifts_to_update:
+            edit_trace, queued_at = STAR_GIFTS_EDIT_TRACES.pop(new_star_gift.id, (None, 0.0))
+
+            if edit_trace is not None:
+                tracing.record("edit_queue", queued_at, trace=edit_trace, gift=new_star_gift.id)
+
             if new_star_gift.message_id is None:
                 logger.warning(f"Cannot update star gift {new_star_gift.id}: message_id is None.")
 
                 continue
 
+            started_at = time.perf_counter()
+            message_changes: dict[str, typing.Any] = {}
+
             try:
-                await bot_send_request(
-                    "editMessageText",
-                    {
-                        "chat_id": config.NOTIFY_CHAT_ID,
-                        "message_id": new_star_gift.message_id,
-                        "text": get_notify_text(new_star_gift)
-                    } | BASIC_REQUEST_DATA
-                )
+                text, text_hash = NOTIFY_TEXT_RENDERER.render_with_fingerprint(new_star_gift, get_sell_out_eta(new_star_gift))
+                edit_deadline = deferred_until.pop(new_star_gift.id, None)
+
+                if text_hash == new_star_gift.message_text_hash:
+                    metrics.EDITS.labels("not_modified").inc()
+
+                    logger.debug("Skipping edit of star gift %d: visible text is not modified (message #%d).", new_star_gift.id, new_star_gift.message_id)
+
+                elif not is_visible_available_amount_change(new_star_gift) and (edit_deadline is None or edit_deadline > time.monotonic()):
+                    deferred_until[new_star_gift.id] = edit_deadline or time.monotonic() + config.NOTIFY_EDIT_MAX_DEFER
+
+                    metrics.EDITS.labels("deferred").inc()
 
-                logger.debug(f"Available amount of star gift {new_star_gift.id} updated from {old_star_gift.available_amount} to {new_star_gift.available_amount} (message #{new_star_gift.message_id}).")
+                    logger.debug("Deferring edit of star gift %d: available amount changed from %s to %d, below the visible change threshold (message #%d).", new_star_gift.id, new_star_gift.message_available_amount, new_star_gift.available_amount, new_star_gift.message_id)
 
-                stored_star_gift_index = next((
-                    i
-                    for i, stored_gift in enumerate(STAR_GIFTS_DATA.star_gifts)
-                    if stored_gift.id == new_star_gift.id
-                ), None)
+                else:
+                    edit_started_at = time.perf_counter()
 
-                if stored_star_gift_index is None:
+                    await bot_send_request(
+                        "editMessageText",
+                        {
+                            "chat_id": config.NOTIFY_CHAT_ID,
+                            "message_id": new_star_gift.message_id,
+                            "text": text
+                        } | BASIC_REQUEST_DATA
+                    )
+
+                    if edit_trace is not None:
+                        tracing.record("edit_message", edit_started_at, trace=edit_trace, gift=new_star_gift.id)
+
+                    new_star_gift.message_text_hash = text_hash
+                    new_star_gift.message_available_amount = new_star_gift.available_amount
+                    message_changes = {
+                        "message_text_hash": text_hash,
+                        "message_available_amount": new_star_gift.available_amount
+                    }
+
+                    metrics.EDITS.labels("sent").inc()
+
+                    publish_event(
+                        "message_edited",
+                        new_star_gift,
+                        message_id = new_star_gift.message_id,
+                        available_amount = new_star_gift.available_amount
+                    )
+
+                    logger.debug("Available amount of star gift %d updated from %d to %d (message #%d).", new_star_gift.id, old_star_gift.available_amount, new_star_gift.available_amount, new_star_gift.message_id)
+
+                store_started_at = time.perf_counter()
+
+                # Merged into the latest stored version, e.g. the upgrade notification might have been sent since
+                # `new_star_gift` was queued. Archived once sold out and upgradable
+                stored_star_gift = STAR_GIFTS_DATA.update(
+                    new_star_gift.id,
+                    **new_star_gift.get_catalog_fields(),
+                    **message_changes
+                )
+
+                if stored_star_gift is None:
                     logger.warning(f"Stored star gift {new_star_gift.id} not found for update.")
 
                     continue
 
-                STAR_GIFTS_DATA.star_gifts[stored_star_gift_index] = new_star_gift
+                CATALOG_VERSIONS.touch(new_star_gift.id)
 
                 await star_gifts_data_saver()
 
+                if edit_trace is not None:
+                    tracing.record("edit_store", store_started_at, trace=edit_trace, gift=new_star_gift.id, edited=bool(message_changes))
+
             except Exception as ex:
+                metrics.EDITS.labels("error").inc()
+
                 logger.exception(f"Error updating gift message for {new_star_gift.id}", exc_info=ex)
 
+            finally:
+                metrics.EDIT_DURATION.observe(time.perf_counter() - started_at)
+
 
 star_gifts_data_saver_lock = asyncio.Lock()
 last_star_gifts_data_saved_time = 0
 
-async def star_gifts_data_saver() -> None:
+async def star_gifts_data_saver(force: bool=False) -> None:
     global STAR_GIFTS_DATA, last_star_gifts_data_saved_time
 
     async with star_gifts_data_saver_lock:
         current_time = utils.get_current_timestamp()
 
-        if current_time - last_star_gifts_data_saved_time >= config.DATA_SAVER_DELAY:
-            STAR_GIFTS_DATA.save()
+        if force or current_time - last_star_gifts_data_saved_time >= config.DATA_SAVER_DELAY:
+            started_at = time.perf_counter()
+
+            await STAR_GIFTS_DATA.save_async()  # The gifts data may change while its snapshot is written
+            await AVAILABILITY_HISTORIES.save_async()
+            await UPGRADE_PREVIEWS.data.save_async()
+
+            metrics.SAVE_DURATION.observe(time.perf_counter() - started_at)
+            metrics.SAVE_SIZE.set(STAR_GIFTS_DATA.DATA_FILEPATH.stat().st_size)
 
             last_star_gifts_data_saved_time = current_time
 
             logger.debug("Saved star gifts data file.")
 
         else:
-            logger.debug(f"Skipping data save. Next save in {config.DATA_SAVER_DELAY - (current_time - last_star_gifts_data_saved_time)} seconds.")
+            logger.debug("Skipping data save. Next save in %s seconds.", config.DATA_SAVER_DELAY - (current_time - last_star_gifts_data_saved_time))
+
+
+async def star_gifts_upgrades_checker(app: Client, upgradable_gifts_queue: UPGRADABLE_GIFTS_QUEUE_T) -> None:
+    """
+    Notifies about gifts `detector` found upgradable in the catalog, with their upgrade preview.
+    Previews come from `UPGRADE_PREVIEWS`, so each is requested once per upgrade price and TTL.
+    With `CHECK_UPGRADES_PREVIEW` "confirm" a gift without a preview isn't notified yet, and with
+    "fallback" gifts without an upgrade price are probed every cycle like before.
+    """
 
+    # Found upgradable before a restart, but not notified yet. Archived gifts were all notified
+    for star_gift in STAR_GIFTS_DATA.snapshot().star_gifts:
+        if star_gift.upgrade_price is not None and not star_gift.is_upgradable:
+            upgradable_gifts_queue.put_nowait(star_gift)
+
+    pending_star_gifts: dict[int, StarGiftData] = {}
+    last_probe_time = 0.0
 
-async def star_gifts_upgrades_checker(app: Client) -> None:
     while True:
-        gifts_to_check = [
-            star_gift
-            for star_gift in STAR_GIFTS_DATA.star_gifts
-            if not star_gift.is_upgradable
-        ]
+        while True:
+            try:
+                star_gift = upgradable_gifts_queue.get_nowait()
+                pending_star_gifts[star_gift.id] = star_gift
+                upgradable_gifts_queue.task_done()
 
-        if not gifts_to_check:
-            logger.debug("No non-upgradable star gifts to check.")
+            except asyncio.QueueEmpty:
+                break
 
-            await asyncio.sleep(config.CHECK_UPGRADES_PER_CYCLE)
+        if config.CHECK_UPGRADES_PREVIEW == "fallback" and time.monotonic() - last_probe_time >= config.CHECK_UPGRADES_PER_CYCLE:
+            last_probe_time = time.monotonic()
 
-            continue
+            for star_gift in STAR_GIFTS_DATA.snapshot().star_gifts:  # Probing awaits while the data changes
+                if star_gift.is_upgradable or star_gift.upgrade_price is not None or star_gift.id in pending_star_gifts:
+                    continue
 
-        upgradable_star_gifts: list[StarGiftData] = []
+                logger.debug("Probing if star gift %d is upgradable...", star_gift.id)
 
-        for star_gift in gifts_to_check:
-            logger.debug(f"Checking if star gift {star_gift.id} is upgradable...")
+                if await UPGRADE_PREVIEWS.fetch(app, star_gift.id, star_gift.upgrade_price, utils.get_current_timestamp()):
+                    pending_star_gifts[star_gift.id] = star_gift
 
-            if await check_is_star_gift_upgradable(
-                app = app,
-                star_gift_id = star_gift.id
-            ):
-                logger.info(f"Star gift {star_gift.id} is now upgradable.")
+        upgradable_star_gifts: list[StarGiftData] = []
+        upgrade_previews: dict[int, UpgradePreview | None] = {}
 
-                upgradable_star_gifts.append(star_gift)
+        for star_gift in pending_star_gifts.values():
+            upgrade_preview = await UPGRADE_PREVIEWS.fetch(app, star_gift.id, star_gift.upgrade_price, utils.get_current_timestamp())
 
-            else:
-                logger.debug(f"Star gift {star_gift.id} is still not upgradable.")
+            if upgrade_preview is None and config.CHECK_UPGRADES_PREVIEW == "confirm":
+                logger.debug("Star gift %d has an upgrade price, but is not upgradable yet.", star_gift.id)
 
-        if upgradable_star_gifts:
-            if BATCH_STICKERS_DOWNLOAD:
-                logger.debug("Downloading all upgradable gift stickers in batch...")
+                continue
 
-                sticker_file_id_objs = {
-                    star_gift.id: FileId.decode(star_gift.sticker_file_id)
-                    for star_gift in upgradable_star_gifts
-                }
+            upgrade_previews[star_gift.id] = upgrade_preview
 
-                documents_data: dict[int, list[tuple[int, int, bytes]]] = {}
+            logger.info(f"Star gift {star_gift.id} is now upgradable.")
 
-                for star_gift in upgradable_star_gifts:
-                    sticker_file_id_obj = sticker_file_id_objs.get(star_gift.id)
+            publish_event("upgradable", star_gift, upgrade_price=star_gift.upgrade_price)
 
-                    if not sticker_file_id_obj:
-                        logger.warning(f"Invalid sticker file ID upgradable for star gift {star_gift.id}, skipping download.")
+            upgradable_star_gifts.append(star_gift)
 
-                        continue
+        for star_gift in upgradable_star_gifts:
+            del pending_star_gifts[star_gift.id]
 
-                    if sticker_file_id_obj.dc_id not in documents_data:
-                        documents_data[sticker_file_id_obj.dc_id] = []
+        if not upgradable_star_gifts:
+            try:
+                star_gift = await asyncio.wait_for(upgradable_gifts_queue.get(), config.CHECK_UPGRADES_PER_CYCLE)
+                pending_star_gifts[star_gift.id] = star_gift
+                upgradable_gifts_queue.task_done()
 
-                    documents_data[sticker_file_id_obj.dc_id].append((
-                        sticker_file_id_obj.media_id,
-                        sticker_file_id_obj.access_hash,
-                        sticker_file_id_obj.file_reference
-                    ))
+            except asyncio.TimeoutError:
+                pass
 
-                downloaded_stickers_data = await userbot_helpers.download_documents(
-                    client = app,
-                    documents_data = documents_data,
-                    logger = logger
-                )
+            continue
 
-                downloaded_stickers_mapped = {
-                    star_gift_id: downloaded_stickers_data[sticker_file_id_obj.media_id]
-                    for star_gift_id, sticker_file_id_obj in sticker_file_id_objs.items()
-                    if sticker_file_id_obj
-                }
+        if BATCH_STICKERS_DOWNLOAD:
+            logger.debug("Getting all upgradable gift stickers in batch...")
 
-                logger.debug(f"Batch download of {len(downloaded_stickers_mapped)} completed.")
+            sticker_document_ids = {
+                star_gift.id: FileId.decode(star_gift.sticker_file_id).media_id
+                for star_gift in upgradable_star_gifts
+            }
 
-            for star_gift in upgradable_star_gifts:
-                logger.debug(f"""Sending upgrade notification for star gift {star_gift.id}.""")
+            cached_stickers = await STICKER_CACHE.get_many(
+                client = app,
+                file_ids = {
+                    sticker_document_ids[star_gift.id]: star_gift.sticker_file_id
+                    for star_gift in upgradable_star_gifts
+                },
+                logger = logger
+            )
 
-                try:
-                    sticker_binary = downloaded_stickers_mapped.get(star_gift.id) if BATCH_STICKERS_DOWNLOAD else None  # pyright: ignore[reportPossiblyUnboundVariable]
+            logger.debug("Batch of %d stickers ready.", len(cached_stickers))
 
-                    if not sticker_binary:
-                        sticker_binary = typing.cast(BytesIO, await app.download_media(  # pyright: ignore[reportUnknownMemberType]
-                            message = star_gift.sticker_file_id,
-                            in_memory = True
-                        ))
+        for star_gift in upgradable_star_gifts:
+            logger.debug("Sending upgrade notification for star gift %d.", star_gift.id)
 
-                    sticker_binary.seek(0)
-                    sticker_binary.name = star_gift.sticker_file_name
+            try:
+                sticker_binary = cached_stickers.get(sticker_document_ids[star_gift.id]) if BATCH_STICKERS_DOWNLOAD else None  # pyright: ignore[reportPossiblyUnboundVariable]
 
-                    sticker_message = typing.cast(types.Message, await app.send_sticker(  # pyright: ignore[reportUnknownMemberType]
-                        chat_id = config.NOTIFY_UPGRADES_CHAT_ID,
-                        sticker = sticker_binary
+                if not sticker_binary:
+                    sticker_binary = typing.cast(BytesIO, await app.download_media(  # pyright: ignore[reportUnknownMemberType]
+                        message = star_gift.sticker_file_id,
+                        in_memory = True
                     ))
 
-                    await asyncio.sleep(config.NOTIFY_AFTER_STICKER_DELAY)
+                sticker_binary.seek(0)
+                sticker_binary.name = star_gift.sticker_file_name
 
-                    await bot_send_request(
-                        "sendMessage",
-                        {
-                            "chat_id": config.NOTIFY_UPGRADES_CHAT_ID,
-                            "text": config.NOTIFY_UPGRADES_TEXT.format(
-                                id = star_gift.id
-                            ),
-                            "reply_to_message_id": sticker_message.id
-                        } | BASIC_REQUEST_DATA
-                    )
+                sticker_message = typing.cast(types.Message, await app.send_sticker(  # pyright: ignore[reportUnknownMemberType]
+                    chat_id = config.NOTIFY_UPGRADES_CHAT_ID,
+                    sticker = sticker_binary
+                ))
 
-                    logger.info(f"Upgrade notification sent for gift {star_gift.id}.")
+                await asyncio.sleep(config.NOTIFY_AFTER_STICKER_DELAY)
 
-                    await asyncio.sleep(config.NOTIFY_AFTER_TEXT_DELAY)
+                await bot_send_request(
+                    "sendMessage",
+                    {
+                        "chat_id": config.NOTIFY_UPGRADES_CHAT_ID,
+                        "text": render_upgrades_text(star_gift, upgrade_previews[star_gift.id]),
+                        "reply_to_message_id": sticker_message.id
+                    } | BASIC_REQUEST_DATA
+                )
 
-                except Exception as ex:
-                    logger.exception(f"Error sending upgrade notification for gift {star_gift.id}", exc_info=ex)
+                logger.info(f"Upgrade notification sent for gift {star_gift.id}.")
 
-                stored_star_gift = next((
-                    sg
-                    for sg in STAR_GIFTS_DATA.star_gifts
-                    if sg.id == star_gift.id
-                ), None)
+                await asyncio.sleep(config.NOTIFY_AFTER_TEXT_DELAY)
 
-                if not stored_star_gift:
-                    logger.warning(f"Stored star gift {star_gift.id} not found.")
+            except Exception as ex:
+                logger.exception(f"Error sending upgrade notification for gift {star_gift.id}", exc_info=ex)
 
-                    return
+            # `star_gift` might have been replaced by an update since it was queued
+            stored_star_gift = STAR_GIFTS_DATA.update(star_gift.id, is_upgradable=True)
 
-                stored_star_gift.is_upgradable = True
+            if not stored_star_gift:
+                logger.warning(f"Stored star gift {star_gift.id} not found.")
 
-                await star_gifts_data_saver()
+                continue
 
-        logger.debug("Star gifts upgrades one loop completed.")
+            CATALOG_VERSIONS.touch(stored_star_gift.id)
 
-        await asyncio.sleep(config.CHECK_UPGRADES_PER_CYCLE)
+            await star_gifts_data_saver()
+
+        logger.debug("Star gifts upgrades one loop completed.")
+
+
+async def resale_floor_notifier(star_gift: StarGiftData, old_floor: ResaleListing | None, new_floor: ResaleListing | None) -> None:
+    publish_event(
+        "resale_floor",
+        star_gift,
+        price = new_floor.price if new_floor else None,
+        previous_price = old_floor.price if old_floor else None,
+        slug = new_floor.slug if new_floor else None
+    )
+
+    if not config.NOTIFY_RESALE_CHAT_ID or new_floor is None or (old_floor and old_floor.price == new_floor.price):
+        return
+
+    await NOTIFY_TEXTS_RATE_LIMITER.acquire()
+
+    await bot_send_request(
+        "sendMessage",
+        {
+            "chat_id": config.NOTIFY_RESALE_CHAT_ID,
+            "text": config.NOTIFY_RESALE_TEXT.format(
+                emoji = config.NOTIFY_RESALE_TEXT_EMOJIS[old_floor is None or new_floor.price < old_floor.price],
+                id = star_gift.id,
+                price = utils.pretty_int(new_floor.price),
+                previous_price = utils.pretty_int(old_floor.price) if old_floor else "—",
+                slug = new_floor.slug
+            )
+        } | BASIC_REQUEST_DATA
+    )
+
+
+async def resale_tracker(app: Client) -> None:
+    """
+    Scans resale listings of upgradable gifts, only their floor between full scans.
+    """
+
+    while True:
+        # Archived gifts are all upgradable, they are only read from the archive when their floor changes
+        upgradable_star_gift_ids = [
+            *(
+                star_gift.id
+                for star_gift in STAR_GIFTS_DATA.snapshot().star_gifts
+                if star_gift.is_upgradable
+            ),
+            *STAR_GIFTS_DATA.archived_star_gifts
+        ]
+
+        pages_count = RESALE_TRACKER.pages_count
+
+        floor_changes, flood_wait = await RESALE_TRACKER.scan_many(app, upgradable_star_gift_ids, time.monotonic(), logger)
+
+        logger.debug("Resale listings of %d gifts scanned in %d pages, %d floors changed.", len(upgradable_star_gift_ids), RESALE_TRACKER.pages_count - pages_count, len(floor_changes))
+
+        if flood_wait is not None:
+            logger.warning(f"Got FLOOD_WAIT of {flood_wait}s on getResaleStarGifts, resale scan round stopped.")
+
+        for star_gift_id, (old_floor, new_floor) in floor_changes.items():
+            star_gift = STAR_GIFTS_DATA.get(star_gift_id)
+
+            if star_gift is None:
+                continue
+
+            try:
+                await resale_floor_notifier(star_gift, old_floor, new_floor)
+
+            except Exception as ex:
+                logger.exception(f"Error notifying about the resale floor of gift {star_gift_id}", exc_info=ex)
+
+        await asyncio.sleep(max(config.RESALE_CHECK_INTERVAL, flood_wait or 0))
+
+
+async def session_flusher() -> None:
+    """
+    Writes the userbot session changed since the previous flush.
+    """
+
+    while True:
+        await asyncio.sleep(config.SESSION_FLUSH_INTERVAL)
+
+        try:
+            await SESSION_STORAGE.flush()
+
+        except Exception as ex:
+            logger.exception("Error flushing the userbot session", exc_info=ex)
+
+
+async def traces_flusher() -> None:
+    """
+    Writes the spans buffered since the previous flush, so a quiet detector doesn't keep them in memory.
+    """
+
+    while True:
+        await asyncio.sleep(config.TRACE_FLUSH_INTERVAL)
+
+        try:
+            tracing.flush()
+
+        except Exception as ex:
+            logger.exception("Error flushing the trace file", exc_info=ex)
 
 
 # =========================
 #     /start ПОЛЛЕР
 # =========================
 
+CHAT_LABELS: dict[int | str, str] = {}
+
+
 async def _get_chat_label(chat_id: int | str) -> str:
-    """Пытается получить human-readable название чата через первичный бот."""
+    """Пытается получить human-readable название чата через первичный бот (успешный результат кэшируется)."""
+    if chat_id in CHAT_LABELS:
+        return CHAT_LABELS[chat_id]
     try:
         chat = await bot_send_request_primary("getChat", {"chat_id": chat_id})
         if not chat:
             return str(chat_id)
         title = chat.get("title") or chat.get("username") or str(chat_id)
         if chat.get("username"):
-            return f"@{chat['username']}"
+            title = f"@{chat['username']}"
+        CHAT_LABELS[chat_id] = title
         return title
     except Exception:
         return str(chat_id)
 
 
-async def start_command_poller() -> None:
+def _get_admins() -> set[int] | None:
+    """Админы, если указаны в конфиге — ограничиваем право триггерить тест в каналах."""
+    try:
+        admins_list = getattr(config, "ADMIN_USER_IDS", None)
+        if admins_list:
+            return {int(x) for x in admins_list}
+    except Exception:
+        pass
+    return None
+
+
+@BOT_UPDATES_DISPATCHER.command("start")
+async def start_command_handler(message: dict[str, typing.Any], arguments: str) -> None:
     """
-    Лёгкий long-poll getUpdates для обработки команды /start у ПЕРВОГО бота из списка.
+    Обработка команды /start у ПЕРВОГО бота из списка (через getUpdates или вебхук).
     На /start бот:
       1) отвечает в личку пользователю, что детектор запущен;
       2) (опционально) отправляет тестовые сообщения в канал(ы) уведомлений.
-    Включается, если есть хотя бы один токен.
     """
-    if not PRIMARY_BOT_TOKEN:
-        logger.info("No PRIMARY_BOT_TOKEN, skipping /start poller.")
+    send_tests_to_channels: bool = getattr(config, "START_SEND_TEST_TO_CHANNELS", True)
+    admins = _get_admins()
+
+    chat_id = message["chat"]["id"]
+    user_id = (message.get("from") or {}).get("id")
+
+    notify_label = await _get_chat_label(config.NOTIFY_CHAT_ID)
+    upgrades_label: str | None = None
+
+    if getattr(config, "NOTIFY_UPGRADES_CHAT_ID", None):
+        upgrades_label = await _get_chat_label(config.NOTIFY_UPGRADES_CHAT_ID)
+
+    # Проверяем право триггерить тест в каналах (если список админов указан)
+    allow_channel_test = (admins is None) or (isinstance(user_id, int) and user_id in admins)
+
+    # Тестовые сообщения в канал(ы)
+    sent_to_channels_info: list[str] = []
+    if send_tests_to_channels and allow_channel_test:
+        try:
+            resp = await bot_send_request_primary(
+                "sendMessage",
+                {
+                    "chat_id": config.NOTIFY_CHAT_ID,
+                    "text": getattr(
+                        config,
+                        "START_TEST_NOTIFY_TEXT",
+                        "🔔 Тест уведомлений: бот активен и готов отправлять сообщения."
+                    )
+                } | BASIC_REQUEST_DATA
+            )
+            if resp:
+                sent_to_channels_info.append(f"в {notify_label}")
+        except Exception as ex:
+            logger.warning(f"Failed to send test to NOTIFY_CHAT_ID: {ex}")
+
+        if getattr(config, "NOTIFY_UPGRADES_CHAT_ID", None):
+            try:
+                resp2 = await bot_send_request_primary(
+                    "sendMessage",
+                    {
+                        "chat_id": config.NOTIFY_UPGRADES_CHAT_ID,
+                        "text": getattr(
+                            config,
+                            "START_TEST_UPGRADES_TEXT",
+                            "⬆️ Тест канала апгрейдов: бот активен."
+                        )
+                    } | BASIC_REQUEST_DATA
+                )
+                if resp2:
+                    sent_to_channels_info.append(f"в {upgrades_label}")
+            except Exception as ex:
+                logger.warning(f"Failed to send test to NOTIFY_UPGRADES_CHAT_ID: {ex}")
+
+    # Ответ пользователю
+    ok_text_template = getattr(
+        config,
+        "START_REPLY_TEXT",
+        (
+            "✅ Детектор запущен и работает.\n"
+            "Канал уведомлений: {notify}\n"
+            "{upgrades_line}"
+            "Интервал проверки: {interval}s\n"
+            "Тест в каналы: {test_info}\n"
+            "Если что — смотри логи в файле."
+        )
+    )
+
+    upgrades_line = ""
+    if upgrades_label:
+        upgrades_line = f"Канал апгрейдов: {upgrades_label}\n"
+
+    test_info = ("не отправлялся (нет прав)" if send_tests_to_channels and not allow_channel_test
+                 else ("отправлен " + ", ".join(sent_to_channels_info)) if sent_to_channels_info
+                 else ("не отправлялся" if not send_tests_to_channels else "ошибка/пропущен"))
+
+    ok_text = ok_text_template.format(
+        notify=notify_label,
+        upgrades_line=upgrades_line,
+        interval=f"{config.POLL_FAST_INTERVAL:g}–{config.POLL_IDLE_INTERVAL:g}",
+        test_info=test_info
+    )
+
+    await bot_send_request_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": ok_text} | BASIC_REQUEST_DATA
+    )
+
+
+def _is_private_chat(message: dict[str, typing.Any]) -> bool:
+    return config.SUBSCRIPTIONS_ENABLED and message["chat"].get("type") == "private"
+
+
+@BOT_UPDATES_DISPATCHER.command("subscribe")
+async def subscribe_command_handler(message: dict[str, typing.Any], arguments: str) -> None:
+    """
+    /subscribe <фильтр> в личке ПЕРВОГО бота: подписка на новые подарки по фильтру, заменяет прежнюю.
+    Без аргументов показывает текущий фильтр и справку.
+    """
+    if not _is_private_chat(message):
         return
 
-    # Настройки с дефолтами
-    long_poll_timeout: int = getattr(config, "BOT_UPDATES_TIMEOUT", 50)
-    send_tests_to_channels: bool = getattr(config, "START_SEND_TEST_TO_CHANNELS", True)
+    chat_id = message["chat"]["id"]
+    subscription_filter = SUBSCRIPTIONS_DATA.subscriptions.get(chat_id)
 
-    # Админы, если указаны в конфиге — ограничиваем право триггерить тест в каналах
-    admins: set[int] | None = None
-    try:
-        admins_list = getattr(config, "ADMIN_USER_IDS", None)
-        if admins_list:
-            admins = {int(x) for x in admins_list}
-    except Exception:
-        admins = None
+    if not arguments.strip():
+        text = config.SUBSCRIBE_HELP_TEXT
 
-    offset: int | None = None
-    logger.info("Start-command poller is running on primary bot.")
+        if subscription_filter:
+            text = config.SUBSCRIBE_CURRENT_TEXT.format(filter=html.escape(subscription_filter.format())) + "\n\n" + text
 
-    notify_label: str | None = None
-    upgrades_label: str | None = None
+    else:
+        try:
+            subscription_filter = SubscriptionFilter.parse(arguments)
+
+        except ValueError as ex:
+            text = config.SUBSCRIBE_INVALID_TEXT.format(error=html.escape(str(ex))) + "\n\n" + config.SUBSCRIBE_HELP_TEXT
+
+        else:
+            SUBSCRIPTIONS_DATA.subscriptions[chat_id] = subscription_filter
+            SUBSCRIPTION_INDEX.add(chat_id, subscription_filter)
+            SUBSCRIPTIONS_DATA.save()
+
+            logger.info(f"Chat {chat_id} subscribed: {subscription_filter.format()}")
+
+            text = config.SUBSCRIBE_SAVED_TEXT.format(filter=html.escape(subscription_filter.format()))
+
+    await bot_send_request_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": text} | BASIC_REQUEST_DATA
+    )
+
+
+@BOT_UPDATES_DISPATCHER.command("unsubscribe")
+async def unsubscribe_command_handler(message: dict[str, typing.Any], arguments: str) -> None:
+    """
+    /unsubscribe в личке ПЕРВОГО бота: отмена подписки.
+    """
+    if not _is_private_chat(message):
+        return
+
+    chat_id = message["chat"]["id"]
+
+    if remove_subscription(chat_id):
+        logger.info(f"Chat {chat_id} unsubscribed.")
+
+        text = config.UNSUBSCRIBE_TEXT
+
+    else:
+        text = config.UNSUBSCRIBE_NOT_FOUND_TEXT
+
+    await bot_send_request_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": text} | BASIC_REQUEST_DATA
+    )
+
+
+def enqueue_subscription_deliveries(star_gifts: list[StarGiftData]) -> None:
+    """
+    Ставит в очередь рассылки тексты новых подарков подписчикам, чьи фильтры они проходят.
+    Подарки одного дропа уходят чату одним сообщением (или несколькими, если не влезают в лимит длины).
+    """
+    texts_by_chat_id: dict[int, list[str]] = {}
+
+    for star_gift in star_gifts:
+        chat_ids = SUBSCRIPTION_INDEX.match(star_gift)
+
+        if not chat_ids:
+            continue
+
+        text = get_notify_text(star_gift)
+
+        for chat_id in chat_ids:
+            texts_by_chat_id.setdefault(chat_id, []).append(text)
+
+    dropped = 0
+
+    for chat_id, texts in texts_by_chat_id.items():
+        for text in split_texts(texts):
+            if not SUBSCRIPTION_DELIVERIES.put_nowait(chat_id, text):
+                dropped += 1
+
+    metrics.SUBSCRIPTION_DELIVERIES.labels("dropped").inc(dropped)
+
+    logger.info(f"Queued subscription messages for {len(texts_by_chat_id)} chats, {dropped} dropped.")
+
+
+def remove_subscription(chat_id: int) -> bool:
+    """
+    Удаляет подписку чата из данных и индекса. False, если подписки не было.
+    """
+    if SUBSCRIPTIONS_DATA.subscriptions.pop(chat_id, None) is None:
+        return False
+
+    SUBSCRIPTION_INDEX.remove(chat_id)
+    SUBSCRIPTIONS_DATA.save()
+
+    return True
+
+
+async def send_subscription_message(chat_id: int, text: str) -> bool:
+    """
+    Подписчик, заблокировавший бота или удалённый, отписывается: иначе каждый подходящий подарок
+    тратит на него запрос к Bot API.
+    """
+    response = await bot_post_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": text} | BASIC_REQUEST_DATA
+    )
+
+    if response and response.get("ok"):
+        return True
+
+    description = response.get("description") if response else None
+
+    if isinstance(description, str) and any(error in description for error in SUBSCRIBER_GONE_ERRORS):
+        if remove_subscription(chat_id):
+            logger.info(f"Chat {chat_id} unsubscribed: {description}")
+
+    elif response:
+        logger.warning("[primary] Telegram API error for method sendMessage: %s", response)
+
+    return False
+
+
+@BOT_UPDATES_DISPATCHER.command("profile")
+async def profile_command_handler(message: dict[str, typing.Any], arguments: str) -> None:
+    """
+    /profile [секунды] от админа из ADMIN_USER_IDS: профилирование работающего детектора.
+    Сессия идёт в фоне, чтобы не задерживать следующие апдейты, по её окончании бот присылает топ функций.
+    Без списка админов команда отключена.
+    """
+    admins = _get_admins()
+    user_id = (message.get("from") or {}).get("id")
+
+    if not admins or user_id not in admins:
+        return
+
+    chat_id = message["chat"]["id"]
 
-    # Пытаемся подтянуть читабельные имена каналов один раз
     try:
-        notify_label = await _get_chat_label(config.NOTIFY_CHAT_ID)
-    except Exception:
-        notify_label = str(config.NOTIFY_CHAT_ID)
+        duration = float(arguments) if arguments else config.PROFILE_DURATION
 
-    if getattr(config, "NOTIFY_UPGRADES_CHAT_ID", None):
-        try:
-            upgrades_label = await _get_chat_label(config.NOTIFY_UPGRADES_CHAT_ID)
-        except Exception:
-            upgrades_label = str(config.NOTIFY_UPGRADES_CHAT_ID)
+    except ValueError:
+        duration = 0.0
+
+    if not 0 < duration <= config.PROFILE_MAX_DURATION:
+        text = config.PROFILE_INVALID_TEXT.format(max_duration=config.PROFILE_MAX_DURATION)
+
+    elif RUNTIME_PROFILER.is_running:
+        text = config.PROFILE_BUSY_TEXT
+
+    else:
+        BOT_UPDATES_DISPATCHER.create_task(logger_wrapper(send_profile(chat_id, RUNTIME_PROFILER.start(duration))))
+
+        logger.info(f"Profiling for {duration:g} seconds, requested by {user_id}.")
+
+        text = config.PROFILE_STARTED_TEXT.format(duration=duration)
+
+    await bot_send_request_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": text} | BASIC_REQUEST_DATA
+    )
+
+
+def get_profile_text(report: ProfileReport, report_filename: str) -> str:
+    top_functions = "\n".join(
+        f"{function.total_time * 1000:9.1f} {function.calls:>8}  {html.escape(function.name[-60:])}"
+        for function in report.get_top_functions(config.PROFILE_TOP_FUNCTIONS)
+    )
+
+    return config.PROFILE_DONE_TEXT.format(
+        duration = report.duration,
+        idle_time = report.get_idle_time(),
+        max_tasks = report.max_tasks,
+        slow_callbacks = len(report.slow_callbacks),
+        longest_slow_callback = max((slow_callback.duration for slow_callback in report.slow_callbacks), default=0.0) * 1000,
+        top_functions = f"{'own ms':>9} {'calls':>8}  function\n{top_functions}",
+        report_filename = html.escape(report_filename)
+    )
+
+
+async def send_profile(chat_id: int, session: asyncio.Task[ProfileReport]) -> None:
+    """
+    Дожидается сессии /profile: профиль сохраняется в LOGS_DIRPATH (.pstats и текстовый отчёт), в чат уходит сводка.
+    """
+    report = await session
+
+    filepath = constants.LOGS_DIRPATH / f"""profile_{utils.get_current_datetime(timezone).replace(":", "-")}"""
+
+    _, report_filepath = await asyncio.to_thread(report.save, filepath)
+
+    logger.info(f"Profile saved to {report_filepath}, {len(report.slow_callbacks)} slow callbacks.")
+
+    await bot_send_request_primary(
+        "sendMessage",
+        {"chat_id": chat_id, "text": get_profile_text(report, report_filepath.name)} | BASIC_REQUEST_DATA
+    )
+
+
+async def bot_updates_poller() -> None:
+    """
+    Лёгкий long-poll getUpdates у ПЕРВОГО бота из списка, апдейты уходят в BOT_UPDATES_DISPATCHER.
+    Включается, если есть хотя бы один токен и не включён режим вебхука.
+    """
+    if not PRIMARY_BOT_TOKEN:
+        logger.info("No PRIMARY_BOT_TOKEN, skipping bot updates poller.")
+        return
+
+    long_poll_timeout: int = getattr(config, "BOT_UPDATES_TIMEOUT", 50)
+
+    # getUpdates не работает, пока у бота установлен вебхук
+    await bot_send_request_primary("deleteWebhook")
+
+    offset: int | None = None
+    logger.info("Bot updates poller is running on primary bot.")
 
     while True:
         try:
@@ -687,6 +1484,7 @@ async def start_command_poller() -> None:
                 "getUpdates",
                 {
                     "timeout": long_poll_timeout,
+                    "allowed_updates": ALLOWED_UPDATES,
                     **({"offset": offset} if offset is not None else {})
                 }
             )
@@ -695,103 +1493,72 @@ async def start_command_poller() -> None:
                 continue
 
             for update in updates:
-                try:
-                    update_id = update.get("update_id")
-                    if update_id is not None:
-                        offset = update_id + 1
-
-                    message = update.get("message") or update.get("channel_post") or {}
-                    text = (message.get("text") or "").strip()
-                    chat = message.get("chat") or {}
-                    chat_id = chat.get("id")
-                    from_user = message.get("from") or {}
-                    user_id = from_user.get("id")
-
-                    if not text or not chat_id:
-                        continue
+                update_id = update.get("update_id")
+                if update_id is not None:
+                    offset = update_id + 1
 
-                    if text.lower().startswith("/start"):
-                        # Проверяем право триггерить тест в каналах (если список админов указан)
-                        allow_channel_test = (admins is None) or (isinstance(user_id, int) and user_id in admins)
-
-                        # Тестовые сообщения в канал(ы)
-                        sent_to_channels_info: list[str] = []
-                        if send_tests_to_channels and allow_channel_test:
-                            try:
-                                resp = await bot_send_request_primary(
-                                    "sendMessage",
-                                    {
-                                        "chat_id": config.NOTIFY_CHAT_ID,
-                                        "text": getattr(
-                                            config,
-                                            "START_TEST_NOTIFY_TEXT",
-                                            "🔔 Тест уведомлений: бот активен и готов отправлять сообщения."
-                                        )
-                                    } | BASIC_REQUEST_DATA
-                                )
-                                if resp:
-                                    sent_to_channels_info.append(f"в {notify_label}")
-                            except Exception as ex:
-                                logger.warning(f"Failed to send test to NOTIFY_CHAT_ID: {ex}")
-
-                            if getattr(config, "NOTIFY_UPGRADES_CHAT_ID", None):
-                                try:
-                                    resp2 = await bot_send_request_primary(
-                                        "sendMessage",
-                                        {
-                                            "chat_id": config.NOTIFY_UPGRADES_CHAT_ID,
-                                            "text": getattr(
-                                                config,
-                                                "START_TEST_UPGRADES_TEXT",
-                                                "⬆️ Тест канала апгрейдов: бот активен."
-                                            )
-                                        } | BASIC_REQUEST_DATA
-                                    )
-                                    if resp2:
-                                        sent_to_channels_info.append(f"в {upgrades_label}")
-                                except Exception as ex:
-                                    logger.warning(f"Failed to send test to NOTIFY_UPGRADES_CHAT_ID: {ex}")
-
-                        # Ответ пользователю
-                        ok_text_template = getattr(
-                            config,
-                            "START_REPLY_TEXT",
-                            (
-                                "✅ Детектор запущен и работает.\n"
-                                "Канал уведомлений: {notify}\n"
-                                "{upgrades_line}"
-                                "Интервал проверки: {interval}s\n"
-                                "Тест в каналы: {test_info}\n"
-                                "Если что — смотри логи в файле."
-                            )
-                        )
+                await BOT_UPDATES_DISPATCHER.dispatch(update)
 
-                        upgrades_line = ""
-                        if getattr(config, "NOTIFY_UPGRADES_CHAT_ID", None):
-                            upgrades_line = f"Канал апгрейдов: {upgrades_label}\n"
+        except Exception as ex:
+            logger.warning(f"getUpdates loop error: {ex}")
+            await asyncio.sleep(2)
 
-                        test_info = ("не отправлялся (нет прав)" if send_tests_to_channels and not allow_channel_test
-                                     else ("отправлен " + ", ".join(sent_to_channels_info)) if sent_to_channels_info
-                                     else ("не отправлялся" if not send_tests_to_channels else "ошибка/пропущен"))
 
-                        ok_text = ok_text_template.format(
-                            notify=notify_label,
-                            upgrades_line=upgrades_line,
-                            interval=config.CHECK_INTERVAL,
-                            test_info=test_info
-                        )
+async def bot_updates_webhook() -> None:
+    """
+    Приём апдейтов ПЕРВОГО бота через вебхук вместо long-poll getUpdates.
+    Telegram отправляет апдейты на BOT_WEBHOOK_URL, который должен проксироваться на BOT_WEBHOOK_HOST:BOT_WEBHOOK_PORT.
+    """
+    if not PRIMARY_BOT_TOKEN:
+        logger.info("No PRIMARY_BOT_TOKEN, skipping bot updates webhook.")
+        return
 
-                        await bot_send_request_primary(
-                            "sendMessage",
-                            {"chat_id": chat_id, "text": ok_text} | BASIC_REQUEST_DATA
-                        )
+    # Секрет генерируется на каждый запуск, если не задан: setWebhook всё равно вызывается при старте
+    secret_token = config.BOT_WEBHOOK_SECRET_TOKEN or secrets.token_urlsafe(32)
 
-                except Exception as inner_ex:
-                    logger.exception("Error while processing incoming update", exc_info=inner_ex)
+    server = create_webhook_server(
+        dispatcher = BOT_UPDATES_DISPATCHER,
+        host = config.BOT_WEBHOOK_HOST,
+        port = config.BOT_WEBHOOK_PORT,
+        path = urlsplit(config.BOT_WEBHOOK_URL).path or "/",
+        secret_token = secret_token,
+        logger = logger
+    )
 
-        except Exception as ex:
-            logger.warning(f"getUpdates loop error: {ex}")
-            await asyncio.sleep(2)
+    await server.start()
+
+    # Пока setWebhook не прошёл, Telegram шлёт апдейты на старый адрес/секрет: наш сервер их не получит или отклонит с 401
+    for attempt in range(BOT_WEBHOOK_SET_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(2 ** attempt)
+
+        is_set = await bot_send_request_primary(
+            "setWebhook",
+            {
+                "url": config.BOT_WEBHOOK_URL,
+                "secret_token": secret_token,
+                "allowed_updates": ALLOWED_UPDATES,
+                "max_connections": config.BOT_WEBHOOK_MAX_CONNECTIONS
+            }
+        ) is True
+
+        if is_set:
+            break
+
+        logger.warning(f"Failed to set the bot updates webhook (attempt {attempt + 1}/{BOT_WEBHOOK_SET_ATTEMPTS}).")
+
+    else:
+        logger.error(f"Failed to set the bot updates webhook to {config.BOT_WEBHOOK_URL}, falling back to getUpdates.")
+
+        await server.stop()
+
+        await bot_updates_poller()  # Deletes the webhook first
+
+        return
+
+    logger.info(f"Bot updates webhook is set to {config.BOT_WEBHOOK_URL}.")
+
+    await server.serve_forever()
 
 
 async def logger_wrapper(coro: typing.Awaitable[T]) -> T | None:
@@ -817,7 +1584,9 @@ async def main(save_only: bool=False) -> None:
     if save_only:
         logger.info("Save only mode enabled, skipping gift detection.")
 
-        if STAR_GIFTS_DATA.star_gifts:
+        if STAR_GIFTS_DATA.star_gifts or STAR_GIFTS_DATA.archived_star_gifts:
+            STAR_GIFTS_DATA.promote(list(STAR_GIFTS_DATA.archived_star_gifts))  # The dump keeps every gift in one file
+
             star_gifts_data_filepath = STAR_GIFTS_DATA.DATA_FILEPATH.with_name(
                 f"""star_gifts_dump_{utils.get_current_datetime(timezone).replace(":", "-")}.json"""
             )
@@ -828,14 +1597,18 @@ async def main(save_only: bool=False) -> None:
 
             logger.info(f"Old star gifts dump saved to {star_gifts_data_filepath}.")
 
-        STAR_GIFTS_DATA = StarGiftsData.load(config.DATA_FILEPATH, new=True)  # pyright: ignore[reportConstantRedefinition]
+        STAR_GIFTS_DATA = StarGiftsData.load(config.DATA_FILEPATH, new=True, pretty=config.DATA_PRETTY_JSON)  # pyright: ignore[reportConstantRedefinition]
         STAR_GIFTS_DATA.save()
 
+    for star_gift_id in STAR_GIFTS_DATA.archived_star_gifts:  # Histories of gifts archived before they were dropped on archiving
+        AVAILABILITY_HISTORIES.forget(star_gift_id)
+
     app = Client(
         name = config.SESSION_NAME,
         api_id = config.API_ID,
         api_hash = config.API_HASH,
-        sleep_threshold = USERBOT_SLEEP_THRESHOLD
+        sleep_threshold = USERBOT_SLEEP_THRESHOLD,
+        storage = SESSION_STORAGE
     )
 
     try:
@@ -848,13 +1621,74 @@ async def main(save_only: bool=False) -> None:
 
     logger.info("Pyrogram client started.")
 
+    tasks: list[asyncio.Task[typing.Any]] = []
+
+    if not save_only:
+        tasks.append(asyncio.create_task(logger_wrapper(
+            session_flusher()
+        )))
+
     update_gifts_queue = (
         UPDATE_GIFTS_QUEUE_T()
         if BOTS_AMOUNT > 0 else
         None
     )
+    upgradable_gifts_queue = (
+        UPGRADABLE_GIFTS_QUEUE_T()
+        if config.NOTIFY_UPGRADES_CHAT_ID and not save_only else
+        None
+    )
 
-    tasks: list[asyncio.Task[typing.Any]] = []
+    if config.TRACE_FILEPATH and not save_only:
+        tracing.configure(
+            filepath = config.TRACE_FILEPATH,
+            buffer_size = config.TRACE_BUFFER_SIZE,
+            max_file_size = config.TRACE_MAX_FILE_SIZE
+        )
+
+        tasks.append(asyncio.create_task(logger_wrapper(
+            traces_flusher()
+        )))
+
+        logger.info(f"Tracing gifts to {config.TRACE_FILEPATH}.")
+
+    if config.METRICS_ENABLED and not save_only:
+        if update_gifts_queue:
+            metrics.UPDATE_QUEUE_DEPTH.set_function(update_gifts_queue.qsize)
+
+        metrics.POLL_INTERVAL.set_function(POLL_SCHEDULER.get_delay)
+        metrics.STORED_GIFTS.labels("hot").set_function(lambda: len(STAR_GIFTS_DATA.star_gifts))
+        metrics.STORED_GIFTS.labels("archived").set_function(lambda: len(STAR_GIFTS_DATA.archived_star_gifts))
+        metrics.SUBSCRIPTIONS.set_function(lambda: len(SUBSCRIPTION_INDEX))
+        metrics.SUBSCRIPTION_QUEUE_DEPTH.set_function(SUBSCRIPTION_DELIVERIES.queue.qsize)
+
+        tasks.append(asyncio.create_task(logger_wrapper(
+            metrics.create_metrics_server(
+                host = config.METRICS_HOST,
+                port = config.METRICS_PORT,
+                logger = logger
+            ).serve_forever()
+        )))
+
+        logger.info("Metrics server task started.")
+
+    if config.CATALOG_API_ENABLED and not save_only:
+        tasks.append(asyncio.create_task(logger_wrapper(
+            create_catalog_api_server(
+                host = config.CATALOG_API_HOST,
+                port = config.CATALOG_API_PORT,
+                catalog_api = CatalogAPI(
+                    get_star_gifts = lambda: STAR_GIFTS_DATA.snapshot(archive=True).get_all(),
+                    versions = CATALOG_VERSIONS,
+                    upgrade_previews = UPGRADE_PREVIEWS,
+                    get_sticker = partial(get_cached_sticker, app)
+                ),
+                logger = logger,
+                event_bus = EVENT_BUS
+            ).serve_forever()
+        )))
+
+        logger.info("Catalog API server task started.")
 
     if update_gifts_queue and not save_only:
         tasks.append(asyncio.create_task(logger_wrapper(
@@ -868,9 +1702,12 @@ async def main(save_only: bool=False) -> None:
     elif not save_only:
         logger.info("No bots available, skipping update gifts processing.")
 
-    if config.NOTIFY_UPGRADES_CHAT_ID and not save_only:
+    if upgradable_gifts_queue:
         tasks.append(asyncio.create_task(logger_wrapper(
-            star_gifts_upgrades_checker(app)
+            star_gifts_upgrades_checker(
+                app = app,
+                upgradable_gifts_queue = upgradable_gifts_queue
+            )
         )))
 
         logger.info("Star gifts upgrades checker task started.")
@@ -878,20 +1715,42 @@ async def main(save_only: bool=False) -> None:
     elif not save_only:
         logger.info("Upgrades channel is not set, skipping star gifts upgrades checking.")
 
-    # /start-поллер запускаем, если есть хотя бы один токен
+    if config.RESALE_ENABLED and not save_only:
+        tasks.append(asyncio.create_task(logger_wrapper(
+            resale_tracker(app)
+        )))
+
+        logger.info("Resale tracker task started.")
+
+    # Рассылка подписчикам идёт через ПЕРВЫЙ бот, команды /subscribe принимает он же
+    if config.SUBSCRIPTIONS_ENABLED and BOTS_AMOUNT > 0 and not save_only:
+        tasks.append(asyncio.create_task(logger_wrapper(
+            SUBSCRIPTION_DELIVERIES.run(
+                send = send_subscription_message,
+                on_result = lambda result: metrics.SUBSCRIPTION_DELIVERIES.labels(result).inc(),
+                logger = logger
+            )
+        )))
+
+        logger.info(f"Subscription deliveries task started, {len(SUBSCRIPTION_INDEX)} subscriptions.")
+
+    # Команды бота (/start, /subscribe, /profile) принимаем, если есть хотя бы один токен: через вебхук или long-poll getUpdates
     if BOTS_AMOUNT > 0 and not save_only:
         tasks.append(asyncio.create_task(logger_wrapper(
-            start_command_poller()
+            bot_updates_webhook()
+            if config.BOT_WEBHOOK_URL else
+            bot_updates_poller()
         )))
-        logger.info("Start-command bot poller task started.")
+        logger.info(f"Bot updates {'webhook' if config.BOT_WEBHOOK_URL else 'poller'} task started.")
     elif not save_only:
-        logger.info("No bots available, skipping /start command poller.")
+        logger.info("No bots available, skipping bot commands handling.")
 
     tasks.append(asyncio.create_task(logger_wrapper(
         detector(
             app = app,
-            new_gift_callback = partial(process_new_gift, app),
+            new_gifts_callback = partial(process_new_gifts, app),
             update_gifts_queue = update_gifts_queue,
+            upgradable_gifts_queue = upgradable_gifts_queue,
             save_only = save_only
         )
     )))
@@ -904,6 +1763,12 @@ async def main(save_only: bool=False) -> None:
 if __name__ == "__main__":
     import sys
 
+    if utils.set_event_loop_policy(config.USE_UVLOOP):
+        logger.info("Using uvloop event loop.")
+
+    elif config.USE_UVLOOP:
+        logger.warning("uvloop is not installed, falling back to the default asyncio event loop.")
+
     try:
         asyncio.run(main(
             save_only = "--save-only" in sys.argv or "-S" in sys.argv
@@ -919,5 +1784,12 @@ if __name__ == "__main__":
         logger.info("Saving star gifts data before exit...")
 
         STAR_GIFTS_DATA.save()
+        AVAILABILITY_HISTORIES.save()
+        UPGRADE_PREVIEWS.data.save()
+        SESSION_STORAGE.flush_sync()
+        tracing.flush()
 
         logger.info("Star gifts data saved. Exiting.")
+
+        if TRAFFIC_RECORDER:
+            TRAFFIC_RECORDER.close()
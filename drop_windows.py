@@ -0,0 +1,199 @@
+"""
+Model of when new gifts are released, built from `first_appearance_timestamp` of the known gifts.
+
+Releases are counted in a histogram of the 168 hours of a week (UTC), smoothed with the
+neighbouring hours and an additive prior. The poll budget is then spread with a square-root
+allocation: for a fixed amount of polls, the expected detection delay `sum(p_i * T_i / 2)` is
+the lowest when the interval of every hour is `T_i ~ 1 / sqrt(p_i)`.
+
+Usage: python drop_windows.py [data file]
+"""
+
+from pathlib import Path
+
+import statistics
+import math
+import typing
+
+from star_gifts_data import StarGiftData
+
+
+HOURS_PER_WEEK = 7 * 24
+SECONDS_PER_HOUR = 60 * 60
+EPOCH_WEEK_HOUR = 3 * 24  # 1970-01-01 was a Thursday
+DROP_GAP = SECONDS_PER_HOUR  # Gifts appearing within this time after the first one are a single drop
+SMOOTHING_KERNEL = (0.25, 0.5, 0.25)  # Previous, same and next hour
+
+
+def get_week_hour(timestamp: float) -> int:
+    """
+    Hour of the week in UTC, from 0 (Monday 00:00) to 167 (Sunday 23:00).
+    """
+
+    return (int(timestamp) // SECONDS_PER_HOUR + EPOCH_WEEK_HOUR) % HOURS_PER_WEEK
+
+
+def get_drop_timestamps(timestamps: typing.Iterable[int]) -> list[int]:
+    drop_timestamps: list[int] = []
+
+    for timestamp in sorted(timestamps):
+        if not drop_timestamps or timestamp - drop_timestamps[-1] >= DROP_GAP:
+            drop_timestamps.append(timestamp)
+
+    return drop_timestamps
+
+
+class DropWindows:
+    """
+    `weights` are relative poll rates of every hour of the week, averaging to 1,
+    so scaling an interval by them keeps the total amount of polls the same.
+    """
+
+    __slots__ = ("probabilities", "weights")
+
+    def __init__(self, probabilities: list[float]) -> None:
+        self.probabilities = probabilities
+
+        roots = [math.sqrt(probability) for probability in probabilities]
+        mean_root = sum(roots) / len(roots)
+
+        self.weights = [root / mean_root for root in roots]
+
+    @classmethod
+    def fit(cls, timestamps: typing.Iterable[int], smoothing: float=0.5) -> "DropWindows":
+        """
+        `smoothing` is the prior amount of drops added to every hour, so a short history
+        only moves the model away from a uniform schedule gradually.
+        """
+
+        counts = [0] * HOURS_PER_WEEK
+
+        for drop_timestamp in get_drop_timestamps(timestamps):
+            counts[get_week_hour(drop_timestamp)] += 1
+
+        smoothed_counts = [
+            smoothing + sum(
+                weight * counts[(week_hour + offset - 1) % HOURS_PER_WEEK]
+                for offset, weight in enumerate(SMOOTHING_KERNEL)
+            )
+            for week_hour in range(HOURS_PER_WEEK)
+        ]
+        total_count = sum(smoothed_counts)
+
+        return cls([
+            smoothed_count / total_count
+            for smoothed_count in smoothed_counts
+        ])
+
+    @classmethod
+    def fit_star_gifts(cls, star_gifts: typing.Iterable[StarGiftData], smoothing: float=0.5) -> "DropWindows":
+        return cls.fit(
+            timestamps = (
+                star_gift.first_appearance_timestamp
+                for star_gift in star_gifts
+                if star_gift.first_appearance_timestamp
+            ),
+            smoothing = smoothing
+        )
+
+    def get_weight(self, timestamp: float) -> float:
+        return self.weights[get_week_hour(timestamp)]
+
+    def get_interval(self, interval: float, timestamp: float) -> float:
+        return interval / self.get_weight(timestamp)
+
+
+def evaluate(
+    timestamps: typing.Iterable[int],
+    interval: float,
+    floor: float,
+    ceiling: float,
+    smoothing: float,
+    min_history: int = 10
+) -> dict[str, dict[str, float]]:
+    """
+    Replays the drops in chronological order, predicting every one with a model fitted on the drops before it.
+
+    The expected detection delay of a drop is half of the poll interval at its time.
+    """
+
+    drop_timestamps = get_drop_timestamps(timestamps)
+    evaluated_drop_timestamps = drop_timestamps[min_history:]
+
+    if not evaluated_drop_timestamps:
+        raise ValueError(f"At least {min_history + 1} drops are needed, got {len(drop_timestamps)}")
+
+    def clamp(value: float) -> float:
+        return min(max(value, floor), ceiling)
+
+    fixed_delays: list[float] = []
+    model_delays: list[float] = []
+
+    for i, drop_timestamp in enumerate(evaluated_drop_timestamps, min_history):
+        drop_windows = DropWindows.fit(drop_timestamps[:i], smoothing)
+
+        fixed_delays.append(clamp(interval) / 2)
+        model_delays.append(clamp(drop_windows.get_interval(interval, drop_timestamp)) / 2)
+
+    drop_windows = DropWindows.fit(drop_timestamps, smoothing)
+
+    polls_per_week = {
+        "fixed": HOURS_PER_WEEK * SECONDS_PER_HOUR / clamp(interval),
+        "model": sum(
+            SECONDS_PER_HOUR / clamp(interval / weight)
+            for weight in drop_windows.weights
+        )
+    }
+
+    return {
+        name: {
+            "drops": len(delays),
+            "delay_mean": statistics.fmean(delays),
+            "delay_p50": statistics.median(delays),
+            "delay_p90": statistics.quantiles(delays, n=10)[-1] if len(delays) > 1 else delays[0],
+            "delay_max": max(delays),
+            "polls_per_week": polls_per_week[name]
+        }
+        for name, delays in (("fixed", fixed_delays), ("model", model_delays))
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    from star_gifts_data import StarGiftsData
+
+    import config
+
+    if len(sys.argv) > 2:
+        print(f"Usage: python {Path(__file__).name} [data file]")
+
+        sys.exit(1)
+
+    star_gifts_data = StarGiftsData.load(Path(sys.argv[1]) if len(sys.argv) == 2 else config.DATA_FILEPATH)
+
+    try:
+        results = evaluate(
+            timestamps = (
+                star_gift.first_appearance_timestamp
+                for star_gift in star_gifts_data.get_all()
+                if star_gift.first_appearance_timestamp
+            ),
+            interval = config.POLL_IDLE_INTERVAL,
+            floor = config.POLL_INTERVAL_FLOOR,
+            ceiling = config.POLL_INTERVAL_CEILING,
+            smoothing = config.POLL_DROP_WINDOWS_SMOOTHING
+        )
+
+    except ValueError as ex:
+        print(ex)
+
+        sys.exit(1)
+
+    print(f"Idle interval of {config.POLL_IDLE_INTERVAL:g}s, expected detection delay in seconds:")
+
+    for name, result in results.items():
+        print(f"    {name:<8}", "  ".join(
+            f"{key}={value:,.2f}" if isinstance(value, float) else f"{key}={value:,}"
+            for key, value in result.items()
+        ))
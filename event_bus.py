@@ -0,0 +1,179 @@
+"""
+In-process fan-out of gift change events to local subscribers, served as Server-Sent Events.
+
+Publishing never waits: every subscriber has a bounded buffer, and a subscriber which falls
+behind by more than its buffer loses the buffered events and gets a single `resync` event
+instead, after which it should re-read the catalog (e.g. `GET /gifts/changes?since=N`).
+"""
+
+from collections import deque
+from http import HTTPStatus
+
+import asyncio
+import time
+import typing
+
+from http_server import HTTPRequest, HTTPResponse, HANDLER_T
+
+import json_codec
+
+
+SSE_CONTENT_TYPE = "text/event-stream; charset=utf-8"
+SSE_KEEP_ALIVE_INTERVAL = 15.0
+RESYNC_EVENT_TYPE = "resync"
+
+
+class Event(typing.NamedTuple):
+    id: int
+    type: str
+    data: dict[str, typing.Any]
+    frame: bytes  # Encoded once and shared by all subscribers
+
+
+def encode_sse_frame(event_id: int | None, event_type: str, data: dict[str, typing.Any]) -> bytes:
+    return (
+        (f"id: {event_id}\n" if event_id is not None else "").encode()
+        + f"event: {event_type}\ndata: ".encode()
+        + json_codec.dumps(data)
+        + b"\n\n"
+    )
+
+
+class Subscription:
+    __slots__ = ("buffer", "buffer_size", "needs_resync", "wakeup")
+
+    def __init__(self, buffer_size: int) -> None:
+        self.buffer: deque[Event] = deque()
+        self.buffer_size = buffer_size
+        self.needs_resync = False
+        self.wakeup = asyncio.Event()
+
+    def push(self, event: Event) -> None:
+        if self.needs_resync:
+            return
+
+        if len(self.buffer) >= self.buffer_size:
+            self.buffer.clear()
+            self.needs_resync = True
+
+        else:
+            self.buffer.append(event)
+
+        self.wakeup.set()
+
+    async def get(self) -> Event | None:
+        """
+        Next event, `None` if events were dropped and the subscriber has to resync.
+        """
+
+        while not self.buffer and not self.needs_resync:
+            self.wakeup.clear()
+
+            await self.wakeup.wait()
+
+        if self.needs_resync:
+            self.needs_resync = False
+
+            return None
+
+        return self.buffer.popleft()
+
+
+class EventBus:
+    def __init__(self, buffer_size: int=256, history_size: int=1024) -> None:
+        self.buffer_size = buffer_size
+
+        self.last_event_id = 0
+        self.history: deque[Event] = deque(maxlen=history_size)  # For reconnects with `Last-Event-ID`
+        self.subscriptions: set[Subscription] = set()
+
+    def publish(self, event_type: str, data: dict[str, typing.Any]) -> Event:
+        self.last_event_id += 1
+
+        data = data | {"timestamp": time.time()}
+
+        event = Event(
+            id = self.last_event_id,
+            type = event_type,
+            data = data,
+            frame = encode_sse_frame(self.last_event_id, event_type, data)
+        )
+
+        self.history.append(event)
+
+        for subscription in self.subscriptions:
+            subscription.push(event)
+
+        return event
+
+    def subscribe(self, last_event_id: int | None = None) -> Subscription:
+        """
+        With `last_event_id`, the events published after it are replayed first,
+        or a resync is requested if they aren't in the history anymore.
+        """
+
+        subscription = Subscription(self.buffer_size)
+
+        if last_event_id is not None and last_event_id < self.last_event_id:
+            if not self.history or self.history[0].id > last_event_id + 1:
+                subscription.needs_resync = True
+
+            else:
+                for event in self.history:
+                    if event.id > last_event_id:
+                        subscription.push(event)
+
+        self.subscriptions.add(subscription)
+
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self.subscriptions.discard(subscription)
+
+
+def create_sse_handler(event_bus: EventBus, get_resync_data: typing.Callable[[], dict[str, typing.Any]] | None = None) -> HANDLER_T:
+    """
+    `get_resync_data` fills the `resync` event, e.g. with the catalog version to resync from.
+    """
+
+    async def sse_handler(request: HTTPRequest) -> HTTPResponse:
+        try:
+            last_event_id = int(request.headers["last-event-id"]) if "last-event-id" in request.headers else None
+
+        except ValueError:
+            last_event_id = None
+
+        async def stream() -> typing.AsyncIterator[bytes]:
+            # Subscribed once the body is streamed, a stream which never starts (HEAD, a client gone
+            # while the headers are written) doesn't run `finally` and would stay subscribed
+            subscription = event_bus.subscribe(last_event_id)
+
+            try:
+                yield b"retry: 1000\n\n"
+
+                while True:
+                    try:
+                        event = await asyncio.wait_for(subscription.get(), SSE_KEEP_ALIVE_INTERVAL)
+
+                    except asyncio.TimeoutError:
+                        yield b": keep-alive\n\n"
+
+                        continue
+
+                    if event is None:
+                        yield encode_sse_frame(event_bus.last_event_id, RESYNC_EVENT_TYPE, get_resync_data() if get_resync_data else {})
+
+                    else:
+                        yield event.frame
+
+            finally:
+                event_bus.unsubscribe(subscription)
+
+        return HTTPResponse(
+            status = HTTPStatus.OK,
+            body = stream(),
+            content_type = SSE_CONTENT_TYPE,
+            headers = {"Cache-Control": "no-cache"}
+        )
+
+    return sse_handler
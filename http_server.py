@@ -0,0 +1,290 @@
+from urllib.parse import urlsplit, parse_qsl, unquote
+from http import HTTPStatus
+from logging import Logger
+
+import asyncio
+import typing
+
+import constants
+
+
+MAX_HEADERS_SIZE = 64 * 1024  # 64 KB
+MAX_BODY_SIZE = 1024 * 1024  # 1 MB
+KEEP_ALIVE_TIMEOUT = 15.0
+
+
+class HTTPRequest:
+    __slots__ = ("method", "path", "query", "headers", "body", "path_params")
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        query: dict[str, str],
+        headers: dict[str, str],
+        body: bytes
+    ) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers  # lowercase names
+        self.body = body
+        self.path_params: dict[str, str] = {}
+
+
+class HTTPResponse:
+    """
+    `body` is either the whole response or an async iterator of chunks, which is streamed
+    until exhausted and closes the connection afterwards.
+    """
+
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(
+        self,
+        status: int = HTTPStatus.OK,
+        body: bytes | typing.AsyncIterator[bytes] = b"",
+        content_type: str | None = "text/plain; charset=utf-8",
+        headers: dict[str, str] | None = None
+    ) -> None:
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+        if content_type:
+            self.headers.setdefault("Content-Type", content_type)
+
+
+HANDLER_T = typing.Callable[[HTTPRequest], typing.Awaitable[HTTPResponse]]
+
+
+class HTTPServer:
+    """
+    Minimal asyncio HTTP/1.1 server for local endpoints, with keep-alive and streamed responses.
+
+    Routes are matched by method and path, where `{name}` segments are passed in `HTTPRequest.path_params`.
+    """
+
+    def __init__(self, host: str, port: int, logger: Logger) -> None:
+        self.host = host
+        self.port = port
+        self.logger = logger
+
+        self._routes: list[tuple[str, tuple[str, ...], HANDLER_T]] = []
+        self._server: asyncio.Server | None = None
+
+    def add_route(self, method: str, path: str, handler: HANDLER_T) -> None:
+        self._routes.append((
+            method.upper(),
+            tuple(path.strip("/").split("/")),
+            handler
+        ))
+
+    def route(self, method: str, path: str) -> typing.Callable[[HANDLER_T], HANDLER_T]:
+        def decorator(handler: HANDLER_T) -> HANDLER_T:
+            self.add_route(method, path, handler)
+
+            return handler
+
+        return decorator
+
+    def _match(self, request: HTTPRequest) -> HANDLER_T | None:
+        path_parts = tuple(request.path.strip("/").split("/"))
+        path_matched = False
+
+        for method, route_parts, handler in self._routes:
+            if len(route_parts) != len(path_parts):
+                continue
+
+            path_params: dict[str, str] = {}
+
+            for route_part, path_part in zip(route_parts, path_parts):
+                if route_part.startswith("{") and route_part.endswith("}"):
+                    path_params[route_part[1:-1]] = unquote(path_part)
+
+                elif route_part != path_part:
+                    break
+
+            else:
+                path_matched = True
+
+                if method == request.method or (method == "GET" and request.method == "HEAD"):
+                    request.path_params = path_params
+
+                    return handler
+
+        if path_matched:
+            return _method_not_allowed
+
+        return None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            host = self.host,
+            port = self.port,
+            limit = MAX_HEADERS_SIZE
+        )
+
+        self.logger.info(f"HTTP server is listening on {self.host}:{self.port}")
+
+    async def serve_forever(self) -> None:
+        if not self._server:
+            await self.start()
+
+        async with typing.cast(asyncio.Server, self._server) as server:
+            await server.serve_forever()
+
+    async def stop(self) -> None:
+        if self._server:
+            self._server.close()
+
+            await self._server.wait_closed()
+
+            self._server = None
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> HTTPRequest | None:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+
+        except asyncio.LimitOverrunError:
+            raise ValueError("Request headers are too large")
+
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        method, target, _ = request_line.split(" ", 2)
+
+        headers: dict[str, str] = {}
+
+        for header_line in header_lines:
+            if not header_line:
+                continue
+
+            name, _, value = header_line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        content_length = int(headers.get("content-length", 0))
+
+        if content_length > MAX_BODY_SIZE:
+            raise ValueError("Request body is too large")
+
+        body = await reader.readexactly(content_length) if content_length else b""
+
+        url = urlsplit(target)
+
+        return HTTPRequest(
+            method = method.upper(),
+            path = unquote(url.path),
+            query = dict(parse_qsl(url.query)),
+            headers = headers,
+            body = body
+        )
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+
+                except ValueError as ex:
+                    await self._write_response(writer, HTTPResponse(HTTPStatus.BAD_REQUEST, str(ex).encode(constants.ENCODING)), False, False)
+
+                    return
+
+                if request is None:
+                    return
+
+                handler = self._match(request) or _not_found
+
+                try:
+                    response = await handler(request)
+
+                except Exception as ex:
+                    self.logger.exception(f"Error handling {request.method} {request.path}", exc_info=ex)
+
+                    response = HTTPResponse(HTTPStatus.INTERNAL_SERVER_ERROR, b"Internal Server Error")
+
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+
+                if not await self._write_response(writer, response, keep_alive, request.method == "HEAD"):
+                    return
+
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+        finally:
+            writer.close()
+
+    async def _write_response(self, writer: asyncio.StreamWriter, response: HTTPResponse, keep_alive: bool, head_only: bool) -> bool:
+        """
+        Returns whether the connection can be reused.
+        """
+
+        is_streamed = not isinstance(response.body, bytes)
+
+        if is_streamed:
+            keep_alive = False
+
+        headers = response.headers | {
+            "Connection": "keep-alive" if keep_alive else "close"
+        }
+
+        if not is_streamed:
+            headers["Content-Length"] = str(len(typing.cast(bytes, response.body)))
+
+        status = HTTPStatus(response.status)
+
+        writer.write(
+            (
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                + "".join(
+                    f"{name}: {value}\r\n"
+                    for name, value in headers.items()
+                )
+                + "\r\n"
+            ).encode("latin-1")
+        )
+
+        if head_only:
+            if is_streamed:
+                aclose = getattr(response.body, "aclose", None)
+
+                if aclose:
+                    await aclose()
+
+            await writer.drain()
+
+            return keep_alive
+
+        if is_streamed:
+            body = typing.cast(typing.AsyncIterator[bytes], response.body)
+
+            try:
+                async for chunk in body:
+                    writer.write(chunk)
+
+                    await writer.drain()
+
+            finally:
+                aclose = getattr(body, "aclose", None)
+
+                if aclose:
+                    await aclose()
+
+            return False
+
+        writer.write(typing.cast(bytes, response.body))
+
+        await writer.drain()
+
+        return keep_alive
+
+
+async def _not_found(request: HTTPRequest) -> HTTPResponse:
+    return HTTPResponse(HTTPStatus.NOT_FOUND, b"Not Found")
+
+
+async def _method_not_allowed(request: HTTPRequest) -> HTTPResponse:
+    return HTTPResponse(HTTPStatus.METHOD_NOT_ALLOWED, b"Method Not Allowed")
@@ -0,0 +1,41 @@
+"""
+JSON encoding and decoding shared by the gifts data store, the Bot API client and the local HTTP APIs.
+
+Backed by orjson when it is installed and by the standard library otherwise. Output is compact
+UTF-8 bytes, indented only with `pretty`.
+"""
+
+import json
+import typing
+
+
+try:
+    import orjson
+
+except ImportError:
+    orjson = None
+
+
+JSON_CONTENT_TYPE = "application/json"
+JSON_HEADERS = {"Content-Type": JSON_CONTENT_TYPE}
+
+_STDLIB_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_STDLIB_PRETTY_ENCODER = json.JSONEncoder(ensure_ascii=False, indent=2)
+
+
+def get_backend() -> str:
+    return "orjson" if orjson else "json"
+
+
+def dumps(obj: typing.Any, pretty: bool=False) -> bytes:
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0))
+
+    return (_STDLIB_PRETTY_ENCODER if pretty else _STDLIB_ENCODER).encode(obj).encode()
+
+
+def loads(data: bytes | str) -> typing.Any:
+    if orjson:
+        return orjson.loads(data)
+
+    return json.loads(data)
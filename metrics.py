@@ -0,0 +1,367 @@
+from bisect import bisect_left
+from http import HTTPStatus
+from logging import Logger
+
+import abc
+import math
+import typing
+
+from http_server import HTTPServer, HTTPRequest, HTTPResponse
+
+import constants
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def get_log_linear_buckets(lowest: float, highest: float, sub_buckets: int) -> tuple[float, ...]:
+    """
+    HDR-style bucket boundaries: every power of two in `[lowest, highest]` is split into
+    `sub_buckets` linear steps, so the relative error stays the same across the whole range.
+    """
+
+    boundaries: list[float] = []
+    octave = 2.0 ** math.floor(math.log2(lowest))
+
+    while octave < highest:
+        for i in range(sub_buckets):
+            boundary = octave * (1 + i / sub_buckets)
+
+            if lowest <= boundary <= highest:
+                boundaries.append(boundary)
+
+        octave *= 2
+
+    return tuple(boundaries)
+
+
+LATENCY_BUCKETS = get_log_linear_buckets(0.0005, 1024.0, 4)  # 0.5 ms ... 17 minutes, 25% steps
+SIZE_BUCKETS = get_log_linear_buckets(1024, 256 * 1024 * 1024, 2)  # 1 KB ... 256 MB
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+
+    if value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], extra: str=constants.NULL_STR) -> str:
+    labels = [
+        f'{name}="{value}"'
+        for name, value in zip(label_names, label_values)
+    ]
+
+    if extra:
+        labels.append(extra)
+
+    if not labels:
+        return constants.NULL_STR
+
+    return "{" + ",".join(labels) + "}"
+
+
+class CounterValue:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float=1.0) -> None:
+        self.value += amount
+
+
+class GaugeValue:
+    __slots__ = ("value", "function")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self.function: typing.Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float=1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float=1.0) -> None:
+        self.value -= amount
+
+    def set_function(self, function: typing.Callable[[], float]) -> None:
+        """
+        The gauge is read from `function` on every scrape instead of being updated in place.
+        """
+
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function else self.value
+
+
+class HistogramValue:
+    __slots__ = ("boundaries", "counts", "sum", "count")
+
+    def __init__(self, boundaries: tuple[float, ...]) -> None:
+        self.boundaries = boundaries
+        self.counts = [0] * (len(boundaries) + 1)  # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.boundaries, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_quantile(self, quantile: float) -> float:
+        """
+        Upper bound of the bucket holding the quantile.
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = quantile * self.count
+        cumulative_count = 0
+
+        for boundary, count in zip(self.boundaries, self.counts):
+            cumulative_count += count
+
+            if cumulative_count >= rank:
+                return boundary
+
+        return math.inf
+
+
+VALUE_T = typing.TypeVar("VALUE_T", CounterValue, GaugeValue, HistogramValue)
+
+
+class Metric(abc.ABC, typing.Generic[VALUE_T]):
+    type_name: str
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...]=()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+
+        self._values: dict[tuple[str, ...], VALUE_T] = {}
+
+    @abc.abstractmethod
+    def _create_value(self) -> VALUE_T: ...
+
+    def labels(self, *label_values: typing.Any) -> VALUE_T:
+        key = tuple(map(str, label_values))
+        value = self._values.get(key)
+
+        if value is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {key}")
+
+            value = self._values[key] = self._create_value()
+
+        return value
+
+    @abc.abstractmethod
+    def _render_samples(self, label_values: tuple[str, ...], value: VALUE_T) -> typing.Iterator[str]: ...
+
+    def render(self) -> typing.Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type_name}"
+
+        for label_values, value in list(self._values.items()):
+            yield from self._render_samples(label_values, value)
+
+
+class Counter(Metric[CounterValue]):
+    type_name = "counter"
+
+    def _create_value(self) -> CounterValue:
+        return CounterValue()
+
+    def inc(self, amount: float=1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_samples(self, label_values: tuple[str, ...], value: CounterValue) -> typing.Iterator[str]:
+        yield f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value.value)}"
+
+
+class Gauge(Metric[GaugeValue]):
+    type_name = "gauge"
+
+    def _create_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: typing.Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+    def _render_samples(self, label_values: tuple[str, ...], value: GaugeValue) -> typing.Iterator[str]:
+        yield f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(float(value.get()))}"
+
+
+class Histogram(Metric[HistogramValue]):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...]=(), boundaries: tuple[float, ...]=LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, label_names)
+
+        self.boundaries = boundaries
+
+    def _create_value(self) -> HistogramValue:
+        return HistogramValue(self.boundaries)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_samples(self, label_values: tuple[str, ...], value: HistogramValue) -> typing.Iterator[str]:
+        cumulative_count = 0
+
+        for boundary, count in zip((*value.boundaries, math.inf), value.counts):
+            cumulative_count += count
+
+            yield f"""{self.name}_bucket{_format_labels(self.label_names, label_values, f'le="{_format_value(boundary)}"')} {cumulative_count}"""
+
+        yield f"{self.name}_sum{_format_labels(self.label_names, label_values)} {_format_value(value.sum)}"
+        yield f"{self.name}_count{_format_labels(self.label_names, label_values)} {value.count}"
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric[typing.Any]] = []
+
+    def register(self, metric: Metric[VALUE_T]) -> Metric[VALUE_T]:
+        self.metrics.append(metric)
+
+        return metric
+
+    def render(self) -> bytes:
+        return (
+            "\n".join(
+                line
+                for metric in self.metrics
+                for line in metric.render()
+            )
+            + "\n"
+        ).encode(constants.ENCODING)
+
+
+REGISTRY = MetricsRegistry()
+
+METRIC_T = typing.TypeVar("METRIC_T", bound=Metric[typing.Any])
+
+def _register(metric: METRIC_T) -> METRIC_T:
+    REGISTRY.register(metric)
+
+    return metric
+
+
+POLLS = _register(Counter(
+    "gifts_detector_polls_total",
+    "getStarGifts calls by result",
+    ("result",)  # modified, not_modified, flood_wait, error
+))
+POLL_DURATION = _register(Histogram(
+    "gifts_detector_poll_duration_seconds",
+    "Duration of getStarGifts calls"
+))
+POLL_INTERVAL = _register(Gauge(
+    "gifts_detector_poll_interval_seconds",
+    "Current delay between getStarGifts calls"
+))
+NEW_GIFTS = _register(Counter(
+    "gifts_detector_new_gifts_total",
+    "New gifts found in the catalog"
+))
+DETECTION_TO_POST = _register(Histogram(
+    "gifts_detector_detection_to_post_seconds",
+    "Time from receiving a new gift in getStarGifts to posting its notification"
+))
+PROCESS_NEW_GIFT_DURATION = _register(Histogram(
+    "gifts_detector_process_new_gift_duration_seconds",
+    "Duration of posting a new gift's sticker and notification"
+))
+UPDATE_QUEUE_DEPTH = _register(Gauge(
+    "gifts_detector_update_queue_depth",
+    "Availability updates waiting in update_gifts_queue"
+))
+EDITS = _register(Counter(
+    "gifts_detector_edits_total",
+    "Availability edits by result",
+    ("result",)  # sent, not_modified, deferred, error
+))
+EDIT_DURATION = _register(Histogram(
+    "gifts_detector_edit_duration_seconds",
+    "Duration of processing an availability edit"
+))
+BOT_API_REQUESTS = _register(Counter(
+    "gifts_detector_bot_api_requests_total",
+    "Bot API requests by bot, method and result",
+    ("bot_id", "method", "result")  # ok, error, timeout, exception
+))
+BOT_API_LATENCY = _register(Histogram(
+    "gifts_detector_bot_api_latency_seconds",
+    "Bot API request latency by bot and method",
+    ("bot_id", "method")
+))
+STICKER_DOWNLOAD_DURATION = _register(Histogram(
+    "gifts_detector_sticker_download_duration_seconds",
+    "Duration of downloading a single document by DC",
+    ("dc_id",)
+))
+STICKER_DOWNLOAD_SIZE = _register(Histogram(
+    "gifts_detector_sticker_download_size_bytes",
+    "Size of downloaded documents",
+    boundaries = SIZE_BUCKETS
+))
+SAVE_DURATION = _register(Histogram(
+    "gifts_detector_save_duration_seconds",
+    "Duration of saving the gifts data file"
+))
+SAVE_SIZE = _register(Gauge(
+    "gifts_detector_save_size_bytes",
+    "Size of the last saved gifts data file"
+))
+STORED_GIFTS = _register(Gauge(
+    "gifts_detector_stored_gifts",
+    "Stored gifts by tier",
+    ("tier",)  # hot, archived
+))
+SUBSCRIPTIONS = _register(Gauge(
+    "gifts_detector_subscriptions",
+    "Chats subscribed to filtered new gift alerts"
+))
+SUBSCRIPTION_QUEUE_DEPTH = _register(Gauge(
+    "gifts_detector_subscription_queue_depth",
+    "Subscription messages waiting to be sent"
+))
+SUBSCRIPTION_DELIVERIES = _register(Counter(
+    "gifts_detector_subscription_deliveries_total",
+    "Subscription messages by result",
+    ("result",)  # sent, error, dropped
+))
+
+
+def get_bot_id(bot_token: str) -> str:
+    return bot_token.split(":", 1)[0]
+
+
+def create_metrics_server(host: str, port: int, logger: Logger) -> HTTPServer:
+    server = HTTPServer(
+        host = host,
+        port = port,
+        logger = logger
+    )
+
+    @server.route("GET", "/metrics")
+    async def metrics_handler(request: HTTPRequest) -> HTTPResponse:  # pyright: ignore[reportUnusedFunction]
+        return HTTPResponse(
+            status = HTTPStatus.OK,
+            body = REGISTRY.render(),
+            content_type = PROMETHEUS_CONTENT_TYPE
+        )
+
+    return server
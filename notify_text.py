@@ -0,0 +1,337 @@
+from string import Formatter
+from datetime import tzinfo
+from hashlib import blake2b
+
+import html
+import math
+import typing
+
+from star_gifts_data import StarGiftData
+from upgrade_previews import UpgradePreview, UpgradePreviewAttribute
+
+import utils
+import constants
+import config
+
+
+DYNAMIC_FIELDS = frozenset((
+    "available_amount",
+    "sell_out_eta"
+))
+
+_FORMATTER = Formatter()
+
+
+def _get_static_key(star_gift: StarGiftData) -> tuple[typing.Any, ...]:
+    return (
+        star_gift.number,
+        star_gift.is_limited,
+        star_gift.total_amount,
+        star_gift.price,
+        star_gift.convert_price,
+        star_gift.require_premium,
+        star_gift.user_limited,
+        star_gift.first_appearance_timestamp,
+        star_gift.last_sale_timestamp
+    )
+
+
+def _get_static_fields(star_gift: StarGiftData) -> dict[str, typing.Any]:
+    is_limited = star_gift.is_limited
+
+    return dict(
+        title = config.NOTIFY_TEXT_TITLES[is_limited],
+        number = star_gift.number,
+        id = star_gift.id,
+        total_amount = (
+            config.NOTIFY_TEXT_TOTAL_AMOUNT.format(
+                total_amount = utils.pretty_int(star_gift.total_amount)
+            )
+            if is_limited else
+            constants.NULL_STR
+        ),
+        sold_out = (
+            config.NOTIFY_TEXT_SOLD_OUT.format(
+                sold_out = utils.format_seconds_to_human_readable(star_gift.last_sale_timestamp - star_gift.first_appearance_timestamp)
+            )
+            if star_gift.last_sale_timestamp and star_gift.first_appearance_timestamp else
+            constants.NULL_STR
+        ),
+        price = utils.pretty_int(star_gift.price),
+        convert_price = utils.pretty_int(star_gift.convert_price),
+        require_premium_or_user_limited = (
+            config.NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED.format(
+                emoji = config.NOTIFY_TEXT_REQUIRE_PREMIUM_OR_USER_LIMITED_EMOJI,
+                require_premium = (
+                    config.NOTIFY_TEXT_REQUIRE_PREMIUM
+                    if star_gift.require_premium else
+                    constants.NULL_STR
+                ),
+                user_limited = (
+                    config.NOTIFY_TEXT_USER_LIMITED.format(
+                        user_limited = utils.pretty_int(star_gift.user_limited)
+                    )
+                    if star_gift.user_limited is not None else
+                    constants.NULL_STR
+                ),
+                separator = (
+                    config.NOTIFY_TEXT_REQUIRE_PREMIUM_AND_USER_LIMITED_SEPARATOR
+                    if star_gift.require_premium and star_gift.user_limited is not None else
+                    constants.NULL_STR
+                )
+            )
+            if star_gift.require_premium or star_gift.user_limited is not None else
+            constants.NULL_STR
+        )
+    )
+
+
+def _get_available_percentage(available_amount: int, total_amount: int) -> tuple[str, bool]:
+    return utils.pretty_float(
+        math.ceil(available_amount / total_amount * 100 * 100) / 100,
+        get_is_same = True
+    )
+
+
+def _get_available_amount_field(
+    star_gift: StarGiftData,
+    available_percentage: tuple[str, bool],
+    updated_datetime: str
+) -> str:
+    if not star_gift.is_limited:
+        return constants.NULL_STR
+
+    available_percentage_str, available_percentage_is_same = available_percentage
+
+    return config.NOTIFY_TEXT_AVAILABLE_AMOUNT.format(
+        available_amount = utils.pretty_int(star_gift.available_amount),
+        same_str = (
+            constants.NULL_STR
+            if available_percentage_is_same else
+            "~"
+        ),
+        available_percentage = available_percentage_str,
+        updated_datetime = updated_datetime
+    )
+
+
+def _get_sell_out_eta_field(star_gift: StarGiftData, sell_out_eta: float | None) -> str:
+    if sell_out_eta is None or not star_gift.is_limited or star_gift.available_amount <= 0:
+        return constants.NULL_STR
+
+    # Minutes are enough precision for long ETAs and keep the text from changing on every edit
+    rounding = 60 if sell_out_eta >= 600 else 1
+
+    return config.NOTIFY_TEXT_SELL_OUT_ETA.format(
+        sell_out_eta = utils.format_seconds_to_human_readable(round(sell_out_eta / rounding) * rounding)
+    )
+
+
+def render_notify_text(star_gift: StarGiftData, timezone: tzinfo, sell_out_eta: float | None = None) -> str:
+    """
+    Renders `config.NOTIFY_TEXT` from scratch, without any caching.
+    """
+
+    available_percentage = (
+        _get_available_percentage(star_gift.available_amount, star_gift.total_amount)
+        if star_gift.is_limited and star_gift.total_amount > 0 else
+        (constants.NULL_STR, False)
+    )
+
+    return config.NOTIFY_TEXT.format(
+        available_amount = _get_available_amount_field(
+            star_gift = star_gift,
+            available_percentage = available_percentage,
+            updated_datetime = utils.get_current_datetime(timezone)
+        ),
+        sell_out_eta = _get_sell_out_eta_field(star_gift, sell_out_eta),
+        **_get_static_fields(star_gift)
+    )
+
+
+class CompiledNotifyText:
+    """
+    `config.NOTIFY_TEXT` for a single gift with every static field pre-rendered.
+
+    `chunks` alternates between literal text (even indexes) and names of dynamic fields (odd indexes).
+    """
+
+    __slots__ = ("static_key", "chunks", "last_available_key", "last_available_percentage")
+
+    def __init__(self, star_gift: StarGiftData, template: str) -> None:
+        self.static_key = _get_static_key(star_gift)
+        self.last_available_key: tuple[int, int] | None = None
+        self.last_available_percentage: tuple[str, bool] = (constants.NULL_STR, False)
+
+        static_fields = _get_static_fields(star_gift)
+
+        chunks: list[str] = []
+        literal_parts: list[str] = []
+
+        for literal_text, field_name, format_spec, conversion in _FORMATTER.parse(template):
+            literal_parts.append(literal_text)
+
+            if field_name is None:
+                continue
+
+            if field_name in DYNAMIC_FIELDS:
+                chunks.append(constants.NULL_STR.join(literal_parts))
+                chunks.append(field_name)
+
+                literal_parts = []
+
+                continue
+
+            value = _FORMATTER.convert_field(static_fields[field_name], conversion)
+
+            literal_parts.append(_FORMATTER.format_field(value, format_spec or constants.NULL_STR))
+
+        chunks.append(constants.NULL_STR.join(literal_parts))
+
+        self.chunks = chunks
+
+    def get_available_percentage(self, star_gift: StarGiftData) -> tuple[str, bool]:
+        if not star_gift.is_limited or star_gift.total_amount <= 0:
+            return (constants.NULL_STR, False)
+
+        available_key = (star_gift.available_amount, star_gift.total_amount)
+
+        if available_key != self.last_available_key:
+            self.last_available_percentage = _get_available_percentage(*available_key)
+            self.last_available_key = available_key
+
+        return self.last_available_percentage
+
+    def render(self, dynamic_fields: dict[str, str]) -> str:
+        chunks = self.chunks[:]
+
+        for i in range(1, len(chunks), 2):
+            chunks[i] = dynamic_fields[chunks[i]]
+
+        return constants.NULL_STR.join(chunks)
+
+
+class NotifyTextRenderer:
+    """
+    Renders `config.NOTIFY_TEXT` through per-gift compiled templates.
+
+    Only the dynamic fields are formatted on every call, everything else is reused
+    until one of the gift's static fields changes.
+    """
+
+    def __init__(self, timezone: tzinfo) -> None:
+        self.timezone = timezone
+
+        self._compiled: dict[int, CompiledNotifyText] = {}
+        self._datetime_timestamp: int | None = None
+        self._datetime_str = constants.NULL_STR
+
+    def get_current_datetime(self) -> str:
+        current_timestamp = utils.get_current_timestamp()
+
+        if current_timestamp != self._datetime_timestamp:
+            self._datetime_str = utils.get_current_datetime(self.timezone)
+            self._datetime_timestamp = current_timestamp
+
+        return self._datetime_str
+
+    def compile(self, star_gift: StarGiftData) -> CompiledNotifyText:
+        compiled = self._compiled.get(star_gift.id)
+
+        if compiled is None or compiled.static_key != _get_static_key(star_gift):
+            compiled = self._compiled[star_gift.id] = CompiledNotifyText(star_gift, config.NOTIFY_TEXT)
+
+        return compiled
+
+    def forget(self, star_gift_id: int) -> None:
+        self._compiled.pop(star_gift_id, None)
+
+    def render(self, star_gift: StarGiftData, sell_out_eta: float | None = None) -> str:
+        compiled = self.compile(star_gift)
+
+        return compiled.render({
+            "available_amount": _get_available_amount_field(
+                star_gift = star_gift,
+                available_percentage = compiled.get_available_percentage(star_gift),
+                updated_datetime = self.get_current_datetime()
+            ),
+            "sell_out_eta": _get_sell_out_eta_field(star_gift, sell_out_eta)
+        })
+
+    def render_with_fingerprint(self, star_gift: StarGiftData, sell_out_eta: float | None = None) -> tuple[str, str]:
+        """
+        Returns the text and a hash of its visible content, which ignores the update time. The hash
+        changes with every sale, edits of small ones are deferred by `NOTIFY_EDIT_MIN_CHANGE_PERCENTAGE`.
+        """
+
+        compiled = self.compile(star_gift)
+        available_percentage = compiled.get_available_percentage(star_gift)
+        sell_out_eta_field = _get_sell_out_eta_field(star_gift, sell_out_eta)
+
+        text = compiled.render({
+            "available_amount": _get_available_amount_field(
+                star_gift = star_gift,
+                available_percentage = available_percentage,
+                updated_datetime = self.get_current_datetime()
+            ),
+            "sell_out_eta": sell_out_eta_field
+        })
+
+        content = compiled.render({
+            "available_amount": _get_available_amount_field(
+                star_gift = star_gift,
+                available_percentage = available_percentage,
+                updated_datetime = constants.NULL_STR
+            ),
+            "sell_out_eta": sell_out_eta_field
+        })
+
+        return (
+            text,
+            blake2b(content.encode(constants.ENCODING), digest_size=8).hexdigest()
+        )
+
+
+def _get_upgrade_attributes_field(template: str, attributes: list[UpgradePreviewAttribute]) -> str:
+    if not attributes:
+        return constants.NULL_STR
+
+    rarest_attributes = sorted(attributes, key=lambda attribute: attribute.rarity_permille)[:config.NOTIFY_UPGRADES_TEXT_ATTRIBUTES_LIMIT]
+
+    names = ", ".join(
+        config.NOTIFY_UPGRADES_TEXT_ATTRIBUTE.format(
+            name = html.escape(attribute.name),
+            rarity = utils.format_float_positional(attribute.rarity_permille / 10)
+        )
+        for attribute in rarest_attributes
+    )
+
+    if len(attributes) > len(rarest_attributes):
+        names += config.NOTIFY_UPGRADES_TEXT_ATTRIBUTES_MORE.format(
+            amount = len(attributes) - len(rarest_attributes)
+        )
+
+    return template.format(
+        amount = len(attributes),
+        names = names
+    )
+
+
+def render_upgrades_text(star_gift: StarGiftData, preview: UpgradePreview | None) -> str:
+    """
+    Renders `config.NOTIFY_UPGRADES_TEXT`, the preview fields are empty without a preview.
+    """
+
+    return config.NOTIFY_UPGRADES_TEXT.format(
+        id = star_gift.id,
+        upgrade_price = (
+            config.NOTIFY_UPGRADES_TEXT_PRICE.format(
+                upgrade_price = utils.pretty_int(star_gift.upgrade_price)
+            )
+            if star_gift.upgrade_price is not None else
+            constants.NULL_STR
+        ),
+        models = _get_upgrade_attributes_field(config.NOTIFY_UPGRADES_TEXT_MODELS, preview.models if preview else []),
+        backdrops = _get_upgrade_attributes_field(config.NOTIFY_UPGRADES_TEXT_BACKDROPS, preview.backdrops if preview else []),
+        patterns = _get_upgrade_attributes_field(config.NOTIFY_UPGRADES_TEXT_PATTERNS, preview.patterns if preview else [])
+    )
@@ -2,33 +2,47 @@ from pyrogram import Client
 from pyrogram.raw.types.payments.star_gifts import StarGifts
 from pyrogram.raw.types.payments.star_gifts_not_modified import StarGiftsNotModified
 from pyrogram.raw.functions.payments.get_star_gifts import GetStarGifts
-from pyrogram.raw.functions.payments.get_star_gift_upgrade_preview import GetStarGiftUpgradePreview
 from pyrogram.raw.types.star_gift import StarGift
 from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
 from pyrogram.file_id import FileId, FileType
 
 import utils
+import time
 import typing
 
-from star_gifts_data import StarGiftData
+from star_gifts_data import StarGiftData, ARCHIVED_STATE_T
+
+
+if typing.TYPE_CHECKING:
+    from traffic_recorder import TrafficRecorder
 
 
 @typing.overload
 async def get_all_star_gifts(
     client: Client,
-    hash: typing.Literal[None] = ...
+    hash: typing.Literal[None] = ...,
+    recorder: "TrafficRecorder | None" = ...,
+    archived_star_gifts: dict[int, ARCHIVED_STATE_T] | None = ...
 ) -> tuple[int, dict[int, StarGiftData]]: ...
 
 @typing.overload
 async def get_all_star_gifts(
     client: Client,
-    hash: int
+    hash: int,
+    recorder: "TrafficRecorder | None" = ...,
+    archived_star_gifts: dict[int, ARCHIVED_STATE_T] | None = ...
 ) -> tuple[int, dict[int, StarGiftData] | None]: ...
 
 async def get_all_star_gifts(
     client: Client,
-    hash: int | None = None
+    hash: int | None = None,
+    recorder: "TrafficRecorder | None" = None,
+    archived_star_gifts: dict[int, ARCHIVED_STATE_T] | None = None
 ) -> tuple[int, dict[int, StarGiftData] | None]:
+    """
+    Gifts listed in `archived_star_gifts` are left out unless their catalog state changed.
+    """
+
     r = typing.cast(StarGifts | StarGiftsNotModified, await client.invoke(
         GetStarGifts(
             hash = hash or 0
@@ -41,6 +55,9 @@ async def get_all_star_gifts(
             None
         )
 
+    if recorder:
+        recorder.record(r, time.time())
+
     r_gifts = typing.cast(list[StarGift], r.gifts)
 
     all_star_gifts_dict: dict[int, StarGiftData] = {
@@ -70,30 +87,18 @@ async def get_all_star_gifts(
             user_limited = (star_gift_raw.per_user_total or 0) if star_gift_raw.limited_per_user else None,
             is_limited = star_gift_raw.limited or False,
             first_appearance_timestamp = star_gift_raw.first_sale_date or utils.get_current_timestamp(),
-            last_sale_timestamp = star_gift_raw.last_sale_date
+            last_sale_timestamp = star_gift_raw.last_sale_date,
+            upgrade_price = star_gift_raw.upgrade_stars
         )
         for number, star_gift_raw in enumerate(sorted(
             r_gifts,
             key = lambda sgr: sgr.id,
             reverse = False
         ), 1)
+        if archived_star_gifts is None or archived_star_gifts.get(star_gift_raw.id) != (star_gift_raw.availability_remains or 0, star_gift_raw.upgrade_stars)
     }
 
     return (
         r.hash,
         all_star_gifts_dict
     )
-
-
-async def check_is_star_gift_upgradable(app: Client, star_gift_id: int) -> bool:
-    try:
-        await app.invoke(
-            GetStarGiftUpgradePreview(
-                gift_id = star_gift_id
-            )
-        )
-
-    except Exception:
-        return False
-
-    return True
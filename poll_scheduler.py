@@ -0,0 +1,72 @@
+import time
+import typing
+
+
+if typing.TYPE_CHECKING:
+    from drop_windows import DropWindows
+
+
+BACKOFF_FACTOR = 2.0
+BACKOFF_RECOVERY = 0.9  # Per successful poll
+MAX_BACKOFF = 64.0
+
+
+class AdaptivePollScheduler:
+    """
+    Interval between `getStarGifts` polls.
+
+    Activity (a new gift or a limited gift selling) switches to `fast_interval`, which then
+    grows by `decay` on every quiet poll until it is back at `idle_interval`. FLOOD_WAIT errors
+    multiply the interval by a backoff, which recovers on every successful poll.
+    The resulting delay is always clamped to `[floor, ceiling]`.
+
+    With `drop_windows`, the idle interval is shorter near likely release times and longer elsewhere.
+    """
+
+    __slots__ = ("fast_interval", "idle_interval", "floor", "ceiling", "decay", "drop_windows", "interval", "backoff")
+
+    def __init__(
+        self,
+        fast_interval: float,
+        idle_interval: float,
+        floor: float,
+        ceiling: float,
+        decay: float = 1.5,
+        drop_windows: "DropWindows | None" = None
+    ) -> None:
+        if not 0 < floor <= ceiling:
+            raise ValueError(f"Invalid poll interval bounds: floor={floor}, ceiling={ceiling}")
+
+        if decay < 1:
+            raise ValueError(f"Poll interval decay must be at least 1, got {decay}")
+
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.floor = floor
+        self.ceiling = ceiling
+        self.decay = decay
+        self.drop_windows = drop_windows
+
+        self.interval = self.get_idle_interval()
+        self.backoff = 1.0
+
+    def on_poll(self, is_active: bool) -> None:
+        if is_active:
+            self.interval = self.fast_interval
+
+        else:
+            self.interval = min(self.interval * self.decay, self.get_idle_interval())
+
+        self.backoff = max(1.0, self.backoff * BACKOFF_RECOVERY)
+
+    def get_idle_interval(self) -> float:
+        if self.drop_windows is None:
+            return self.idle_interval
+
+        return self.drop_windows.get_interval(self.idle_interval, time.time())
+
+    def on_flood_wait(self) -> None:
+        self.backoff = min(self.backoff * BACKOFF_FACTOR, MAX_BACKOFF)
+
+    def get_delay(self) -> float:
+        return min(max(self.interval * self.backoff, self.floor), self.ceiling)
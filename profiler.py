@@ -0,0 +1,279 @@
+"""
+On-demand profiling of the running detector. A session profiles the event loop thread with
+`cProfile`, samples what every asyncio task is awaiting and collects the event loop's slow callback
+warnings over the same window. Nothing is installed between sessions, so there is no overhead
+while idle.
+"""
+
+from collections import Counter
+from pathlib import Path
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import time
+import types
+import typing
+
+import constants
+
+
+SLOW_CALLBACK_MESSAGE = "Executing %s took %.3f seconds"  # Logged by the event loop in debug mode
+AWAIT_CHAIN_LIMIT = 16
+SELECTOR_FUNCTIONS = frozenset((  # Where the event loop waits for I/O, named as `cProfile` names built-ins
+    "<method 'poll' of 'select.epoll' objects>",
+    "<method 'control' of 'select.kqueue' objects>",
+    "<method 'poll' of 'select.devpoll' objects>",
+    "<method 'poll' of 'select.poll' objects>",
+    "<built-in method select.select>",
+    "<built-in method _overlapped.GetQueuedCompletionStatus>"
+))
+
+TASK_STACK_T = tuple[str, ...]  # Await chain of a task, outermost coroutine first
+STATS_T = dict[tuple[str, int, str], tuple[int, int, float, float, typing.Any]]  # {(file, line, function): (primitive calls, calls, total time, cumulative time, callers)}
+
+
+class SlowCallback(typing.NamedTuple):
+    duration: float
+    handle: str  # With the place it was scheduled from, as debug mode records it
+
+
+class FunctionStats(typing.NamedTuple):
+    name: str  # "file:line(function)"
+    calls: int
+    total_time: float  # In the function itself
+    cumulative_time: float  # Including the functions it called
+
+
+class _SlowCallbacksHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__(logging.WARNING)
+
+        self.slow_callbacks: list[SlowCallback] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.msg == SLOW_CALLBACK_MESSAGE and isinstance(record.args, tuple) and len(record.args) == 2:
+            handle, duration = record.args
+
+            self.slow_callbacks.append(SlowCallback(float(typing.cast(float, duration)), str(handle)))
+
+
+def _is_selector_function(filename: str, lineno: int, function: str) -> bool:
+    return filename == "~" and function in SELECTOR_FUNCTIONS
+
+
+def _format_function(filename: str, lineno: int, function: str) -> str:
+    if filename == "~":  # Built-in functions
+        return function
+
+    return f"{os.path.basename(filename)}:{lineno}({function})"
+
+
+def get_await_chain(coro: typing.Any) -> TASK_STACK_T:
+    """
+    Where a suspended coroutine is, followed through the coroutines it awaits. `Task.get_stack`
+    only returns the outermost frame of a suspended task.
+    """
+
+    chain: list[str] = []
+
+    while coro is not None and len(chain) < AWAIT_CHAIN_LIMIT:
+        frame: types.FrameType | None = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "gi_frame", None)
+            or getattr(coro, "ag_frame", None)
+        )
+
+        if frame is None:  # A future or an exhausted coroutine
+            break
+
+        code = frame.f_code
+        chain.append(_format_function(code.co_filename, frame.f_lineno, code.co_name))
+
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None) or getattr(coro, "ag_await", None)
+
+    return tuple(chain)
+
+
+class ProfileReport(typing.NamedTuple):
+    duration: float
+    stats: pstats.Stats
+    slow_callbacks: list[SlowCallback]
+    task_stacks: Counter[TASK_STACK_T]  # Times each await chain was seen
+    samples: int
+    max_tasks: int
+
+    def get_idle_time(self) -> float:
+        """
+        Time the event loop spent waiting for I/O in its selector.
+        """
+
+        all_stats: STATS_T = getattr(self.stats, "stats")  # Not in the stubs
+
+        return sum(
+            total_time
+            for function, (_, _, total_time, _, _) in all_stats.items()
+            if _is_selector_function(*function)
+        )
+
+    def get_top_functions(self, limit: int) -> list[FunctionStats]:
+        """
+        Sorted by the time spent in the function itself, which, unlike the cumulative time, isn't
+        inflated by coroutines being suspended. The selector is left out, see `get_idle_time`.
+        """
+
+        all_stats: STATS_T = getattr(self.stats, "stats")  # Not in the stubs
+
+        top_stats = sorted((
+            item
+            for item in all_stats.items()
+            if not _is_selector_function(*item[0])
+        ), key=lambda item: item[1][2], reverse=True)[:limit]
+
+        return [
+            FunctionStats(
+                name = _format_function(*function),
+                calls = calls,
+                total_time = total_time,
+                cumulative_time = cumulative_time
+            )
+            for function, (_, calls, total_time, cumulative_time, _) in top_stats
+        ]
+
+    def format(self, limit: int=50) -> str:
+        stream = io.StringIO()
+
+        stream.write(
+            f"Profiled {self.duration:.1f} s of the event loop thread, {self.get_idle_time():.1f} s of it idle "
+            f"in the selector, {self.samples} task samples, up to {self.max_tasks} tasks.\n\n"
+        )
+
+        stats = pstats.Stats(stream=stream)
+        stats.add(self.stats)
+
+        for sort_key in (pstats.SortKey.TIME, pstats.SortKey.CUMULATIVE):
+            stats.sort_stats(sort_key).print_stats(limit)
+
+        stream.write(f"Slow callbacks: {len(self.slow_callbacks)}\n\n")
+
+        for slow_callback in sorted(self.slow_callbacks, reverse=True)[:limit]:
+            stream.write(f"{slow_callback.duration * 1000:10.1f} ms  {slow_callback.handle}\n")
+
+        stream.write(f"\nTask await chains, seen in {self.samples} samples:\n\n")
+
+        for task_stack, count in self.task_stacks.most_common(limit):
+            stream.write(f"{count:6}  " + "\n        > ".join(task_stack) + "\n")
+
+        return stream.getvalue()
+
+    def save(self, filepath: Path) -> tuple[Path, Path]:
+        """
+        Writes `<filepath>.pstats`, readable by `pstats` and its viewers, and the `<filepath>.txt`
+        report.
+        """
+
+        stats_filepath = filepath.with_name(filepath.name + ".pstats")
+        report_filepath = filepath.with_name(filepath.name + ".txt")
+
+        self.stats.dump_stats(stats_filepath)
+        report_filepath.write_text(self.format(), encoding=constants.ENCODING)
+
+        return stats_filepath, report_filepath
+
+
+class RuntimeProfiler:
+    """
+    Runs one profiling session at a time. `cProfile` only sees the event loop thread, work done in
+    `asyncio.to_thread` shows up as the awaiting coroutine.
+
+    Slow callbacks are reported by the event loop in debug mode, which also records where every
+    callback was scheduled from. That adds its own cost to the profile, `slow_callback_duration`
+    of `None` leaves debug mode off.
+    """
+
+    def __init__(self, tasks_interval: float, slow_callback_duration: float | None) -> None:
+        self.tasks_interval = tasks_interval
+        self.slow_callback_duration = slow_callback_duration
+
+        self._session: asyncio.Task[ProfileReport] | None = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._session is not None and not self._session.done()
+
+    def _sample_tasks(self, task_stacks: Counter[TASK_STACK_T]) -> int:
+        current_task = asyncio.current_task()
+        tasks = asyncio.all_tasks()
+
+        for task in tasks:
+            if task is not current_task:
+                task_stacks[get_await_chain(task.get_coro())] += 1
+
+        return len(tasks)
+
+    def start(self, duration: float) -> asyncio.Task[ProfileReport]:
+        """
+        Starts a session of `duration` seconds, which is running as soon as this returns.
+        """
+
+        if self.is_running:
+            raise RuntimeError("A profiling session is already running")
+
+        self._session = asyncio.create_task(self._run(duration))
+
+        return self._session
+
+    async def _run(self, duration: float) -> ProfileReport:
+        loop = asyncio.get_running_loop()
+        debug = loop.get_debug()
+        slow_callback_duration = loop.slow_callback_duration
+
+        slow_callbacks_handler = _SlowCallbacksHandler()
+        asyncio_logger = logging.getLogger("asyncio")
+
+        profile = cProfile.Profile()
+        task_stacks: Counter[TASK_STACK_T] = Counter()
+        samples = 0
+        max_tasks = 0
+
+        try:
+            if self.slow_callback_duration is not None:
+                asyncio_logger.addHandler(slow_callbacks_handler)
+
+                loop.slow_callback_duration = self.slow_callback_duration
+                loop.set_debug(True)
+
+            started_at = time.perf_counter()
+            deadline = loop.time() + duration
+
+            profile.enable()
+
+            try:
+                while (remaining := deadline - loop.time()) > 0:
+                    await asyncio.sleep(min(self.tasks_interval, remaining))
+
+                    max_tasks = max(max_tasks, self._sample_tasks(task_stacks))
+                    samples += 1
+
+            finally:
+                profile.disable()
+
+            profiled_duration = time.perf_counter() - started_at
+
+        finally:
+            loop.set_debug(debug)
+            loop.slow_callback_duration = slow_callback_duration
+
+            asyncio_logger.removeHandler(slow_callbacks_handler)
+
+        return ProfileReport(
+            duration = profiled_duration,
+            stats = pstats.Stats(profile),
+            slow_callbacks = slow_callbacks_handler.slow_callbacks,
+            task_stacks = task_stacks,
+            samples = samples,
+            max_tasks = max_tasks
+        )
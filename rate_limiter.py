@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Allows bursts of up to `capacity` acquisitions, refilled at `rate` per second.
+
+    Waiters are served in the order they called `acquire`, so sends paced by the same bucket
+    keep their order.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0 or capacity < 1:
+            raise ValueError(f"Invalid token bucket: rate={rate}, capacity={capacity}")
+
+        self.rate = rate
+        self.capacity = capacity
+
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: float=1.0) -> None:
+        async with self._lock:
+            self._refill()
+
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+                self._refill()
+
+            self.tokens -= tokens
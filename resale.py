@@ -0,0 +1,229 @@
+"""
+Tracking of the resale market of upgraded gifts through `GetResaleStarGifts`.
+
+Listings are requested sorted by price and kept per gift in a `FloorPriceIndex`. Between full
+scans only the first pages are requested: every listing cheaper than the last one on them has to
+be on them, so the cheap end of the index is diffed against them without a full rescan.
+"""
+
+from pyrogram import Client
+from pyrogram.errors import FloodWait
+from pyrogram.raw.functions.payments.get_resale_star_gifts import GetResaleStarGifts
+from pyrogram.raw.types.payments.resale_star_gifts import ResaleStarGifts
+from pyrogram.raw.types.star_gift_unique import StarGiftUnique
+from pyrogram.raw.types.stars_amount import StarsAmount
+from bisect import bisect_left, insort
+from logging import Logger
+
+import asyncio
+import typing
+
+
+class ResaleListing(typing.NamedTuple):
+    id: int  # Of the unique gift
+    num: int
+    slug: str
+    price: int  # In stars
+
+
+def parse_resale_listing(star_gift_raw: typing.Any) -> ResaleListing | None:
+    """
+    `None` for anything but a unique gift resold for stars.
+    """
+
+    if not isinstance(star_gift_raw, StarGiftUnique):
+        return None
+
+    price = next((
+        amount.amount
+        for amount in star_gift_raw.resell_amount or []
+        if isinstance(amount, StarsAmount)
+    ), None)
+
+    if price is None:
+        return None
+
+    return ResaleListing(
+        id = star_gift_raw.id,
+        num = star_gift_raw.num,
+        slug = star_gift_raw.slug,
+        price = price
+    )
+
+
+async def get_resale_listings_page(client: Client, star_gift_id: int, offset: str, limit: int) -> tuple[list[ResaleListing], str | None]:
+    """
+    Page of the listings sorted by price and the offset of the next page, `None` after the last one.
+    """
+
+    r = typing.cast(ResaleStarGifts, await client.invoke(
+        GetResaleStarGifts(
+            gift_id = star_gift_id,
+            offset = offset,
+            limit = limit,
+            sort_by_price = True
+        )
+    ))
+
+    return (
+        [
+            listing
+            for star_gift_raw in r.gifts
+            if (listing := parse_resale_listing(star_gift_raw))
+        ],
+        r.next_offset or None
+    )
+
+
+class FloorPriceIndex:
+    """
+    Listings of a single gift, ordered by `(price, id)` in a sorted list.
+    """
+
+    __slots__ = ("entries", "listings")
+
+    def __init__(self) -> None:
+        self.entries: list[tuple[int, int]] = []  # [(price, listing_id), ...]
+        self.listings: dict[int, ResaleListing] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get_floor(self) -> ResaleListing | None:
+        return self.listings[self.entries[0][1]] if self.entries else None
+
+    def upsert(self, listing: ResaleListing) -> None:
+        old_listing = self.listings.get(listing.id)
+
+        if old_listing is not None and old_listing.price != listing.price:
+            del self.entries[bisect_left(self.entries, (old_listing.price, listing.id))]
+
+        if old_listing is None or old_listing.price != listing.price:
+            insort(self.entries, (listing.price, listing.id))
+
+        self.listings[listing.id] = listing
+
+    def remove(self, listing_id: int) -> None:
+        listing = self.listings.pop(listing_id, None)
+
+        if listing is not None:
+            del self.entries[bisect_left(self.entries, (listing.price, listing_id))]
+
+    def apply_range(self, listings: list[ResaleListing], below_price: int | None) -> None:
+        """
+        `listings` are all the listings priced below `below_price`, or all of them if it's `None`.
+        Indexed listings in that range which are missing from them are sold or delisted.
+        """
+
+        end = len(self.entries) if below_price is None else bisect_left(self.entries, (below_price,))
+        listing_ids = {listing.id for listing in listings}
+
+        for _, listing_id in self.entries[:end]:
+            if listing_id not in listing_ids:
+                self.remove(listing_id)
+
+        for listing in listings:
+            self.upsert(listing)
+
+
+FLOOR_CHANGE_T = tuple[ResaleListing | None, ResaleListing | None]  # (old floor, new floor)
+
+
+class ResaleTracker:
+    """
+    Keeps a `FloorPriceIndex` per gift. Every gift is scanned in full once per `full_scan_interval`,
+    otherwise only its first `floor_pages` pages are requested. Pages of all gifts are requested
+    concurrently, at most `concurrency` at once.
+    """
+
+    def __init__(self, page_size: int=100, concurrency: int=4, floor_pages: int=1, full_scan_interval: float=600.0) -> None:
+        self.page_size = page_size
+        self.floor_pages = floor_pages
+        self.full_scan_interval = full_scan_interval
+
+        self.indexes: dict[int, FloorPriceIndex] = {}
+        self.full_scanned_at: dict[int, float] = {}
+        self.pages_count = 0
+
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def scan(self, client: Client, star_gift_id: int, now: float) -> FLOOR_CHANGE_T:
+        is_full = now - self.full_scanned_at.get(star_gift_id, -self.full_scan_interval) >= self.full_scan_interval
+
+        listings: list[ResaleListing] = []
+        offset: str | None = ""
+        pages_count = 0
+
+        while offset is not None and (is_full or pages_count < self.floor_pages):
+            async with self._semaphore:
+                page, offset = await get_resale_listings_page(client, star_gift_id, offset, self.page_size)
+
+            listings.extend(page)
+            pages_count += 1
+            self.pages_count += 1
+
+        index = self.indexes.setdefault(star_gift_id, FloorPriceIndex())
+        old_floor = index.get_floor()
+
+        if offset is None:
+            index.apply_range(listings, None)
+
+            self.full_scanned_at[star_gift_id] = now
+
+        else:
+            index.apply_range(listings, listings[-1].price if listings else 0)
+
+        return old_floor, index.get_floor()
+
+    async def scan_many(self, client: Client, star_gift_ids: list[int], now: float, logger: Logger) -> tuple[dict[int, FLOOR_CHANGE_T], int | None]:
+        """
+        Floors changed since the previous scan, gifts scanned for the first time aren't reported,
+        and the longest `FLOOD_WAIT` in seconds. The first `FLOOD_WAIT` stops the round, gifts not
+        scanned by then keep their index until the next one.
+        """
+
+        known_star_gift_ids = self.indexes.keys() & set(star_gift_ids)
+
+        scans = {
+            asyncio.create_task(self.scan(client, star_gift_id, now)): star_gift_id
+            for star_gift_id in star_gift_ids
+        }
+        pending_scans = set(scans)
+        flood_wait: int | None = None
+
+        try:
+            while pending_scans and flood_wait is None:
+                done_scans, pending_scans = await asyncio.wait(pending_scans, return_when=asyncio.FIRST_COMPLETED)
+
+                for scan in done_scans:
+                    exception = scan.exception()
+
+                    if isinstance(exception, FloodWait):
+                        flood_wait = max(flood_wait or 0, typing.cast(int, exception.value))
+
+        finally:
+            for scan in pending_scans:
+                scan.cancel()
+
+            await asyncio.gather(*pending_scans, return_exceptions=True)
+
+        floor_changes: dict[int, FLOOR_CHANGE_T] = {}
+
+        for scan, star_gift_id in scans.items():
+            if scan.cancelled():
+                continue
+
+            exception = scan.exception()
+
+            if exception is not None:
+                if not isinstance(exception, FloodWait):
+                    logger.warning(f"Error scanning resale listings of gift {star_gift_id}: {exception!r}")
+
+                continue
+
+            old_floor, new_floor = result = scan.result()
+
+            if star_gift_id in known_star_gift_ids and old_floor != new_floor:
+                floor_changes[star_gift_id] = result
+
+        return floor_changes, flood_wait
@@ -0,0 +1,320 @@
+"""
+Userbot session storage kept in memory and flushed to the usual `<name>.session` SQLite file.
+
+The file is opened, created and migrated by pyrogram's `FileStorage`, then read into dicts once.
+Lookups and updates only touch memory; changed rows are written back by `flush`, off the event
+loop, so existing sessions keep working and can still be opened by the default storage.
+"""
+
+from pyrogram.storage import Storage, FileStorage
+from pyrogram.storage.sqlite_storage import UNAME_SCHEMA, get_input_peer
+from pathlib import Path
+
+import asyncio
+import threading
+import time
+import typing
+
+
+SESSION_FIELDS = ("dc_id", "api_id", "test_mode", "auth_key", "date", "user_id", "is_bot")
+
+PEER_T = tuple[int, int | None, str, str | None, str | None, int]  # (id, access_hash, type, username, phone_number, last_update_on)
+UPDATE_STATE_T = tuple[int, int, int, int, int]  # (id, pts, qts, date, seq)
+
+
+class _FlushData(typing.NamedTuple):
+    session: tuple[typing.Any, ...] | None
+    peers: list[PEER_T]
+    username_peer_ids: list[int]
+    usernames: list[tuple[str, int, int]]  # (username, peer_id, last_update_on)
+    update_states: list[UPDATE_STATE_T] | None
+
+
+class SessionStorage(Storage):
+    USERNAME_TTL = FileStorage.USERNAME_TTL
+
+    def __init__(self, name: str, workdir: Path) -> None:
+        super().__init__(name)
+
+        self.file_storage = FileStorage(name, workdir)
+
+        self._session: dict[str, typing.Any] = {}
+        self._peers: dict[int, PEER_T] = {}
+        self._peer_ids_by_username: dict[str, int] = {}
+        self._peer_ids_by_phone_number: dict[str, int] = {}
+        self._usernames: dict[str, tuple[int, int]] = {}  # {username: (peer_id, last_update_on)}
+        self._usernames_by_peer_id: dict[int, set[str]] = {}
+        self._update_states: dict[int, UPDATE_STATE_T] = {}
+
+        self._is_session_dirty = False
+        self._dirty_peer_ids: set[int] = set()
+        self._dirty_username_peer_ids: set[int] = set()
+        self._are_update_states_dirty = False
+
+        self._write_lock = threading.Lock()
+        self.is_open = False
+
+    @property
+    def is_dirty(self) -> bool:
+        return self._is_session_dirty or bool(self._dirty_peer_ids or self._dirty_username_peer_ids) or self._are_update_states_dirty
+
+    async def open(self) -> None:
+        await self.file_storage.open()
+
+        conn = self.file_storage.conn
+
+        with conn:
+            conn.executescript(UNAME_SCHEMA)
+
+        self._session = dict(zip(SESSION_FIELDS, conn.execute(f"SELECT {', '.join(SESSION_FIELDS)} FROM sessions").fetchone()))
+
+        for peer in conn.execute("SELECT id, access_hash, type, username, phone_number, last_update_on FROM peers ORDER BY last_update_on"):
+            self._set_peer(peer)
+
+        for username, peer_id, last_update_on in conn.execute("SELECT id, peer_id, last_update_on FROM usernames"):
+            self._usernames[username] = (peer_id, last_update_on)
+            self._usernames_by_peer_id.setdefault(peer_id, set()).add(username)
+
+        self._update_states = {
+            update_state[0]: update_state
+            for update_state in conn.execute("SELECT id, pts, qts, date, seq FROM update_state")
+        }
+
+        self.is_open = True
+
+    def _take_flush_data(self) -> _FlushData:
+        """
+        Changed rows, which are no longer marked as changed.
+        """
+
+        flush_data = _FlushData(
+            session = tuple(self._session[field] for field in SESSION_FIELDS) if self._is_session_dirty else None,
+            peers = [self._peers[peer_id] for peer_id in self._dirty_peer_ids],
+            username_peer_ids = list(self._dirty_username_peer_ids),
+            usernames = [
+                (username, peer_id, self._usernames[username][1])
+                for peer_id in self._dirty_username_peer_ids
+                for username in self._usernames_by_peer_id.get(peer_id, ())
+            ],
+            update_states = list(self._update_states.values()) if self._are_update_states_dirty else None
+        )
+
+        self._is_session_dirty = False
+        self._dirty_peer_ids.clear()
+        self._dirty_username_peer_ids.clear()
+        self._are_update_states_dirty = False
+
+        return flush_data
+
+    def _restore_flush_data(self, flush_data: _FlushData) -> None:
+        """
+        Marks the rows of a failed flush as changed again, memory already holds their latest values.
+        """
+
+        self._is_session_dirty |= flush_data.session is not None
+        self._dirty_peer_ids.update(peer[0] for peer in flush_data.peers if peer[0] in self._peers)
+        self._dirty_username_peer_ids.update(flush_data.username_peer_ids)
+        self._are_update_states_dirty |= flush_data.update_states is not None
+
+    def _write(self, flush_data: _FlushData) -> None:
+        conn = self.file_storage.conn
+
+        with self._write_lock, conn:
+            if flush_data.session is not None:
+                conn.execute(
+                    f"UPDATE sessions SET {', '.join(f'{field} = ?' for field in SESSION_FIELDS)}",
+                    flush_data.session
+                )
+
+            conn.executemany(
+                "REPLACE INTO peers (id, access_hash, type, username, phone_number, last_update_on) VALUES (?, ?, ?, ?, ?, ?)",
+                flush_data.peers
+            )
+
+            conn.executemany(
+                "DELETE FROM usernames WHERE peer_id = ?",
+                [(peer_id,) for peer_id in flush_data.username_peer_ids]
+            )
+
+            conn.executemany(
+                "REPLACE INTO usernames (id, peer_id, last_update_on) VALUES (?, ?, ?)",
+                flush_data.usernames
+            )
+
+            if flush_data.update_states is not None:
+                conn.execute("DELETE FROM update_state")
+
+                conn.executemany(
+                    "INSERT INTO update_state (id, pts, qts, date, seq) VALUES (?, ?, ?, ?, ?)",
+                    flush_data.update_states
+                )
+
+    async def flush(self) -> None:
+        """
+        Writes the changed rows in a worker thread.
+        """
+
+        if not self.is_open or not self.is_dirty:
+            return
+
+        flush_data = self._take_flush_data()
+
+        try:
+            await asyncio.to_thread(self._write, flush_data)
+
+        except BaseException:
+            self._restore_flush_data(flush_data)
+
+            raise
+
+    def flush_sync(self) -> None:
+        """
+        Same as `flush`, but blocking, for the exit path where the event loop is gone.
+        """
+
+        if not self.is_open or not self.is_dirty:
+            return
+
+        flush_data = self._take_flush_data()
+
+        try:
+            self._write(flush_data)
+
+        except BaseException:
+            self._restore_flush_data(flush_data)
+
+            raise
+
+    async def save(self) -> None:
+        await self.date(int(time.time()))
+        await self.flush()
+
+    async def close(self) -> None:
+        if not self.is_open:
+            return
+
+        self.flush_sync()
+
+        self.is_open = False
+
+        await self.file_storage.close()
+
+    async def delete(self) -> None:
+        await self.file_storage.delete()
+
+    def _set_peer(self, peer: PEER_T) -> None:
+        peer_id, _, _, username, phone_number, _ = peer
+
+        self._peers[peer_id] = peer
+
+        if username:
+            self._peer_ids_by_username[username] = peer_id
+
+        if phone_number:
+            self._peer_ids_by_phone_number[phone_number] = peer_id
+
+    async def update_peers(self, peers: list[tuple[int, int, str, str, str]]) -> None:
+        now = int(time.time())
+
+        for peer_id, access_hash, peer_type, username, phone_number in peers:
+            self._set_peer((peer_id, access_hash, peer_type, username, phone_number, now))
+            self._dirty_peer_ids.add(peer_id)
+
+    async def update_usernames(self, usernames: list[tuple[int, str]]) -> None:
+        now = int(time.time())
+
+        for peer_id in {peer_id for peer_id, _ in usernames}:
+            for username in self._usernames_by_peer_id.pop(peer_id, ()):
+                del self._usernames[username]
+
+            self._dirty_username_peer_ids.add(peer_id)
+
+        for peer_id, username in usernames:
+            old_peer_id = self._usernames.get(username, (peer_id, 0))[0]
+
+            if old_peer_id != peer_id:  # The username moved to another peer, its old row is replaced
+                self._usernames_by_peer_id[old_peer_id].discard(username)
+
+            self._usernames[username] = (peer_id, now)
+            self._usernames_by_peer_id.setdefault(peer_id, set()).add(username)
+
+    async def update_state(self, value: typing.Any=object) -> typing.Any:
+        if value is object:
+            return list(self._update_states.values())
+
+        if isinstance(value, int):
+            self._update_states.pop(value, None)
+
+        else:
+            self._update_states[value[0]] = tuple(value)
+
+        self._are_update_states_dirty = True
+
+    async def remove_state(self, chat_id: int) -> None:
+        await self.update_state(chat_id)
+
+    async def get_peer_by_id(self, peer_id: int) -> typing.Any:
+        peer = self._peers.get(peer_id)
+
+        if peer is None:
+            raise KeyError(f"ID not found: {peer_id}")
+
+        return get_input_peer(*peer[:3])
+
+    async def get_peer_by_username(self, username: str) -> typing.Any:
+        peer = self._peers.get(self._peer_ids_by_username.get(username, 0))
+
+        if peer is None or peer[3] != username:
+            peer_id, last_update_on = self._usernames.get(username, (None, 0))
+
+            if peer_id is None:
+                raise KeyError(f"Username not found: {username}")
+
+            if abs(time.time() - last_update_on) > self.USERNAME_TTL:
+                raise KeyError(f"Username expired: {username}")
+
+            peer = self._peers.get(peer_id)
+
+            if peer is None:
+                raise KeyError(f"Username not found: {username}")
+
+        if abs(time.time() - peer[5]) > self.USERNAME_TTL:
+            raise KeyError(f"Username expired: {username}")
+
+        return get_input_peer(*peer[:3])
+
+    async def get_peer_by_phone_number(self, phone_number: str) -> typing.Any:
+        peer = self._peers.get(self._peer_ids_by_phone_number.get(phone_number, 0))
+
+        if peer is None or peer[4] != phone_number:
+            raise KeyError(f"Phone number not found: {phone_number}")
+
+        return get_input_peer(*peer[:3])
+
+    def _accessor(self, field: str, value: typing.Any) -> typing.Any:
+        if value is object:
+            return self._session[field]
+
+        self._session[field] = value
+        self._is_session_dirty = True
+
+    async def dc_id(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("dc_id", value)
+
+    async def api_id(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("api_id", value)
+
+    async def test_mode(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("test_mode", value)
+
+    async def auth_key(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("auth_key", value)
+
+    async def date(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("date", value)
+
+    async def user_id(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("user_id", value)
+
+    async def is_bot(self, value: typing.Any=object) -> typing.Any:
+        return self._accessor("is_bot", value)
@@ -1,9 +1,10 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr
 from pathlib import Path
 
-import simplejson as json
+import asyncio
+import typing
 
-import constants
+import json_codec
 
 
 class BaseConfigModel(BaseModel, extra="ignore"):
@@ -24,39 +25,418 @@ class StarGiftData(BaseConfigModel):
     is_limited: bool
     first_appearance_timestamp: int | None = Field(default=None)  # None if posted before this update
     message_id: int | None = Field(default=None)
+    message_text_hash: str | None = Field(default=None)  # Hash of the visible text of `message_id`
+    message_available_amount: int | None = Field(default=None)  # Available amount shown in `message_id`
     last_sale_timestamp: int | None = Field(default=None)
     is_upgradable: bool = Field(default=False)
+    upgrade_price: int | None = Field(default=None)  # None until the gift is upgradable
+
+    @property
+    def is_active(self) -> bool:
+        """
+        Whether the catalog can still change it: limited and still selling, or not notified as upgradable yet.
+        """
+
+        return (self.is_limited and self.available_amount > 0) or not self.is_upgradable
+
+    def get_archived_state(self) -> "ARCHIVED_STATE_T":
+        return (self.available_amount, self.upgrade_price)
+
+    def get_catalog_fields(self) -> dict[str, typing.Any]:
+        """
+        Fields as `getStarGifts` returned them, without the ones the detector keeps.
+        """
+
+        return self.model_dump(exclude=DETECTOR_FIELDS)
+
+
+ARCHIVED_STATE_T = tuple[int, int | None]  # (available_amount, upgrade_price) as last seen in the catalog
+DETECTOR_FIELDS = frozenset(("message_id", "message_text_hash", "message_available_amount", "is_upgradable"))
+ENCODED_STAR_GIFTS_T = dict[int, tuple[StarGiftData, bytes]]  # {id(star_gift): (star_gift, JSON)}
+
+
+def _encode_star_gift(star_gift: StarGiftData, previous_encoded_star_gifts: ENCODED_STAR_GIFTS_T, encoded_star_gifts: ENCODED_STAR_GIFTS_T) -> bytes:
+    """
+    Gifts are immutable once stored, so the encoding from the previous save is reused.
+    """
+
+    encoded_star_gift = previous_encoded_star_gifts.get(id(star_gift))
+
+    if encoded_star_gift is None or encoded_star_gift[0] is not star_gift:
+        encoded_star_gift = (star_gift, json_codec.dumps(star_gift.model_dump()))
+
+    encoded_star_gifts[id(star_gift)] = encoded_star_gift
+
+    return encoded_star_gift[1]
+
+
+class _EncodedSnapshot(typing.NamedTuple):
+    files: list[tuple[Path, bytes]]
+    saved_version: tuple[Path, int]
+    archive_version: int
+    encoded_star_gifts: ENCODED_STAR_GIFTS_T
+
+
+def _write_files(files: list[tuple[Path, bytes]]) -> None:
+    for filepath, data in files:
+        temp_filepath = filepath.with_name(filepath.name + ".tmp")
+        temp_filepath.write_bytes(data)
+        temp_filepath.replace(filepath)
+
+
+class StarGiftsArchive(BaseConfigModel):
+    star_gifts: dict[int, StarGiftData] = Field(default_factory=dict[int, StarGiftData])
+
+
+class CatalogSnapshot(typing.NamedTuple):
+    """
+    Gifts data as of `version`. Stored gifts are replaced instead of changed in place, so a snapshot
+    stays consistent while the data goes on changing, without copying the gifts themselves.
+    """
+
+    version: int
+    star_gifts: tuple[StarGiftData, ...]
+    archived_star_gifts: dict[int, ARCHIVED_STATE_T]
+    archive: dict[int, StarGiftData] | None  # None unless taken with the archive
+    archive_version: int  # Version the archive last changed at
+
+    def get_all(self) -> list[StarGiftData]:
+        """
+        Gifts of the tiers the snapshot was taken with, ordered by ID.
+        """
+
+        return sorted(
+            [*self.star_gifts, *(self.archive or {}).values()],
+            key = lambda star_gift: star_gift.id
+        )
 
 
 class StarGiftsData(BaseConfigModel):
+    """
+    Active gifts are kept in `star_gifts`, the hot tier every poll iterates. Inactive ones are moved
+    to an archive stored in `ARCHIVE_FILEPATH`, which is only read when an archived gift is needed,
+    and only their catalog state is kept in `archived_star_gifts` to notice when one changes.
+
+    Every change goes through the methods below and bumps `version`. Stored gifts are never changed
+    in place, `update` stores a changed copy instead, so readers can hold a `snapshot` across awaits
+    and `save_async` can write one while the data changes.
+    """
+
     DATA_FILEPATH: Path = Field(exclude=True)
+    PRETTY_JSON: bool = Field(default=False, exclude=True)
     star_gifts: list[StarGiftData] = Field(default_factory=list[StarGiftData])
+    archived_star_gifts: dict[int, ARCHIVED_STATE_T] = Field(default_factory=dict[int, ARCHIVED_STATE_T])
+
+    _archive: StarGiftsArchive | None = PrivateAttr(default=None)
+    _version: int = PrivateAttr(default=0)
+    _archive_version: int = PrivateAttr(default=0)
+    _saved_archive_version: int = PrivateAttr(default=0)
+    _saved_version: tuple[Path, int] | None = PrivateAttr(default=None)  # (DATA_FILEPATH, version)
+    _snapshot: CatalogSnapshot | None = PrivateAttr(default=None)
+    _archive_copy: tuple[int, dict[int, StarGiftData]] | None = PrivateAttr(default=None)  # (archive version, archived gifts)
+    _encoded_star_gifts: ENCODED_STAR_GIFTS_T = PrivateAttr(default_factory=dict[int, tuple[StarGiftData, bytes]])
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def ARCHIVE_FILEPATH(self) -> Path:
+        return self.DATA_FILEPATH.with_name(f"{self.DATA_FILEPATH.stem}_archive{self.DATA_FILEPATH.suffix}")
 
     @classmethod
-    def load(cls, data_filepath: Path, new: bool=False) -> "StarGiftsData":
+    def load(cls, data_filepath: Path, new: bool=False, pretty: bool=False) -> "StarGiftsData":
         if new:
-            return cls(
-                DATA_FILEPATH = data_filepath
+            star_gifts_data = cls(
+                DATA_FILEPATH = data_filepath,
+                PRETTY_JSON = pretty
             )
 
+            # Overwrites the archive of the previous data instead of reading it
+            star_gifts_data._archive = StarGiftsArchive()
+            star_gifts_data._touch(archive=True)
+
+            return star_gifts_data
+
         try:
-            with data_filepath.open("r", encoding=constants.ENCODING) as file:
-                return cls.model_validate({
-                    **json.load(file),
-                    "DATA_FILEPATH": data_filepath
-                })
+            return cls.model_validate({
+                **json_codec.loads(data_filepath.read_bytes()),
+                "DATA_FILEPATH": data_filepath,
+                "PRETTY_JSON": pretty
+            })
 
         except FileNotFoundError:
             return cls(
-                DATA_FILEPATH = data_filepath
+                DATA_FILEPATH = data_filepath,
+                PRETTY_JSON = pretty
             )
 
-    def save(self) -> None:
-        with self.DATA_FILEPATH.open("w", encoding=constants.ENCODING) as file:
-            json.dump(
-                obj = self.model_dump(),
-                fp = file,
-                indent = 4,
-                ensure_ascii = True,
-                sort_keys = False
+    def _touch(self, archive: bool=False) -> None:
+        self._version += 1
+        self._snapshot = None
+
+        if archive:
+            self._archive_version = self._version
+
+    def _get_archive_copy(self) -> dict[int, StarGiftData]:
+        """
+        Copied once per archive version, the archive is only read if there is one.
+        """
+
+        if self._archive_copy is None or self._archive_copy[0] != self._archive_version:
+            self._archive_copy = (
+                self._archive_version,
+                dict(self.get_archive().star_gifts) if self.archived_star_gifts or self._archive is not None else {}
+            )
+
+        return self._archive_copy[1]
+
+    def snapshot(self, archive: bool=False) -> CatalogSnapshot:
+        """
+        Taken once per version. Only the hot tier by default, which is all the polls need, the
+        archive is added with `archive`.
+        """
+
+        if self._snapshot is None:
+            self._snapshot = CatalogSnapshot(
+                version = self._version,
+                star_gifts = tuple(self.star_gifts),
+                archived_star_gifts = dict(self.archived_star_gifts),
+                archive = None,
+                archive_version = self._archive_version
             )
+
+        if archive and self._snapshot.archive is None:
+            self._snapshot = self._snapshot._replace(archive=self._get_archive_copy())
+
+        return self._snapshot
+
+    def _encode(self, snapshot: CatalogSnapshot) -> _EncodedSnapshot | None:
+        """
+        None if `snapshot` is saved already. The archive is only encoded if it changed since the
+        previous save, a snapshot taken without it after it changed leaves it to the next save.
+        Compact files are joined from the encodings of single gifts.
+        """
+
+        if self._saved_version == (self.DATA_FILEPATH, snapshot.version):
+            return None
+
+        previous_encoded_star_gifts = self._encoded_star_gifts
+        encoded_star_gifts: ENCODED_STAR_GIFTS_T = {}
+        files: list[tuple[Path, bytes]] = []
+        archive_version = snapshot.archive_version
+
+        if snapshot.archive_version > self._saved_archive_version:
+            archive = snapshot.archive
+
+            if archive is None and snapshot.archive_version == self._archive_version:
+                archive = self._get_archive_copy()
+
+            if archive is None:
+                archive_version = self._saved_archive_version
+
+            elif archive or self.ARCHIVE_FILEPATH.exists():
+                if self.PRETTY_JSON:
+                    archive_data = json_codec.dumps(StarGiftsArchive(star_gifts=archive).model_dump(), pretty=True)
+
+                else:
+                    archive_data = b'{"star_gifts":{' + b",".join(
+                        b'"%d":%s' % (star_gift_id, _encode_star_gift(star_gift, previous_encoded_star_gifts, encoded_star_gifts))
+                        for star_gift_id, star_gift in archive.items()
+                    ) + b"}}"
+
+                files.append((self.ARCHIVE_FILEPATH, archive_data))
+
+        if self.PRETTY_JSON:
+            data = json_codec.dumps({
+                "star_gifts": [star_gift.model_dump() for star_gift in snapshot.star_gifts],
+                "archived_star_gifts": snapshot.archived_star_gifts
+            }, pretty=True)
+
+        else:
+            data = b'{"star_gifts":[' + b",".join(
+                _encode_star_gift(star_gift, previous_encoded_star_gifts, encoded_star_gifts)
+                for star_gift in snapshot.star_gifts
+            ) + b'],"archived_star_gifts":' + json_codec.dumps(snapshot.archived_star_gifts) + b"}"
+
+        files.append((self.DATA_FILEPATH, data))
+
+        return _EncodedSnapshot(
+            files = files,
+            saved_version = (self.DATA_FILEPATH, snapshot.version),
+            archive_version = archive_version,
+            encoded_star_gifts = encoded_star_gifts
+        )
+
+    def _set_saved(self, encoded_snapshot: _EncodedSnapshot) -> None:
+        self._saved_version = encoded_snapshot.saved_version
+        self._saved_archive_version = max(self._saved_archive_version, encoded_snapshot.archive_version)
+        self._encoded_star_gifts = encoded_snapshot.encoded_star_gifts
+
+    def save(self, snapshot: CatalogSnapshot | None = None) -> None:
+        """
+        Writes `snapshot`, the current data by default, nothing if it is saved already.
+        """
+
+        encoded_snapshot = self._encode(snapshot or self.snapshot())
+
+        if encoded_snapshot is not None:
+            _write_files(encoded_snapshot.files)
+
+            self._set_saved(encoded_snapshot)
+
+    async def save_async(self, snapshot: CatalogSnapshot | None = None) -> None:
+        """
+        Same as `save`, but the files are written in a thread. Encoding stays on the event loop, it
+        only encodes the gifts changed since the previous save, and the data can change meanwhile.
+        """
+
+        encoded_snapshot = self._encode(snapshot or self.snapshot())
+
+        if encoded_snapshot is not None:
+            await asyncio.to_thread(_write_files, encoded_snapshot.files)
+
+            self._set_saved(encoded_snapshot)
+
+    def get_archive(self) -> StarGiftsArchive:
+        if self._archive is None:
+            try:
+                self._archive = StarGiftsArchive.model_validate(json_codec.loads(self.ARCHIVE_FILEPATH.read_bytes()))
+
+            except FileNotFoundError:
+                self._archive = StarGiftsArchive()
+
+        return self._archive
+
+    def get(self, star_gift_id: int) -> StarGiftData | None:
+        star_gift = next((
+            star_gift
+            for star_gift in self.star_gifts
+            if star_gift.id == star_gift_id
+        ), None)
+
+        if star_gift is None and star_gift_id in self.archived_star_gifts:
+            star_gift = self.get_archive().star_gifts.get(star_gift_id)
+
+        return star_gift
+
+    def get_all(self) -> list[StarGiftData]:
+        """
+        Gifts of both tiers ordered by ID, reads the archive.
+        """
+
+        return sorted(
+            [*self.star_gifts, *(self.get_archive().star_gifts.values() if self.archived_star_gifts else ())],
+            key = lambda star_gift: star_gift.id
+        )
+
+    def add(self, star_gifts: typing.Iterable[StarGiftData]) -> None:
+        self.star_gifts.extend(star_gifts)
+        self._touch()
+
+    def replace_star_gifts(self, star_gifts: typing.Iterable[StarGiftData]) -> None:
+        """
+        Replaces the whole hot tier.
+        """
+
+        self.star_gifts = list(star_gifts)
+        self._touch()
+
+    def put(self, star_gift: StarGiftData) -> None:
+        """
+        Replaces the stored gift with the same ID in the tier it belongs to now.
+        """
+
+        index = next((
+            i
+            for i, stored_star_gift in enumerate(self.star_gifts)
+            if stored_star_gift.id == star_gift.id
+        ), None)
+
+        if star_gift.is_active:
+            if index is not None:
+                self.star_gifts[index] = star_gift
+                self._touch()
+
+                return
+
+            is_archived = self.archived_star_gifts.pop(star_gift.id, None) is not None
+
+            if is_archived:
+                del self.get_archive().star_gifts[star_gift.id]
+
+            self.star_gifts.append(star_gift)
+            self._touch(archive=is_archived)
+
+        else:
+            if index is not None:
+                del self.star_gifts[index]
+
+            self.get_archive().star_gifts[star_gift.id] = star_gift
+            self.archived_star_gifts[star_gift.id] = star_gift.get_archived_state()
+            self._touch(archive=True)
+
+    def update(self, star_gift_id: int, **changes: typing.Any) -> StarGiftData | None:
+        """
+        Stores a copy of the gift with `changes` applied to its latest version and returns it.
+        """
+
+        star_gift = self.get(star_gift_id)
+
+        if star_gift is None:
+            return None
+
+        star_gift = star_gift.model_copy(update=changes)
+
+        self.put(star_gift)
+
+        return star_gift
+
+    def promote(self, star_gift_ids: typing.Iterable[int]) -> list[StarGiftData]:
+        """
+        Moves archived gifts back to the hot tier, as the catalog changed them.
+        """
+
+        promoted_star_gifts: list[StarGiftData] = []
+
+        for star_gift_id in star_gift_ids:
+            if self.archived_star_gifts.pop(star_gift_id, None) is None:
+                continue
+
+            star_gift = self.get_archive().star_gifts.pop(star_gift_id, None)
+            self._touch(archive=True)
+
+            if star_gift is not None:
+                self.star_gifts.append(star_gift)
+                promoted_star_gifts.append(star_gift)
+
+        return promoted_star_gifts
+
+    def demote_inactive(self, catalog_star_gifts: dict[int, StarGiftData] | None = None) -> list[StarGiftData]:
+        """
+        Moves gifts which are no longer active to the archive. Their archived state is taken from
+        `catalog_star_gifts` if they are in it, so changes which aren't stored don't promote them again.
+        """
+
+        demoted_star_gifts = [
+            star_gift
+            for star_gift in self.star_gifts
+            if not star_gift.is_active
+        ]
+
+        if demoted_star_gifts:
+            self.star_gifts = [
+                star_gift
+                for star_gift in self.star_gifts
+                if star_gift.is_active
+            ]
+
+            for star_gift in demoted_star_gifts:
+                catalog_star_gift = catalog_star_gifts.get(star_gift.id) if catalog_star_gifts else None
+
+                self.get_archive().star_gifts[star_gift.id] = star_gift
+                self.archived_star_gifts[star_gift.id] = (catalog_star_gift or star_gift).get_archived_state()
+
+            self._touch(archive=True)
+
+        return demoted_star_gifts
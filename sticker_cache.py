@@ -0,0 +1,108 @@
+from pyrogram import Client
+from pyrogram.file_id import FileId
+from pathlib import Path
+from logging import Logger
+from io import BytesIO
+
+import asyncio
+
+import userbot_helpers
+
+
+class StickerCache:
+    """
+    Stickers downloaded once and kept as `<document id>.tgs` files, shared by the upgrade
+    notifications and the catalog API. Documents requested while they are being downloaded
+    wait for that download instead of starting another one.
+    """
+
+    def __init__(self, dirpath: Path) -> None:
+        self.dirpath = dirpath
+
+        self._downloads: dict[int, asyncio.Future[bytes | None]] = {}
+
+    def get_filepath(self, document_id: int) -> Path:
+        return self.dirpath / f"{document_id}.tgs"
+
+    def get_cached(self, document_id: int) -> bytes | None:
+        try:
+            return self.get_filepath(document_id).read_bytes()
+
+        except FileNotFoundError:
+            return None
+
+    async def get_many(self, client: Client, file_ids: dict[int, str], logger: Logger) -> dict[int, BytesIO]:
+        """
+        `file_ids` is `{document_id: file_id}`. Missing stickers are downloaded in one batch,
+        stickers which failed to download are left out of the result.
+        """
+
+        stickers: dict[int, bytes] = {}
+        waiting: dict[int, asyncio.Future[bytes | None]] = {}
+        documents_data: dict[int, list[tuple[int, int, bytes]]] = {}
+
+        for document_id, file_id in file_ids.items():
+            sticker = self.get_cached(document_id)
+
+            if sticker is not None:
+                stickers[document_id] = sticker
+
+            elif document_id in self._downloads:
+                waiting[document_id] = self._downloads[document_id]
+
+            else:
+                file_id_obj = FileId.decode(file_id)
+
+                documents_data.setdefault(file_id_obj.dc_id, []).append((
+                    file_id_obj.media_id,
+                    file_id_obj.access_hash,
+                    file_id_obj.file_reference
+                ))
+
+                self._downloads[document_id] = asyncio.get_running_loop().create_future()
+
+        if documents_data:
+            downloading_ids = [
+                document_id
+                for documents in documents_data.values()
+                for document_id, _, _ in documents
+            ]
+
+            downloaded: dict[int, BytesIO] = {}
+
+            try:
+                downloaded = await userbot_helpers.download_documents(
+                    client = client,
+                    documents_data = documents_data,
+                    logger = logger
+                )
+
+            except Exception as ex:
+                logger.exception(f"Error downloading {len(downloading_ids)} stickers", exc_info=ex)
+
+            finally:  # Waiters are released even if the download is cancelled
+                self.dirpath.mkdir(parents=True, exist_ok=True)
+
+                for document_id in downloading_ids:
+                    sticker_binary = downloaded.get(document_id)
+                    sticker = sticker_binary.getvalue() if sticker_binary else None
+
+                    if sticker is not None:
+                        stickers[document_id] = sticker
+
+                        temp_filepath = self.get_filepath(document_id).with_suffix(".tmp")
+                        temp_filepath.write_bytes(sticker)
+                        temp_filepath.replace(self.get_filepath(document_id))
+
+                    self._downloads.pop(document_id).set_result(sticker)
+
+        for document_id, future in waiting.items():
+            sticker = await future
+
+            if sticker is not None:
+                stickers[document_id] = sticker
+
+        return {
+            document_id: BytesIO(sticker)
+            for document_id, sticker in stickers.items()
+        }
@@ -0,0 +1,438 @@
+"""
+Filtered new gift alerts for bot users, who subscribe with `/subscribe` in a private chat.
+
+`SubscriptionIndex` matches a gift against all filters with a few big integer bitmasks, one bit per
+subscription. Prices and supplies are split into buckets at round values and every bucket keeps the
+mask of filters covering it entirely and the mask of filters with a bound inside it, so only the
+latter are evaluated one by one. Deliveries are paced through `DeliveryQueue`.
+"""
+
+from pydantic import Field
+from pathlib import Path
+from bisect import bisect_left
+from logging import Logger
+
+import asyncio
+import re
+import typing
+
+from star_gifts_data import BaseConfigModel, StarGiftData
+from rate_limiter import TokenBucket
+
+import json_codec
+
+
+MAX_MESSAGE_LENGTH = 4096
+
+# Buckets are (previous boundary, boundary], so bounds like `price<=5000` cover their buckets entirely
+BUCKET_BOUNDARIES = tuple(sorted({0, *(
+    multiplier * 10 ** exponent
+    for exponent in range(10)
+    for multiplier in (1, 2, 3, 5)
+)}))
+BUCKETS_AMOUNT = len(BUCKET_BOUNDARIES) + 1
+
+_BOUND_PATTERN = re.compile(r"^(price|total)(<=|>=|≤|≥|<|>|=)(\d+(?:\.\d+)?)([km]?)$", re.IGNORECASE)
+_MULTIPLIERS = {"": 1, "k": 1_000, "m": 1_000_000}
+_BYTE_BITS = tuple(
+    tuple(bit for bit in range(8) if byte >> bit & 1)
+    for byte in range(256)
+)
+
+
+class SubscriptionFilter(BaseConfigModel):
+    min_price: int = Field(default=0)
+    max_price: int | None = Field(default=None)
+    min_total_amount: int = Field(default=0)
+    max_total_amount: int | None = Field(default=None)  # Bounds on the supply match limited gifts only
+    limited_only: bool = Field(default=False)
+    exclude_premium: bool = Field(default=False)
+
+    @property
+    def has_total_bounds(self) -> bool:
+        return self.min_total_amount > 0 or self.max_total_amount is not None
+
+    @classmethod
+    def parse(cls, text: str) -> "SubscriptionFilter":
+        """
+        `limited price<=5000 total<=10k nopremium` or `all`, raises `ValueError` on an unknown token.
+        """
+
+        subscription_filter = cls()
+
+        for token in text.replace(",", " ").split():
+            token_lower = token.lower()
+
+            if token_lower == "all":
+                continue
+
+            if token_lower == "limited":
+                subscription_filter.limited_only = True
+
+                continue
+
+            if token_lower == "nopremium":
+                subscription_filter.exclude_premium = True
+
+                continue
+
+            match = _BOUND_PATTERN.match(token_lower)
+
+            if not match:
+                raise ValueError(f"Unknown filter: {token}")
+
+            field, operator, number, suffix = match.groups()
+            value = int(float(number) * _MULTIPLIERS[suffix])
+            name = "price" if field == "price" else "total_amount"
+
+            if operator in ("<=", "≤", "<", "="):
+                setattr(subscription_filter, f"max_{name}", value - (operator == "<"))
+
+            if operator in (">=", "≥", ">", "="):
+                setattr(subscription_filter, f"min_{name}", value + (operator == ">"))
+
+        return subscription_filter
+
+    def format(self) -> str:
+        """
+        The filter in the syntax of `parse`.
+        """
+
+        tokens = [
+            token
+            for token in (
+                "limited" if self.limited_only else "",
+                f"price>={self.min_price}" if self.min_price else "",
+                f"price<={self.max_price}" if self.max_price is not None else "",
+                f"total>={self.min_total_amount}" if self.min_total_amount else "",
+                f"total<={self.max_total_amount}" if self.max_total_amount is not None else "",
+                "nopremium" if self.exclude_premium else ""
+            )
+            if token
+        ]
+
+        return " ".join(tokens) if tokens else "all"
+
+    def matches(self, star_gift: StarGiftData) -> bool:
+        if (self.limited_only or self.has_total_bounds) and not star_gift.is_limited:
+            return False
+
+        if self.exclude_premium and star_gift.require_premium:
+            return False
+
+        if not self.min_price <= star_gift.price <= (star_gift.price if self.max_price is None else self.max_price):
+            return False
+
+        if star_gift.is_limited and not self.min_total_amount <= star_gift.total_amount <= (star_gift.total_amount if self.max_total_amount is None else self.max_total_amount):
+            return False
+
+        return True
+
+
+class SubscriptionsData(BaseConfigModel):
+    DATA_FILEPATH: Path = Field(exclude=True)
+    subscriptions: dict[int, SubscriptionFilter] = Field(default_factory=dict[int, SubscriptionFilter])  # {chat_id: filter}
+
+    @classmethod
+    def load(cls, data_filepath: Path) -> "SubscriptionsData":
+        try:
+            return cls.model_validate({
+                **json_codec.loads(data_filepath.read_bytes()),
+                "DATA_FILEPATH": data_filepath
+            })
+
+        except FileNotFoundError:
+            return cls(
+                DATA_FILEPATH = data_filepath
+            )
+
+    def save(self) -> None:
+        temp_filepath = self.DATA_FILEPATH.with_name(self.DATA_FILEPATH.name + ".tmp")
+        temp_filepath.write_bytes(json_codec.dumps(self.model_dump(exclude_defaults=True)))
+        temp_filepath.replace(self.DATA_FILEPATH)
+
+
+def get_bucket(value: int) -> int:
+    return bisect_left(BUCKET_BOUNDARIES, value)
+
+
+def _get_bucket_coverage(low: int, high: int | None) -> tuple[int, int, list[int]]:
+    """
+    First and last buckets covered entirely by `[low, high]` (first > last if none are)
+    and the buckets it covers partially.
+    """
+
+    first_bucket = get_bucket(low)
+    last_bucket = BUCKETS_AMOUNT - 1 if high is None else get_bucket(high)
+
+    first_full_bucket = first_bucket if first_bucket == 0 or low <= BUCKET_BOUNDARIES[first_bucket - 1] + 1 else first_bucket + 1
+    last_full_bucket = last_bucket if high is None or (last_bucket < BUCKETS_AMOUNT - 1 and high >= BUCKET_BOUNDARIES[last_bucket]) else last_bucket - 1
+
+    return first_full_bucket, last_full_bucket, sorted({
+        bucket
+        for bucket in (first_bucket, last_bucket)
+        if not first_full_bucket <= bucket <= last_full_bucket
+    })
+
+
+def _build_mask(slots: typing.Iterable[int], size: int) -> int:
+    bitmap = bytearray((size + 7) // 8)
+
+    for slot in slots:
+        bitmap[slot >> 3] |= 1 << (slot & 7)
+
+    return int.from_bytes(bitmap, "little")
+
+
+def _iter_bits(mask: int) -> typing.Iterator[int]:
+    for i, byte in enumerate(mask.to_bytes((mask.bit_length() + 7) // 8, "little")):
+        if byte:
+            for bit in _BYTE_BITS[byte]:
+                yield i << 3 | bit
+
+
+class _DimensionIndex:
+    __slots__ = ("full_masks", "partial_masks")
+
+    def __init__(self) -> None:
+        self.full_masks = [0] * BUCKETS_AMOUNT
+        self.partial_masks = [0] * BUCKETS_AMOUNT
+
+    def build(self, ranges: list[tuple[int, int, int | None]], size: int) -> None:
+        """
+        `ranges` are `(slot, low, high)`. Entire coverage is a contiguous run of buckets, so the
+        mask of a bucket is the slots starting at or before it minus the slots ending before it.
+        """
+
+        starts: list[list[int]] = [[] for _ in range(BUCKETS_AMOUNT + 1)]
+        ends: list[list[int]] = [[] for _ in range(BUCKETS_AMOUNT + 1)]
+        partial: list[list[int]] = [[] for _ in range(BUCKETS_AMOUNT)]
+
+        for slot, low, high in ranges:
+            first_full_bucket, last_full_bucket, partial_buckets = _get_bucket_coverage(low, high)
+
+            if first_full_bucket <= last_full_bucket:
+                starts[first_full_bucket].append(slot)
+                ends[last_full_bucket + 1].append(slot)
+
+            for bucket in partial_buckets:
+                partial[bucket].append(slot)
+
+        started = ended = 0
+
+        for bucket in range(BUCKETS_AMOUNT):
+            started |= _build_mask(starts[bucket], size)
+            ended |= _build_mask(ends[bucket], size)
+
+            self.full_masks[bucket] = started & ~ended
+            self.partial_masks[bucket] = _build_mask(partial[bucket], size)
+
+    def update(self, bit: int, low: int, high: int | None, add: bool) -> None:
+        first_full_bucket, last_full_bucket, partial_buckets = _get_bucket_coverage(low, high)
+
+        for masks, buckets in (
+            (self.full_masks, range(first_full_bucket, last_full_bucket + 1)),
+            (self.partial_masks, partial_buckets)
+        ):
+            for bucket in buckets:
+                masks[bucket] = masks[bucket] | bit if add else masks[bucket] & ~bit
+
+    def get_masks(self, value: int) -> tuple[int, int]:
+        bucket = get_bucket(value)
+
+        return self.full_masks[bucket], self.partial_masks[bucket]
+
+
+class SubscriptionIndex:
+    """
+    Subscriptions by chat, each in a slot which is its bit in every mask. Slots of removed
+    subscriptions are reused.
+    """
+
+    def __init__(self) -> None:
+        self.filters: list[SubscriptionFilter | None] = []
+        self.chat_ids: list[int] = []
+        self.slots: dict[int, int] = {}  # {chat_id: slot}
+
+        self._free_slots: list[int] = []
+        self._all_mask = 0
+        self._limited_only_mask = 0
+        self._total_bounds_mask = 0
+        self._exclude_premium_mask = 0
+        self._prices = _DimensionIndex()
+        self._total_amounts = _DimensionIndex()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    @classmethod
+    def build(cls, subscriptions: dict[int, SubscriptionFilter]) -> "SubscriptionIndex":
+        index = cls()
+
+        index.chat_ids = list(subscriptions)
+        index.filters = list(subscriptions.values())
+        index.slots = {
+            chat_id: slot
+            for slot, chat_id in enumerate(index.chat_ids)
+        }
+
+        size = len(index.filters)
+
+        index._all_mask = (1 << size) - 1
+        index._limited_only_mask = _build_mask((slot for slot, f in enumerate(index.filters) if f and f.limited_only), size)
+        index._total_bounds_mask = _build_mask((slot for slot, f in enumerate(index.filters) if f and f.has_total_bounds), size)
+        index._exclude_premium_mask = _build_mask((slot for slot, f in enumerate(index.filters) if f and f.exclude_premium), size)
+        index._prices.build([(slot, f.min_price, f.max_price) for slot, f in enumerate(index.filters) if f], size)
+        index._total_amounts.build([(slot, f.min_total_amount, f.max_total_amount) for slot, f in enumerate(index.filters) if f], size)
+
+        return index
+
+    def _update_masks(self, slot: int, subscription_filter: SubscriptionFilter, add: bool) -> None:
+        bit = 1 << slot
+
+        def update(mask: int, condition: bool=True) -> int:
+            return (mask | bit if add else mask & ~bit) if condition else mask
+
+        self._all_mask = update(self._all_mask)
+        self._limited_only_mask = update(self._limited_only_mask, subscription_filter.limited_only)
+        self._total_bounds_mask = update(self._total_bounds_mask, subscription_filter.has_total_bounds)
+        self._exclude_premium_mask = update(self._exclude_premium_mask, subscription_filter.exclude_premium)
+        self._prices.update(bit, subscription_filter.min_price, subscription_filter.max_price, add)
+        self._total_amounts.update(bit, subscription_filter.min_total_amount, subscription_filter.max_total_amount, add)
+
+    def add(self, chat_id: int, subscription_filter: SubscriptionFilter) -> None:
+        """
+        Replaces the chat's previous subscription.
+        """
+
+        self.remove(chat_id)
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+
+            self.filters[slot] = subscription_filter
+            self.chat_ids[slot] = chat_id
+
+        else:
+            slot = len(self.filters)
+
+            self.filters.append(subscription_filter)
+            self.chat_ids.append(chat_id)
+
+        self.slots[chat_id] = slot
+
+        self._update_masks(slot, subscription_filter, add=True)
+
+    def remove(self, chat_id: int) -> bool:
+        slot = self.slots.pop(chat_id, None)
+
+        if slot is None:
+            return False
+
+        subscription_filter = typing.cast(SubscriptionFilter, self.filters[slot])
+
+        self._update_masks(slot, subscription_filter, add=False)
+
+        self.filters[slot] = None
+        self._free_slots.append(slot)
+
+        return True
+
+    def match(self, star_gift: StarGiftData) -> list[int]:
+        """
+        Chats subscribed to the gift.
+        """
+
+        price_full_mask, price_partial_mask = self._prices.get_masks(star_gift.price)
+
+        candidates = self._all_mask & (price_full_mask | price_partial_mask)
+        partial_mask = price_partial_mask
+
+        if star_gift.is_limited:
+            total_full_mask, total_partial_mask = self._total_amounts.get_masks(star_gift.total_amount)
+
+            candidates &= total_full_mask | total_partial_mask
+            partial_mask |= total_partial_mask
+
+        else:
+            candidates &= ~(self._limited_only_mask | self._total_bounds_mask)
+
+        if star_gift.require_premium:
+            candidates &= ~self._exclude_premium_mask
+
+        to_check = candidates & partial_mask
+
+        return [
+            *(self.chat_ids[slot] for slot in _iter_bits(candidates & ~to_check)),
+            *(
+                self.chat_ids[slot]
+                for slot in _iter_bits(to_check)
+                if typing.cast(SubscriptionFilter, self.filters[slot]).matches(star_gift)
+            )
+        ]
+
+
+def split_texts(texts: list[str], separator: str="\n\n") -> list[str]:
+    """
+    Joins texts into as few messages as fit `MAX_MESSAGE_LENGTH`.
+    """
+
+    messages: list[str] = []
+
+    for text in texts:
+        if messages and len(messages[-1]) + len(separator) + len(text) <= MAX_MESSAGE_LENGTH:
+            messages[-1] += separator + text
+
+        else:
+            messages.append(text)
+
+    return messages
+
+
+DELIVERY_T = tuple[int, str]  # (chat_id, text)
+SEND_T = typing.Callable[[int, str], typing.Awaitable[bool]]  # Whether the message was sent
+
+
+class DeliveryQueue:
+    """
+    Messages to subscribers sent by `workers` concurrent senders, all paced by `rate_limiter`.
+    Deliveries beyond `max_size` are dropped instead of growing the queue without a bound.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, workers: int=4, max_size: int=0) -> None:
+        self.rate_limiter = rate_limiter
+        self.workers = workers
+
+        self.queue: asyncio.Queue[DELIVERY_T] = asyncio.Queue(max_size)
+
+    def put_nowait(self, chat_id: int, text: str) -> bool:
+        try:
+            self.queue.put_nowait((chat_id, text))
+
+        except asyncio.QueueFull:
+            return False
+
+        return True
+
+    async def _worker(self, send: SEND_T, on_result: typing.Callable[[str], None], logger: Logger) -> None:
+        while True:
+            chat_id, text = await self.queue.get()
+
+            try:
+                await self.rate_limiter.acquire()
+
+                on_result("sent" if await send(chat_id, text) else "error")
+
+            except Exception as ex:
+                on_result("error")
+
+                logger.exception(f"Error delivering a subscription message to {chat_id}", exc_info=ex)
+
+            finally:
+                self.queue.task_done()
+
+    async def run(self, send: SEND_T, on_result: typing.Callable[[str], None], logger: Logger) -> None:
+        await asyncio.gather(*(
+            self._worker(send, on_result, logger)
+            for _ in range(self.workers)
+        ))
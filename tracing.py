@@ -0,0 +1,215 @@
+"""
+Lifecycle tracing of gifts, from the `getStarGifts` response a change showed up in to the posted
+or edited message and the stored data.
+
+A trace is started for every such response and followed by the tasks started from it through a
+context variable. Every span is a JSON line:
+`{"trace": 1, "stage": "send_message", "start": <unix time>, "duration": <seconds>, ...attributes}`.
+Spans are buffered and appended to the trace file in batches. Until `configure` is called, recording
+only costs a check.
+"""
+
+from contextvars import ContextVar
+from pathlib import Path
+
+import math
+import statistics
+import time
+import typing
+
+import json_codec
+
+
+PERCENTILES = (50, 90, 99)
+
+_CURRENT_TRACE: ContextVar[int | None] = ContextVar("trace", default=None)
+
+
+class Tracer:
+    """
+    Appends spans to `filepath` once `buffer_size` of them are buffered or on `flush`. A file
+    grown beyond `max_file_size` is renamed to `<filepath>.1`, replacing the previous one.
+    """
+
+    def __init__(self, filepath: Path, buffer_size: int=256, max_file_size: int=64 * 1024 * 1024) -> None:
+        self.filepath = filepath
+        self.buffer_size = buffer_size
+        self.max_file_size = max_file_size
+
+        self._buffer: list[bytes] = []
+        self._next_trace = time.time_ns() // 1_000  # Unique across restarts appending to the same file
+        self._wall_offset = time.time() - time.perf_counter()
+
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+
+    def new_trace(self) -> int:
+        self._next_trace += 1
+
+        return self._next_trace
+
+    def record(self, trace: int, stage: str, started_at: float, ended_at: float, attributes: dict[str, typing.Any]) -> None:
+        """
+        `started_at` and `ended_at` are `time.perf_counter()` values.
+        """
+
+        self._buffer.append(json_codec.dumps({
+            "trace": trace,
+            "stage": stage,
+            "start": round(started_at + self._wall_offset, 6),
+            "duration": round(ended_at - started_at, 6),
+            **attributes
+        }) + b"\n")
+
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+
+        try:
+            if self.filepath.stat().st_size + len(data) > self.max_file_size:
+                self.filepath.replace(self.filepath.with_name(self.filepath.name + ".1"))
+
+        except FileNotFoundError:
+            pass
+
+        with self.filepath.open("ab") as file:
+            file.write(data)
+
+
+TRACER: Tracer | None = None
+
+
+def configure(filepath: Path, buffer_size: int=256, max_file_size: int=64 * 1024 * 1024) -> Tracer:
+    global TRACER
+
+    TRACER = Tracer(filepath, buffer_size, max_file_size)
+
+    return TRACER
+
+
+def start_trace() -> int | None:
+    """
+    Starts a trace for the current task and the tasks it starts from now on. `None` while tracing
+    is off.
+    """
+
+    if TRACER is None:
+        return None
+
+    trace = TRACER.new_trace()
+
+    _CURRENT_TRACE.set(trace)
+
+    return trace
+
+
+def record(stage: str, started_at: float, ended_at: float | None=None, trace: int | None=None, **attributes: typing.Any) -> None:
+    """
+    Records a span of the given trace, or of the current one. Nothing is recorded outside of a trace.
+    """
+
+    if TRACER is None:
+        return
+
+    if trace is None:
+        trace = _CURRENT_TRACE.get()
+
+        if trace is None:
+            return
+
+    TRACER.record(trace, stage, started_at, time.perf_counter() if ended_at is None else ended_at, attributes)
+
+
+def flush() -> None:
+    if TRACER is not None:
+        TRACER.flush()
+
+
+def get_percentile(sorted_values: list[float], percentile: float) -> float:
+    """
+    Nearest-rank percentile.
+    """
+
+    return sorted_values[max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)]
+
+
+def aggregate(spans: typing.Iterable[dict[str, typing.Any]]) -> dict[str, tuple[list[float], list[float]]]:
+    """
+    `{stage: (durations, ends since the start of the trace)}` in seconds, sorted, stages ordered by
+    their median end.
+    """
+
+    spans = list(spans)
+    trace_starts: dict[int, float] = {}
+
+    for span in spans:
+        trace_starts[span["trace"]] = min(trace_starts.get(span["trace"], span["start"]), span["start"])
+
+    stages: dict[str, tuple[list[float], list[float]]] = {}
+
+    for span in spans:
+        durations, ends = stages.setdefault(span["stage"], ([], []))
+
+        durations.append(span["duration"])
+        ends.append(span["start"] + span["duration"] - trace_starts[span["trace"]])
+
+    for durations, ends in stages.values():
+        durations.sort()
+        ends.sort()
+
+    return dict(sorted(stages.items(), key=lambda item: statistics.median(item[1][1])))
+
+
+def format_stages(stages: dict[str, tuple[list[float], list[float]]]) -> list[str]:
+    columns = [f"p{percentile}" for percentile in PERCENTILES] + ["max"]
+
+    return [
+        f"{'':<20} {'':>7}  {'Duration ms':<{len(columns) * 10}}  Since trace start ms",
+        f"{'Stage':<20} {'Spans':>7}  " + "  ".join(f"{column:>8}" for column in columns * 2),
+        *(
+            f"{stage:<20} {len(durations):>7}  " + "  ".join(
+                f"{value * 1000:8.1f}"
+                for values in (durations, ends)
+                for value in (*(get_percentile(values, percentile) for percentile in PERCENTILES), values[-1])
+            )
+            for stage, (durations, ends) in stages.items()
+        )
+    ]
+
+
+def iter_spans(filepaths: typing.Iterable[Path]) -> typing.Iterator[dict[str, typing.Any]]:
+    """
+    A line cut off by a crash is skipped.
+    """
+
+    for filepath in filepaths:
+        with filepath.open("rb") as file:
+            for line in file:
+                try:
+                    yield json_codec.loads(line)
+
+                except ValueError:
+                    continue
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print(f"Usage: python {Path(__file__).name} <trace file> [trace file ...]")
+
+        sys.exit(1)
+
+    stages = aggregate(iter_spans(map(Path, sys.argv[1:])))
+
+    if not stages:
+        print("No spans.")
+
+        sys.exit(1)
+
+    print("\n".join(format_stages(stages)))
@@ -0,0 +1,233 @@
+"""
+Capture files of raw `getStarGifts` responses.
+
+Every capture file is a zstd stream of length-prefixed frames:
+`<payload length: u32><received at: f64><response hash: i64><TL-serialized StarGifts>`.
+"""
+
+from pyrogram.raw.core import TLObject
+from pathlib import Path
+from datetime import datetime, timezone
+from hashlib import blake2b
+from io import BytesIO
+from logging import Logger
+from queue import SimpleQueue
+
+import contextlib
+import struct
+import threading
+import time
+import typing
+
+
+if typing.TYPE_CHECKING:
+    from pyrogram.raw.types.payments.star_gifts import StarGifts
+
+
+FRAME_HEADER = struct.Struct("<Idq")
+CAPTURE_FILENAME_PREFIX = "star_gifts_"
+CAPTURE_FILENAME_SUFFIX = ".cap.zst"
+
+
+class CapturedResponse(typing.NamedTuple):
+    received_at: float
+    hash: int
+    payload: bytes
+
+    def decode(self) -> "StarGifts":
+        return typing.cast("StarGifts", TLObject.read(BytesIO(self.payload)))
+
+
+FRAME_T = tuple[bytes, float, int]  # (payload, received at, response hash)
+
+
+class TrafficRecorder:
+    """
+    Appends `getStarGifts` responses which differ from the previously recorded one to a rotating capture file.
+
+    Frames are compressed and written on a background thread, so recording never blocks the event
+    loop. Errors are logged, never raised: the capture must not stop the detection.
+    """
+
+    def __init__(
+        self,
+        dirpath: Path,
+        logger: Logger,
+        max_file_size: int = 64 * 1024 * 1024,  # 64 MB of uncompressed frames
+        max_files: int = 100,
+        compression_level: int = 10
+    ) -> None:
+        import zstandard
+
+        self.dirpath = dirpath
+        self.logger = logger
+        self.max_file_size = max_file_size
+        self.max_files = max_files
+
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._flush_block = zstandard.FLUSH_BLOCK
+
+        self._file: typing.BinaryIO | None = None
+        self._writer: typing.Any = None  # zstandard.ZstdCompressionWriter
+        self._file_size = 0
+        self._last_digest: bytes | None = None
+
+        self._frames: SimpleQueue[FRAME_T | None] = SimpleQueue()  # None stops the writer thread
+        self._thread: threading.Thread | None = None
+
+        self.dirpath.mkdir(parents=True, exist_ok=True)
+
+    def _open(self) -> None:
+        filepath = self.dirpath / (
+            CAPTURE_FILENAME_PREFIX
+            + datetime.now(tz=timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
+            + CAPTURE_FILENAME_SUFFIX
+        )
+
+        self._file = filepath.open("xb")
+        self._writer = self._compressor.stream_writer(self._file, closefd=False)
+        self._file_size = 0
+
+        for old_filepath in get_capture_filepaths(self.dirpath)[:-self.max_files]:
+            old_filepath.unlink(missing_ok=True)
+
+    def _close_file(self) -> None:
+        try:
+            if self._writer is not None:
+                self._writer.close()
+
+        finally:
+            self._writer = None
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _write(self, payload: bytes, received_at: float, response_hash: int) -> None:
+        if self._writer is None or self._file_size >= self.max_file_size:
+            self._close_file()
+            self._open()
+
+        self._writer.write(FRAME_HEADER.pack(len(payload), received_at, response_hash))
+        self._writer.write(payload)
+        self._writer.flush(self._flush_block)  # Readers and crashes only lose the frame being written
+
+        self._file_size += FRAME_HEADER.size + len(payload)
+
+    def _run(self) -> None:
+        while (frame := self._frames.get()) is not None:
+            try:
+                self._write(*frame)
+
+            except Exception as ex:
+                self.logger.exception("Error writing a traffic capture frame, starting a new capture file", exc_info=ex)
+
+                with contextlib.suppress(Exception):
+                    self._close_file()
+
+        self._close_file()
+
+    def close(self) -> None:
+        """
+        Writes the queued frames and closes the capture file.
+        """
+
+        if self._thread is not None:
+            self._frames.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def record(self, response: "StarGifts", received_at: float | None = None) -> bool:
+        """
+        Returns whether the response was queued for writing, i.e. it differs from the previous one.
+        """
+
+        try:
+            payload = response.write()
+
+        except Exception as ex:
+            self.logger.exception("Error serializing a getStarGifts response for the traffic capture", exc_info=ex)
+
+            return False
+
+        digest = blake2b(payload, digest_size=16).digest()
+
+        if digest == self._last_digest:
+            return False
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="traffic_recorder", daemon=True)
+            self._thread.start()
+
+        self._frames.put((payload, time.time() if received_at is None else received_at, response.hash))
+        self._last_digest = digest
+
+        return True
+
+
+def get_capture_filepaths(dirpath: Path) -> list[Path]:
+    return sorted(dirpath.glob(f"{CAPTURE_FILENAME_PREFIX}*{CAPTURE_FILENAME_SUFFIX}"))
+
+
+def iter_capture(filepath: Path) -> typing.Iterator[CapturedResponse]:
+    """
+    Streams responses from a capture file one frame at a time. A truncated last frame is skipped.
+    """
+
+    import zstandard
+
+    with filepath.open("rb") as file, zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True) as reader:
+        while True:
+            header = reader.read(FRAME_HEADER.size)
+
+            if len(header) < FRAME_HEADER.size:
+                return
+
+            payload_length, received_at, response_hash = FRAME_HEADER.unpack(header)
+            payload = reader.read(payload_length)
+
+            if len(payload) < payload_length:
+                return
+
+            yield CapturedResponse(
+                received_at = received_at,
+                hash = response_hash,
+                payload = payload
+            )
+
+
+def iter_captures(path: Path) -> typing.Iterator[CapturedResponse]:
+    """
+    `path` is either a capture file or a directory of them, which are read in chronological order.
+    """
+
+    if path.is_file():
+        yield from iter_capture(path)
+
+        return
+
+    for filepath in get_capture_filepaths(path):
+        yield from iter_capture(filepath)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 2:
+        print(f"Usage: python {Path(__file__).name} <capture file or directory>")
+
+        sys.exit(1)
+
+    responses_count = 0
+
+    for captured_response in iter_captures(Path(sys.argv[1])):
+        responses_count += 1
+
+        print(
+            datetime.fromtimestamp(captured_response.received_at, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            f"hash={captured_response.hash}",
+            f"size={len(captured_response.payload):,}",
+            f"gifts={len(captured_response.decode().gifts)}"
+        )
+
+    print(f"{responses_count:,} responses.")
@@ -0,0 +1,260 @@
+"""
+Cache of `GetStarGiftUpgradePreview` responses, stored next to the gifts data.
+
+Attributes keep only their name, rarity and a reference into a documents table shared by all
+gifts, as the same pattern and model stickers are offered for many gifts. A preview is reused
+until it is `ttl` seconds old or the catalog upgrade price of its gift changes.
+"""
+
+from pyrogram import Client
+from pyrogram.raw.functions.payments.get_star_gift_upgrade_preview import GetStarGiftUpgradePreview
+from pyrogram.raw.types.payments.star_gift_upgrade_preview import StarGiftUpgradePreview
+from pyrogram.raw.types.star_gift_attribute_model import StarGiftAttributeModel
+from pyrogram.raw.types.star_gift_attribute_pattern import StarGiftAttributePattern
+from pyrogram.raw.types.star_gift_attribute_backdrop import StarGiftAttributeBackdrop
+from pyrogram.raw.types.document import Document
+from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
+from pyrogram.file_id import FileId, FileType
+from pydantic import Field, PrivateAttr
+from pathlib import Path
+
+import asyncio
+import typing
+
+from star_gifts_data import BaseConfigModel
+
+import json_codec
+
+
+class UpgradePreviewDocument(BaseConfigModel):
+    file_id: str
+    file_name: str
+
+
+class UpgradePreviewAttribute(BaseConfigModel):
+    name: str
+    rarity_permille: int
+    document_id: int | None = Field(default=None)  # Key of `UpgradePreviewsData.documents`, models and patterns only
+    colors: tuple[int, int, int, int] | None = Field(default=None)  # Center, edge, pattern and text RGB, backdrops only
+
+
+class UpgradePreview(BaseConfigModel):
+    fetched_at: int
+    upgrade_price: int | None = Field(default=None)  # Catalog upgrade price at `fetched_at`
+    models: list[UpgradePreviewAttribute] = Field(default_factory=list[UpgradePreviewAttribute])
+    backdrops: list[UpgradePreviewAttribute] = Field(default_factory=list[UpgradePreviewAttribute])
+    patterns: list[UpgradePreviewAttribute] = Field(default_factory=list[UpgradePreviewAttribute])
+
+    def get_document_ids(self) -> set[int]:
+        return {
+            attribute.document_id
+            for attribute in (*self.models, *self.patterns)
+            if attribute.document_id is not None
+        }
+
+
+class UpgradePreviewsData(BaseConfigModel):
+    DATA_FILEPATH: Path = Field(exclude=True)
+    documents: dict[int, UpgradePreviewDocument] = Field(default_factory=dict[int, UpgradePreviewDocument])
+    previews: dict[int, UpgradePreview] = Field(default_factory=dict[int, UpgradePreview])  # {star_gift_id: preview}
+
+    _is_changed: bool = PrivateAttr(default=False)
+
+    @classmethod
+    def load(cls, data_filepath: Path) -> "UpgradePreviewsData":
+        try:
+            return cls.model_validate({
+                **json_codec.loads(data_filepath.read_bytes()),
+                "DATA_FILEPATH": data_filepath
+            })
+
+        except FileNotFoundError:
+            return cls(
+                DATA_FILEPATH = data_filepath
+            )
+
+    def touch(self) -> None:
+        """
+        Marks the data changed, only changed data is written by `save`.
+        """
+
+        self._is_changed = True
+
+    def _encode(self) -> bytes | None:
+        if not self._is_changed:
+            return None
+
+        self._is_changed = False
+
+        return json_codec.dumps(self.model_dump(exclude_defaults=True))
+
+    def save(self) -> None:
+        data = self._encode()
+
+        if data is None:
+            return
+
+        try:
+            _write_file(self.DATA_FILEPATH, data)
+
+        except BaseException:
+            self._is_changed = True
+
+            raise
+
+    async def save_async(self) -> None:
+        """
+        Same as `save`, but the file is written in a thread.
+        """
+
+        data = self._encode()
+
+        if data is None:
+            return
+
+        try:
+            await asyncio.to_thread(_write_file, self.DATA_FILEPATH, data)
+
+        except BaseException:
+            self._is_changed = True
+
+            raise
+
+
+def _write_file(filepath: Path, data: bytes) -> None:
+    temp_filepath = filepath.with_name(filepath.name + ".tmp")
+    temp_filepath.write_bytes(data)
+    temp_filepath.replace(filepath)
+
+
+def _add_document(documents: dict[int, UpgradePreviewDocument], document: Document) -> int:
+    if document.id not in documents:
+        documents[document.id] = UpgradePreviewDocument(
+            file_id = FileId(
+                file_type = FileType.STICKER,
+                dc_id = document.dc_id,
+                media_id = document.id,
+                access_hash = document.access_hash,
+                file_reference = document.file_reference
+            ).encode(),
+            file_name = next(
+                (
+                    attribute.file_name
+                    for attribute in document.attributes
+                    if isinstance(attribute, DocumentAttributeFilename)
+                ),
+                f"{document.id}.tgs"
+            )
+        )
+
+    return document.id
+
+
+def parse_upgrade_preview(
+    r: StarGiftUpgradePreview,
+    fetched_at: int,
+    upgrade_price: int | None,
+    documents: dict[int, UpgradePreviewDocument]
+) -> UpgradePreview:
+    preview = UpgradePreview(
+        fetched_at = fetched_at,
+        upgrade_price = upgrade_price
+    )
+
+    for attribute in r.sample_attributes:
+        if isinstance(attribute, StarGiftAttributeModel | StarGiftAttributePattern):
+            (preview.models if isinstance(attribute, StarGiftAttributeModel) else preview.patterns).append(UpgradePreviewAttribute(
+                name = attribute.name,
+                rarity_permille = attribute.rarity_permille,
+                document_id = (
+                    _add_document(documents, attribute.document)
+                    if isinstance(attribute.document, Document) else
+                    None
+                )
+            ))
+
+        elif isinstance(attribute, StarGiftAttributeBackdrop):
+            preview.backdrops.append(UpgradePreviewAttribute(
+                name = attribute.name,
+                rarity_permille = attribute.rarity_permille,
+                colors = (attribute.center_color, attribute.edge_color, attribute.pattern_color, attribute.text_color)
+            ))
+
+    return preview
+
+
+class UpgradePreviewsCache:
+    def __init__(self, data: UpgradePreviewsData, ttl: int) -> None:
+        self.data = data
+        self.ttl = ttl
+
+    def get(self, star_gift_id: int, upgrade_price: int | None, now: int) -> UpgradePreview | None:
+        """
+        Cached preview, `None` if there is none or it is stale.
+        """
+
+        preview = self.data.previews.get(star_gift_id)
+
+        if preview is None or now - preview.fetched_at >= self.ttl or preview.upgrade_price != upgrade_price:
+            return None
+
+        return preview
+
+    async def fetch(self, client: Client, star_gift_id: int, upgrade_price: int | None, now: int) -> UpgradePreview | None:
+        """
+        Cached preview, or a new one if it is stale. `None` if the gift isn't upgradable.
+        """
+
+        preview = self.get(star_gift_id, upgrade_price, now)
+
+        if preview is not None:
+            return preview
+
+        try:
+            r = typing.cast(StarGiftUpgradePreview, await client.invoke(
+                GetStarGiftUpgradePreview(
+                    gift_id = star_gift_id
+                )
+            ))
+
+        except Exception:
+            return None
+
+        preview = self.data.previews[star_gift_id] = parse_upgrade_preview(r, now, upgrade_price, self.data.documents)
+
+        self.prune_documents()
+        self.data.touch()
+
+        return preview
+
+    def prune_documents(self) -> None:
+        used_document_ids = {
+            document_id
+            for preview in self.data.previews.values()
+            for document_id in preview.get_document_ids()
+        }
+
+        for document_id in self.data.documents.keys() - used_document_ids:
+            del self.data.documents[document_id]
+
+    def dump_preview(self, preview: UpgradePreview) -> dict[str, typing.Any]:
+        """
+        Preview with its documents inlined, for the catalog API.
+        """
+
+        def dump_attribute(attribute: UpgradePreviewAttribute) -> dict[str, typing.Any]:
+            document = self.data.documents.get(attribute.document_id) if attribute.document_id is not None else None
+
+            return attribute.model_dump(mode="json", exclude_defaults=True) | (
+                {"file_name": document.file_name}
+                if document else
+                {}
+            )
+
+        return {
+            "fetched_at": preview.fetched_at,
+            "upgrade_price": preview.upgrade_price,
+            "models": list(map(dump_attribute, preview.models)),
+            "backdrops": list(map(dump_attribute, preview.backdrops)),
+            "patterns": list(map(dump_attribute, preview.patterns))
+        }
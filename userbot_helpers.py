@@ -13,15 +13,25 @@ from pyrogram.raw.functions.upload.get_cdn_file import GetCdnFile
 from pyrogram.raw.functions.upload.reupload_cdn_file import ReuploadCdnFile
 from pyrogram.raw.types.file_hash import FileHash
 from pyrogram.raw.functions.upload.get_cdn_file_hashes import GetCdnFileHashes
+from pyrogram.raw.types.input_media_uploaded_document import InputMediaUploadedDocument
+from pyrogram.raw.types.document_attribute_filename import DocumentAttributeFilename
+from pyrogram.raw.types.message_media_document import MessageMediaDocument
+from pyrogram.raw.types.document import Document
+from pyrogram.raw.functions.messages.upload_media import UploadMedia
 from pyrogram.session import Auth, Session
+from pyrogram.file_id import FileId, FileType
 from pyrogram.crypto import aes
 from pyrogram.errors import CDNFileHashMismatch
 from hashlib import sha256
 from logging import Logger
 from io import BytesIO
 
+import time
 import typing
 
+import metrics
+import tracing
+
 
 async def download_documents(
     client: Client,
@@ -32,6 +42,8 @@ async def download_documents(
     total_documents_count = sum(len(documents) for documents in documents_data.values())
 
     for dc_id, documents in documents_data.items():
+        session_started_at = time.perf_counter()
+
         session = Session(
             client,
             dc_id,
@@ -64,8 +76,13 @@ async def download_documents(
                 )
             )
 
+        tracing.record("media_session", session_started_at, dc=dc_id)
+
         for document_id, document_access_hash, document_file_reference in documents:
+            started_at = time.perf_counter()
+
             file = BytesIO()
+            cdn_dc_id: int | None = None
 
             offset_bytes = 0
             chunk_size = 1024 * 1024 # 1 MB
@@ -108,6 +125,9 @@ async def download_documents(
                     ))
 
             else:  # raw.types.upload.FileCdnRedirect
+                cdn_dc_id = r.dc_id
+                cdn_session_started_at = time.perf_counter()
+
                 cdn_session = Session(
                     client,
                     r.dc_id,
@@ -124,6 +144,8 @@ async def download_documents(
                 try:
                     await cdn_session.start()
 
+                    tracing.record("media_session", cdn_session_started_at, dc=cdn_dc_id, cdn=True)
+
                     while True:
                         r2 = typing.cast(
                             CdnFile | CdnFileReuploadNeeded,
@@ -188,8 +210,47 @@ async def download_documents(
 
             downloaded_documents[document_id] = file
 
-            logger.info(f"Downloaded {len(downloaded_documents)}/{total_documents_count} documents ({dc_id} | {document_id})")
+            metrics.STICKER_DOWNLOAD_DURATION.labels(dc_id).observe(time.perf_counter() - started_at)
+            metrics.STICKER_DOWNLOAD_SIZE.observe(file.tell())
+
+            tracing.record("sticker_download", started_at, dc=dc_id, cdn=cdn_dc_id, document=document_id, size=file.tell())
+
+            logger.info("Downloaded %d/%d documents (%d | %d)", len(downloaded_documents), total_documents_count, dc_id, document_id)
 
         await session.stop()
 
     return downloaded_documents
+
+
+async def upload_sticker(client: Client, chat_id: int | str, sticker_binary: BytesIO) -> str:
+    """
+    Uploads a sticker to Telegram without sending it and returns its file ID,
+    so it can be sent later without waiting for the upload.
+    """
+
+    sticker_binary.seek(0)
+
+    media = typing.cast(MessageMediaDocument, await client.invoke(
+        UploadMedia(
+            peer = await client.resolve_peer(chat_id),  # pyright: ignore[reportArgumentType]
+            media = InputMediaUploadedDocument(
+                file = await client.save_file(sticker_binary),  # pyright: ignore[reportArgumentType]
+                mime_type = client.guess_mime_type(sticker_binary.name) or "image/webp",
+                attributes = [
+                    DocumentAttributeFilename(
+                        file_name = sticker_binary.name
+                    )
+                ]
+            )
+        )
+    ))
+
+    document = typing.cast(Document, media.document)
+
+    return FileId(
+        file_type = FileType.STICKER,
+        dc_id = document.dc_id,
+        media_id = document.id,
+        access_hash = document.access_hash,
+        file_reference = document.file_reference
+    ).encode()
@@ -1,9 +1,13 @@
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from datetime import datetime, tzinfo
+from decimal import Decimal
+from queue import SimpleQueue
 
+import asyncio
+import atexit
 import logging
-import numpy as np
+import math
 import time
 import typing
 
@@ -15,7 +19,31 @@ class StrippingFormatter(logging.Formatter):
         return super().format(record)
 
 
-def get_logger(name: str, log_filepath: Path, console_log_level: int=logging.INFO, file_log_level: int=logging.INFO) -> logging.Logger:
+IMMUTABLE_LOG_ARG_TYPES = (str, int, float, bool, bytes, type(None))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records as is, so that message formatting happens on the listener's thread too.
+
+    Only records whose arguments are immutable scalars are deferred. Mutable arguments could change
+    and tracebacks could be torn down before the listener formats them, so such records are
+    formatted eagerly as `QueueHandler` does.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if (
+            record.exc_info or record.exc_text or record.stack_info
+            or not isinstance(record.msg, str)
+            or not isinstance(record.args, tuple)  # A mapping of arguments is mutable itself
+            or not all(type(arg) in IMMUTABLE_LOG_ARG_TYPES for arg in record.args)
+        ):
+            return super().prepare(record)
+
+        return record
+
+
+def get_logger(name: str, log_filepath: Path, console_log_level: int=logging.INFO, file_log_level: int=logging.INFO, queued: bool=False) -> logging.Logger:
     logger = logging.getLogger(name)
 
     logger.setLevel(min(console_log_level, file_log_level))
@@ -37,12 +65,53 @@ def get_logger(name: str, log_filepath: Path, console_log_level: int=logging.INF
     file_handler.setLevel(file_log_level)
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    if queued:
+        log_queue: SimpleQueue[logging.LogRecord] = SimpleQueue()
+
+        listener = QueueListener(
+            log_queue,
+            console_handler,
+            file_handler,
+            respect_handler_level = True
+        )
+
+        listener.start()
+
+        atexit.register(listener.stop)
+
+        logger.addHandler(DeferredQueueHandler(log_queue))
+
+    else:
+        logger.addHandler(console_handler)
+        logger.addHandler(file_handler)
 
     return logger
 
 
+def set_event_loop_policy(use_uvloop: bool) -> bool:
+    """
+    Makes `asyncio.run` use uvloop if requested and installed, the default event loop otherwise.
+
+    Returns whether uvloop is used.
+    """
+
+    if use_uvloop:
+        try:
+            import uvloop
+
+        except ImportError:
+            pass
+
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+            return True
+
+    asyncio.set_event_loop_policy(None)
+
+    return False
+
+
 def get_current_datetime(timezone: tzinfo) -> str:
     return datetime.now(tz=timezone).strftime("%d-%m-%Y %H:%M:%S")
 
@@ -54,6 +123,25 @@ def pretty_int(number: int) -> str:
     return "{:,}".format(number)
 
 
+def format_float_positional(number: float) -> str:
+    """
+    Pure-Python equivalent of `numpy.format_float_positional(number, trim="-")`.
+    """
+
+    if math.isnan(number):
+        return "nan"
+
+    if math.isinf(number):
+        return "inf" if number > 0 else "-inf"
+
+    formatted_number_str = format(Decimal(repr(number)), "f")
+
+    if "." in formatted_number_str:
+        formatted_number_str = formatted_number_str.rstrip("0").rstrip(".")
+
+    return formatted_number_str
+
+
 @typing.overload
 def pretty_float(number: float, get_is_same: typing.Literal[True]) -> tuple[str, bool]: ...
 
@@ -62,7 +150,7 @@ def pretty_float(number: float, get_is_same: typing.Literal[False]) -> str: ...
 
 def pretty_float(number: float, get_is_same: bool=False) -> tuple[str, bool] | str:
     formatted_number = float("{:.1g}".format(float(number)))
-    formatted_number_str = np.format_float_positional(formatted_number, trim="-")
+    formatted_number_str = format_float_positional(formatted_number)
 
     if get_is_same:
         return (